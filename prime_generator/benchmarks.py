@@ -0,0 +1,219 @@
+# This module is used to read the command-line options of the benchmark.
+import argparse
+
+# This module is used to write the results and read the baseline as JSON.
+import json
+
+# These modules describe the machine the benchmark ran on.
+import platform
+import sys
+
+# This module is used to time each run as precisely as possible.
+import time
+
+# 'resource' reports the peak resident memory (RSS) of a process, and 'tracemalloc' the peak memory allocated by Python.
+import resource
+import tracemalloc
+
+# Each case runs in a fresh process, so its peak memory is not mixed up with the cases before it, and a case that runs too long can be stopped.
+import multiprocessing
+
+# Importing the engine registry of the prime number generation methods.
+from prime_no_generator import ENGINES, numpy
+
+
+# The methods that can be benchmarked, by name. Every engine in the registry is benchmarked, so new engines only need to be registered there.
+METHODS = {name: engine.function for name, engine in ENGINES.items()}
+
+# The default grid: each method runs over ranges of these widths starting at each of these numbers.
+DEFAULT_WIDTHS = [1000, 10000, 100000]
+DEFAULT_STARTS = [1, 10**6, 10**9, 10**12]
+
+# Time regressions are only reported for cases that take at least this long, because shorter timings are mostly noise.
+MIN_COMPARABLE_SECONDS = 0.001
+
+
+"""
+This function returns the value below which 'fraction' of the sorted 'values' fall, interpolating between neighbours.
+"""
+# This function computes a percentile of a sorted list.
+def percentile(values, fraction):
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+"""
+This function runs one benchmark case inside a fresh worker process and sends the measurements back through 'connection'. 
+The method is first run 'repeat' times to measure time, then once more under tracemalloc to measure the peak memory allocated by Python. 
+The peak RSS of the whole worker process is read at the end.
+"""
+# This function measures one method on one range.
+def run_case(method, start, end, repeat, connection):
+    method_function = METHODS[method]
+    
+    times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = method_function(start, end)
+        times.append(time.perf_counter() - begin)
+    num_primes = len(result)
+    del result
+    
+    tracemalloc.start()
+    method_function(start, end)
+    _, peak_allocated = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    # On Linux ru_maxrss is in kilobytes, on macOS it's in bytes.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_bytes = peak_rss if sys.platform == "darwin" else peak_rss * 1024
+    connection.send({"times": times, "num_primes": num_primes, "peak_allocated_bytes": peak_allocated, "peak_rss_bytes": peak_rss_bytes})
+
+
+"""
+This function runs one case in a fresh process and summarises its timings. 
+Cases that take longer than 'timeout' seconds are stopped and recorded as skipped, so one slow method can't hold up the whole grid.
+"""
+# This function benchmarks one method on one range.
+def benchmark_case(method, start, end, repeat, timeout):
+    case = {"method": method, "start": start, "end": end, "width": end - start + 1}
+    
+    # 'spawn' starts the worker from scratch, so its memory doesn't include anything from this process.
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    worker = context.Process(target=run_case, args=(method, start, end, repeat, sender))
+    worker.start()
+    if not receiver.poll(timeout):
+        worker.terminate()
+        worker.join()
+        case["skipped"] = f"took longer than {timeout} seconds"
+        return case
+    measurements = receiver.recv()
+    worker.join()
+    
+    times = sorted(measurements.pop("times"))
+    case.update(measurements)
+    case.update({
+        "runs": len(times),
+        "min_seconds": times[0],
+        "median_seconds": percentile(times, 0.5),
+        "p90_seconds": percentile(times, 0.9),
+        "p99_seconds": percentile(times, 0.99),
+        "max_seconds": times[-1],
+    })
+    return case
+
+
+"""
+This function runs every method over every combination of range width and start, and returns the results 
+together with a description of the machine, so results from different machines are not compared by mistake.
+"""
+# This function runs the whole benchmark grid.
+def run_benchmarks(methods, widths, starts, repeat, timeout):
+    results = []
+    for method in methods:
+        for start in starts:
+            for width in widths:
+                case = benchmark_case(method, start, start + width - 1, repeat, timeout)
+                results.append(case)
+                if "skipped" in case:
+                    print(f"{method:>22} start={start:<14} width={width:<8} skipped ({case['skipped']})", file=sys.stderr)
+                else:
+                    print(f"{method:>22} start={start:<14} width={width:<8} median={case['median_seconds']:.6f}s peak_rss={case['peak_rss_bytes'] // 1024}KB", file=sys.stderr)
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "numpy": numpy.__version__ if numpy is not None else None,
+        },
+        "created": time.time(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+"""
+This function compares new results with a stored baseline. A case is a regression when its median time grew by more than 
+'threshold' times the baseline median, or its peak allocated memory grew by more than 'threshold' times. 
+Cases that are missing or skipped on either side are left out, and so are time changes of cases faster than MIN_COMPARABLE_SECONDS.
+"""
+# This function finds the cases that got slower or bigger than in the baseline.
+def compare_results(results, baseline, threshold):
+    baseline_cases = {(case["method"], case["start"], case["end"]): case for case in baseline["results"] if "skipped" not in case}
+    regressions = []
+    for case in results["results"]:
+        old = baseline_cases.get((case["method"], case["start"], case["end"]))
+        if old is None or "skipped" in case:
+            continue
+        for metric in ("median_seconds", "peak_allocated_bytes"):
+            if metric == "median_seconds" and case[metric] < MIN_COMPARABLE_SECONDS:
+                continue
+            if old[metric] > 0 and case[metric] / old[metric] > threshold:
+                regressions.append({
+                    "method": case["method"],
+                    "start": case["start"],
+                    "end": case["end"],
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "current": case[metric],
+                    "ratio": case[metric] / old[metric],
+                })
+    return regressions
+
+
+# This is the main function that runs when the script is executed.
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the prime number generation methods over a grid of range widths and starts.")
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS), help="methods to benchmark")
+    parser.add_argument("--widths", nargs="+", type=int, default=DEFAULT_WIDTHS, help="range widths")
+    parser.add_argument("--starts", nargs="+", type=int, default=DEFAULT_STARTS, help="range starts (magnitudes)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a case is skipped")
+    parser.add_argument("--output", help="write the results to this JSON file (default: standard output)")
+    parser.add_argument("--compare", help="baseline JSON file to compare the results with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio to the baseline that counts as a regression")
+    args = parser.parse_args()
+    
+    results = run_benchmarks(args.methods, args.widths, args.starts, args.repeat, args.timeout)
+    
+    # Write the results as JSON.
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    
+    # Compare with the baseline, and exit with an error if anything regressed, so the benchmark can gate an upgrade.
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['method']} [{regression['start']}, {regression['end']}] {regression['metric']}: "
+                  f"{regression['baseline']:.6g} -> {regression['current']:.6g} ({regression['ratio']:.2f}x)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.", file=sys.stderr)
+
+# This line checks if the script is being run directly (not being imported as a module). If so, it calls the main function.
+if __name__ == "__main__":
+    main()
+
+
+"""
+Summary:
+This script benchmarks the prime number generation methods from 'prime_no_generator' in a reproducible way. 
+Every method runs over a grid of range widths and start magnitudes. Each case runs in a fresh process, which records 
+the median and percentile times over several runs, the peak memory allocated by Python and the peak RSS of the process.
+
+The results are written as JSON. With '--compare baseline.json' the results are checked against a stored baseline, and 
+the script exits with an error when a case got slower or bigger than '--threshold' times the baseline, so it can be used 
+to gate upgrades. For example:
+
+    python benchmarks.py --output baseline.json
+    python benchmarks.py --compare baseline.json --threshold 1.25
+"""
@@ -3,6 +3,22 @@ import unittest
 
 # Import the prime number generation functions from the 'prime_no_generator' module.
 from prime_no_generator import brute_force_method, trial_division_method, miller_rabin_method, sieve_of_eratosthenes_method
+from prime_no_generator import sieve_segments, sieve_vectorized_method, to_list, is_prime
+from prime_no_generator import partition_range, parallel_method, shutdown_executor, method_segments
+from prime_no_generator import build_prime_index, PrimeIndex, prime_count, count_primes_in_range, count_primes_cost
+from prime_no_generator import next_prime, prev_prime, nth_prime, nth_prime_cost, is_prime_cost, prime_search_cost
+from prime_no_generator import ENGINES, Engine, choose_engine, get_engine, refit_engine, Cancelled
+from prime_no_generator import merge_ranges, sieve_ranges, hybrid_method, PrimeSet
+from prime_no_generator import write_base_prime_table, attach_base_prime_table, base_primes
+import prime_no_generator
+
+# Import the function that compares benchmark results with a baseline from the 'benchmarks' module.
+from benchmarks import compare_results
+
+# These modules are used to make a temporary folder for the prime index file.
+import os
+import pickle
+import tempfile
 
 # Define a test case class that inherits from unittest.TestCase. Each method in this class is a separate test.
 class TestPrimeMethods(unittest.TestCase):
@@ -28,6 +44,20 @@ class TestPrimeMethods(unittest.TestCase):
         # Check that the function returns the correct prime numbers for the range 30-50.
         self.assertEqual(miller_rabin_method(30, 50), [31, 37, 41, 43, 47])
 
+    # Test the deterministic primality test on numbers that are known to fool weaker tests.
+    def test_is_prime(self):
+        # 561 is a Carmichael number and 3825123056546413051 is a strong pseudoprime to the bases 2 through 23.
+        self.assertFalse(is_prime(561))
+        self.assertFalse(is_prime(3825123056546413051))
+        # 2^61 - 1 is prime and below 2^64, 2^89 - 1 and 2^64 + 13 are primes above 2^64 that need the Baillie-PSW test.
+        self.assertTrue(is_prime(2**61 - 1))
+        self.assertTrue(is_prime(2**89 - 1))
+        self.assertTrue(is_prime(2**64 + 13))
+        # A product of two large primes above 2^64 is composite.
+        self.assertFalse(is_prime((2**61 - 1) * (2**31 - 1)))
+        # The deterministic method agrees with the sieve near 10^12.
+        self.assertEqual(miller_rabin_method(10**12, 10**12 + 1000), sieve_of_eratosthenes_method(10**12, 10**12 + 1000))
+
     # Test the Sieve of Eratosthenes method with two different ranges.
     def test_sieve_of_eratosthenes_method(self):
         # Check that the function returns the correct prime numbers for the range 1-40.
@@ -35,6 +65,214 @@ class TestPrimeMethods(unittest.TestCase):
         # Check that the function returns the correct prime numbers for the range 40-60.
         self.assertEqual(sieve_of_eratosthenes_method(40, 60), [41, 43, 47, 53, 59])
 
+    # Test the segmented sieve on windows that are far from zero and that cross window boundaries.
+    def test_segmented_sieve(self):
+        # A narrow window near 10^10 must not need memory for all the numbers below it.
+        self.assertEqual(sieve_of_eratosthenes_method(10**10, 10**10 + 100), [10000000019, 10000000033, 10000000061, 10000000069, 10000000097])
+        # Small windows must give the same answer as one big window, including primes that sit on the window edges.
+        small_windows = [p for segment in sieve_segments(1, 1000, segment_size=7) for p in segment]
+        self.assertEqual(small_windows, brute_force_method(1, 1000))
+
+    # Test the vectorized sieve, which returns a PrimeSet whether or not NumPy is installed.
+    def test_sieve_vectorized_method(self):
+        # Check that the function returns the correct prime numbers for the range 1-40, including the even prime 2.
+        self.assertEqual(to_list(sieve_vectorized_method(1, 40)), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37])
+        # Small odd-only windows must agree with the plain sieve, for both odd and even range limits.
+        self.assertEqual(to_list(sieve_vectorized_method(100, 2000, segment_size=5)), sieve_of_eratosthenes_method(100, 2000))
+        self.assertEqual(to_list(sieve_vectorized_method(101, 1999, segment_size=5)), sieve_of_eratosthenes_method(101, 1999))
+        # A range without any primes gives an empty result.
+        self.assertEqual(to_list(sieve_vectorized_method(24, 28)), [])
+
+    # Test that ranges are split into ordered chunks that cover the whole range, narrower where numbers cost more.
+    def test_partition_range(self):
+        chunks = partition_range(1, 100000, 8, "sqrt")
+        self.assertEqual(chunks[0][0], 1)
+        self.assertEqual(chunks[-1][1], 100000)
+        self.assertTrue(all(chunks[i][1] + 1 == chunks[i + 1][0] for i in range(len(chunks) - 1)))
+        self.assertGreater(chunks[0][1] - chunks[0][0], chunks[-1][1] - chunks[-1][0])
+        # A range can't be split into more chunks than it has numbers.
+        self.assertEqual(partition_range(5, 7, 10), [(5, 5), (6, 6), (7, 7)])
+
+    # Test that running a method on several processes gives the same primes in the same order.
+    def test_parallel_method(self):
+        try:
+            self.assertEqual(parallel_method(miller_rabin_method, 1, 50000, jobs=2), sieve_of_eratosthenes_method(1, 50000))
+        finally:
+            shutdown_executor()
+
+    # Test that the generator version of each method yields the same primes as the method itself, window by window.
+    def test_method_segments(self):
+        for method_function in [trial_division_method, miller_rabin_method, sieve_of_eratosthenes_method]:
+            segments = list(method_segments(method_function, 1, 500, segment_size=64))
+            self.assertEqual(len(segments), 8)
+            self.assertEqual([p for segment in segments for p in segment], method_function(1, 500))
+
+    # Test that a prime index file answers range and count queries the same way as the sieve.
+    def test_prime_index(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "primes.idx")
+            build_prime_index(300001, path)
+            index = PrimeIndex(path)
+            try:
+                self.assertEqual(index.limit, 300001)
+                self.assertEqual(index.primes(1, 300001), sieve_of_eratosthenes_method(1, 300001))
+                self.assertEqual(index.primes(131000, 131200), sieve_of_eratosthenes_method(131000, 131200))
+                self.assertEqual(index.count(1, 300001), len(sieve_of_eratosthenes_method(1, 300001)))
+                self.assertEqual(index.count(65530, 200017), len(sieve_of_eratosthenes_method(65530, 200017)))
+                self.assertEqual(index.count(24, 28), 0)
+            finally:
+                index.close()
+            with open(path, "wb") as index_file:
+                index_file.write(b"PRIMEIDX")
+            with self.assertRaises(ValueError):
+                PrimeIndex(path)
+
+    # Test that the methods give the same primes once a base-prime table file is attached, and that other files are refused.
+    def test_base_prime_table(self):
+        saved = prime_no_generator._divisor_table, prime_no_generator._base_table_path
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "primes.tbl")
+            write_base_prime_table(100000, path)
+            expected = sieve_of_eratosthenes_method(10**9, 10**9 + 2000)
+            try:
+                attach_base_prime_table(path)
+                self.assertEqual(list(base_primes(1000)), list(sieve_of_eratosthenes_method(0, 1000)))
+                self.assertEqual(sieve_of_eratosthenes_method(10**9, 10**9 + 2000), expected)
+                self.assertEqual(trial_division_method(10**9, 10**9 + 2000), expected)
+                self.assertEqual(hybrid_method(10**9, 10**9 + 2000), expected)
+            finally:
+                prime_no_generator._divisor_table, prime_no_generator._base_table_path = saved
+            with open(path, "r+b") as table_file:
+                table_file.write(b"NOTATBL!")
+            with self.assertRaises(ValueError):
+                attach_base_prime_table(path)
+            # A file cut off inside its header is refused the same way, so the server can build a new one
+            with open(path, "wb") as table_file:
+                table_file.write(b"PRIMETBL")
+            with self.assertRaises(ValueError):
+                attach_base_prime_table(path)
+
+    # Test counting primes without listing them.
+    def test_prime_count(self):
+        # The counts of primes up to small numbers and up to the powers of ten are well known.
+        self.assertEqual([prime_count(x) for x in range(0, 12)], [0, 0, 1, 2, 2, 3, 3, 4, 4, 4, 4, 5])
+        self.assertEqual(prime_count(10**6), 78498)
+        self.assertEqual(prime_count(10**9), 50847534)
+        # Narrow windows are counted with the hybrid method and wide ranges use prime_count, and both must agree with the sieve.
+        self.assertEqual(count_primes_in_range(10**9, 10**9 + 1000), len(sieve_of_eratosthenes_method(10**9, 10**9 + 1000)))
+        self.assertEqual(count_primes_in_range(10**18, 10**18 + 100), len(miller_rabin_method(10**18, 10**18 + 100)))
+        self.assertLess(count_primes_cost(10**18, 10**18 + 100), 1)
+        self.assertGreater(count_primes_cost(1, 10**18), 3600)
+        self.assertEqual(count_primes_in_range(1000, 200000), len(sieve_of_eratosthenes_method(1000, 200000)))
+        self.assertEqual(count_primes_in_range(30, 20), 0)
+
+    # Test the single-number questions: the next prime, the previous prime and the n-th prime.
+    def test_point_queries(self):
+        self.assertEqual([next_prime(n) for n in [-5, 2, 7, 23, 89]], [2, 3, 11, 29, 97])
+        self.assertEqual([prev_prime(n) for n in [2, 3, 8, 30, 97]], [None, 2, 7, 29, 89])
+        self.assertEqual(next_prime(2**64), 2**64 + 13)
+        self.assertEqual([nth_prime(n) for n in [1, 2, 6, 7, 100]], [2, 3, 13, 17, 541])
+        self.assertEqual(nth_prime(10**6), 15485863)
+        with self.assertRaises(ValueError):
+            nth_prime(0)
+        self.assertLess(nth_prime_cost(10**6), 1)
+        self.assertEqual(nth_prime_cost(10**200), float("inf"))
+        # Small numbers cost nothing to check, and numbers of thousands of digits cost far more than a request may take.
+        self.assertEqual([is_prime_cost(n) for n in [-7, 0, 999983]], [0.0, 0.0, 0.0])
+        self.assertLess(prime_search_cost(2**64), 0.01)
+        self.assertGreater(prime_search_cost(10**4000), 60)
+
+    # Test that the benchmark comparison flags a case that got slower than the threshold, and only that case.
+    def test_compare_results(self):
+        def case(start, median, allocated):
+            return {"method": "sieve_of_eratosthenes", "start": start, "end": start + 999, "median_seconds": median, "peak_allocated_bytes": allocated}
+        baseline = {"results": [case(1, 0.010, 1000), case(10**6, 0.020, 1000), {"method": "brute_force", "start": 1, "end": 1000, "skipped": "timeout"}]}
+        results = {"results": [case(1, 0.011, 1000), case(10**6, 0.030, 1000), case(10**9, 0.5, 1000)]}
+        regressions = compare_results(results, baseline, 1.25)
+        self.assertEqual([(r["start"], r["metric"]) for r in regressions], [(10**6, "median_seconds")])
+
+    # Test that every engine gives the same primes, that 'auto' picks a registered engine, and that refitting rescales the cost model.
+    def test_engines(self):
+        for engine in ENGINES.values():
+            self.assertEqual(to_list(engine.function(1000, 1100)), [1009, 1013, 1019, 1021, 1031, 1033, 1039, 1049, 1051, 1061, 1063, 1069, 1087, 1091, 1093, 1097])
+        self.assertIs(get_engine("auto", 1, 10**6), choose_engine(1, 10**6))
+        self.assertIs(get_engine("trial_division", 1, 10), ENGINES["trial_division"])
+        self.assertIsNone(get_engine("unknown", 1, 10))
+        engine = Engine("test", "Test", trial_division_method, unit_seconds=1e-9)
+        base = engine.base_estimate(1, 10**9)
+        self.assertEqual(refit_engine(engine, [(1, 10**9, base * 2), (1, 10**9, base * 3), (1, 10**9, base * 4)]), 3)
+        self.assertAlmostEqual(engine.estimate(1, 10**9), base * 3)
+        self.assertEqual(refit_engine(engine, [(1, 10, 0.5)]), 3)
+
+    # Test that a computation that can be cancelled gives the same primes when it isn't stopped, and stops between chunks when it is.
+    def test_cancellation(self):
+        for method in [trial_division_method, sieve_of_eratosthenes_method]:
+            self.assertEqual(parallel_method(method, 1, 200000, 1, should_stop=lambda: False), sieve_of_eratosthenes_method(1, 200000))
+            checks = []
+            def stop_after_two():
+                checks.append(True)
+                return len(checks) > 2
+            with self.assertRaises(Cancelled):
+                parallel_method(method, 1, 2000000, 1, should_stop=stop_after_two)
+            self.assertEqual(len(checks), 3)
+
+    # Test that dividing the numbers on the wheels by the shared table of primes finds the same primes as the sieve, 
+    # including the small primes the wheels skip, ranges inside one turn of the wheel, and numbers whose square root is past the table.
+    def test_wheel_trial_division(self):
+        for start, end in [(0, 1000), (2, 7), (200, 210), (211, 211), (10**12, 10**12 + 2000), (10**14, 10**14 + 100)]:
+            expected = sieve_of_eratosthenes_method(start, end)
+            self.assertEqual(brute_force_method(start, end), expected)
+            self.assertEqual(trial_division_method(start, end), expected)
+
+    # Test that a batch of ranges is merged into covering ranges and that each range gets back the same primes as when it is sieved alone.
+    def test_sieve_ranges(self):
+        ranges = [(500, 600), (0, 10), (590, 700), (30, 20), (10**6, 10**6 + 100), (650, 660)]
+        self.assertEqual(merge_ranges(ranges, 0), [(2, 10, [1]), (500, 700, [0, 2, 5]), (10**6, 10**6 + 100, [4])])
+        self.assertEqual(len(merge_ranges(ranges, 1000)), 2)
+        self.assertEqual(sieve_ranges(ranges), [sieve_of_eratosthenes_method(start, end) for start, end in ranges])
+        # Ranges spanning several sieve windows, and ranges that start and end inside the same window, are sliced correctly.
+        ranges = [(100, 700000), (262100, 262200), (300000, 900000), (524200, 524300)]
+        self.assertEqual(sieve_ranges(ranges), [sieve_of_eratosthenes_method(start, end) for start, end in ranges])
+        # The stop check runs between windows, so a long range is cancelled part of the way through.
+        checks = []
+        with self.assertRaises(Cancelled):
+            sieve_ranges([(1, 10**6)], should_stop=lambda: checks.append(1) or len(checks) > 2)
+        self.assertEqual(len(checks), 3)
+
+    # Test that the hybrid method finds the same primes as the sieve for small numbers and as Miller-Rabin for very big ones, 
+    # and that narrow windows of very big numbers are split evenly and sent to it by the 'auto' method.
+    def test_hybrid_method(self):
+        for start, end in [(0, 3000), (2, 3), (10**8, 10**8 + 5000)]:
+            self.assertEqual(hybrid_method(start, end), sieve_of_eratosthenes_method(start, end))
+        self.assertEqual(hybrid_method(10**20, 10**20 + 2000), miller_rabin_method(10**20, 10**20 + 2000))
+        self.assertEqual(hybrid_method(10**20, 10**20 + 2000, bound=50), miller_rabin_method(10**20, 10**20 + 2000))
+        self.assertEqual(partition_range(10**30, 10**30 + 99, 4, "log"), [(10**30 + 25 * k, 10**30 + 25 * k + 24) for k in range(4)])
+        self.assertEqual(choose_engine(10**30, 10**30 + 10**5).name, "hybrid")
+
+    # Test that a PrimeSet behaves like the list of primes it stands for, while only storing the gaps.
+    def test_prime_set(self):
+        primes = to_list(sieve_of_eratosthenes_method(0, 100000))
+        prime_set = PrimeSet(primes)
+        self.assertEqual(len(prime_set), len(primes))
+        self.assertEqual(list(prime_set), primes)
+        self.assertEqual(prime_set, primes)
+        self.assertEqual([prime_set[0], prime_set[1000], prime_set[-1]], [primes[0], primes[1000], primes[-1]])
+        self.assertEqual(prime_set[100:5000:7], primes[100:5000:7])
+        self.assertEqual(prime_set.between(1000, 2000), [p for p in primes if 1000 <= p <= 2000])
+        self.assertTrue(99991 in prime_set)
+        self.assertFalse(99987 in prime_set)
+        self.assertEqual(list(prime_set.to_array("I")), primes)
+        self.assertEqual(memoryview(prime_set.gaps).tolist(), [b - a for a, b in zip(primes, primes[1:])])
+        self.assertEqual(pickle.loads(pickle.dumps(prime_set)), primes)
+        self.assertLess(prime_set.nbytes, len(primes) * 4)
+
+        # Gaps too big for two bytes move the set to wider gaps, and sets can be joined.
+        joined = PrimeSet([2, 3])
+        joined.extend(PrimeSet([2**40 + 15]))
+        joined.extend([2**40 + 61])
+        self.assertEqual(joined, [2, 3, 2**40 + 15, 2**40 + 61])
+        self.assertEqual(joined[2], 2**40 + 15)
+
 # This line checks if the script is being run directly (not being imported as a module). If so, it runs the tests.
 if __name__ == '__main__':
     unittest.main()
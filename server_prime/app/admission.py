@@ -0,0 +1,86 @@
+# anyio lets a worker thread run a coroutine on the event loop, used to ask whether the client is still connected.
+import anyio.from_thread
+
+# This module is used for timing the deadline.
+import time
+
+from fastapi import HTTPException
+
+# Importing the error raised by a cancelled computation and the engine chooser
+from .routers.prime_no_generator import Cancelled, choose_engine
+
+# The client connection is checked at most this often, because each check is a round trip to the event loop.
+DISCONNECT_CHECK_SECONDS = 0.25
+
+# The status code used when the client went away before the response was ready. It is never seen by the client,
+# only by the request counters, and it is the code nginx uses for the same thing.
+CLIENT_CLOSED_REQUEST = 499
+
+
+# The class that tells a running computation when to stop: when its deadline has passed or its client has disconnected.
+# Its 'should_stop' method is passed to 'parallel_method', which calls it between two chunks of work.
+class RequestGuard:
+    def __init__(self, http_request, deadline_seconds):
+        self.http_request = http_request
+        self.deadline_seconds = deadline_seconds
+        self.deadline = time.monotonic() + deadline_seconds
+        self.next_disconnect_check = 0.0
+        self.reason = None  # Why the computation was stopped: 'deadline' or 'disconnected'
+
+    # Return True if the computation should stop
+    def should_stop(self):
+        if self.reason is not None:
+            return True
+        now = time.monotonic()
+        if now >= self.deadline:
+            self.reason = "deadline"
+        elif self.http_request is not None and now >= self.next_disconnect_check:
+            self.next_disconnect_check = now + DISCONNECT_CHECK_SECONDS
+            try:
+                if anyio.from_thread.run(self.http_request.is_disconnected):
+                    self.reason = "disconnected"
+            except RuntimeError:
+                # Not running in a worker thread of the event loop, so there is no connection to check
+                pass
+        return self.reason is not None
+
+    # Raise Cancelled if the computation should stop. Used while waiting for a computation started by another request.
+    def check(self):
+        if self.should_stop():
+            raise Cancelled()
+
+    # The HTTP error that answers a request whose computation was stopped
+    def error(self):
+        if self.reason == "deadline":
+            return HTTPException(status_code=504, detail=f"Deadline of {self.deadline_seconds:g} seconds exceeded")
+        return HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed the connection")
+
+
+# This function decides whether a request may run with 'engine', before any work is done.
+# It returns the engine to run, which is a faster one if the request was downgraded, or None if the request should be queued as a job.
+# Requests that don't fit the budget and can't be downgraded or queued are rejected with 413 and their estimated cost.
+def admit(engine, start, end, budget_seconds, over_budget):
+    estimate = engine.estimate(start, end)
+    if estimate <= budget_seconds:
+        return engine
+    if over_budget == "queue":
+        return None
+    if over_budget == "downgrade":
+        fastest = choose_engine(start, end)
+        if fastest.estimate(start, end) <= budget_seconds:
+            return fastest
+    raise HTTPException(
+        status_code=413,
+        detail=f"The '{engine.name}' method is estimated to take {estimate:.3g} seconds on this range, more than the budget of {budget_seconds:g} seconds. "
+               "Use a smaller range, the 'auto' method, or submit it as a background job with POST /jobs.",
+    )
+
+
+# This function rejects a request with 413 if its estimated cost, in seconds, is more than the budget.
+# It's for the endpoints that can only be answered at once, such as counting primes or finding n-th primes, which have no job to queue.
+def check_budget(estimate, budget_seconds, what):
+    if estimate > budget_seconds:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{what} is estimated to take {estimate:.3g} seconds, more than the budget of {budget_seconds:g} seconds. Ask for less at once.",
+        )
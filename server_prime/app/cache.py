@@ -0,0 +1,153 @@
+# The compact result type of the prime number methods. Cached ranges are kept as PrimeSets, about 2 bytes per prime.
+from .routers.prime_no_generator import PrimeSet
+
+# OrderedDict remembers the order in which ranges were last used, for LRU eviction.
+from collections import OrderedDict
+
+# The lock keeps the cache consistent when several requests use it at the same time.
+import threading
+
+# The rough memory cost of one cache entry on top of its primes (the dictionary slot, the key and the PrimeSet itself).
+ENTRY_OVERHEAD = 200
+
+
+# The class that remembers the primes of ranges that were already computed, so overlapping requests only compute what is missing
+class IntervalCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes  # Memory budget for all the cached primes
+        self.entries = OrderedDict()  # (method, low, high) -> PrimeSet of primes, least recently used first
+        self.size = 0  # Memory currently used by the cached primes
+        self.lock = threading.Lock()
+        # The counters are per request and only say what the cache held. A range missing from the cache is handed to 'compute', which may
+        # wait for the same range being computed by a concurrent request instead of computing it again (see SingleFlight in coalescing.py).
+        # Six identical concurrent requests are therefore six misses but only one computation: compare with the single-flight leaders.
+        self.hits = 0  # Requests answered entirely from the cache
+        self.partial_hits = 0  # Requests that found some of their range in the cache
+        self.misses = 0  # Requests that found none of their range in the cache
+        self.evictions = 0  # Entries dropped to stay within the memory budget
+
+    # Memory used by one entry
+    @staticmethod
+    def entry_size(primes):
+        return primes.nbytes + ENTRY_OVERHEAD
+
+    # Return the primes of 'method' between 'start' and 'end'.
+    # Sub-ranges that are already cached are reused, and 'compute(low, high)' is called only for the gaps between them.
+    # The answer is a PrimeSet put together from the cached and computed pieces without turning any of them into a list.
+    def get_primes(self, method, start, end, compute):
+        # Find the cached ranges that overlap the request, in order, and mark them as recently used
+        with self.lock:
+            overlapping = sorted(
+                (key[1], key[2], primes) for key, primes in self.entries.items()
+                if key[0] == method and key[1] <= end and key[2] >= start
+            )
+            for low, high, _ in overlapping:
+                self.entries.move_to_end((method, low, high))
+
+        # Walk over the request from left to right, taking primes from the cache where we can and computing the gaps
+        result = PrimeSet()
+        computed = []
+        cursor = start
+        for low, high, primes in overlapping:
+            if high < cursor:
+                continue
+            if low > cursor:
+                gap = PrimeSet(compute(cursor, low - 1))
+                computed.append((cursor, low - 1, gap))
+                result.extend(gap)
+                cursor = low
+            stop = min(high, end)
+            result.extend(primes.between(cursor, stop))
+            cursor = stop + 1
+            if cursor > end:
+                break
+        if cursor <= end:
+            gap = PrimeSet(compute(cursor, end))
+            computed.append((cursor, end, gap))
+            result.extend(gap)
+
+        # Update the counters and remember the newly computed ranges
+        with self.lock:
+            if not computed:
+                self.hits += 1
+            elif overlapping:
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+            for low, high, primes in computed:
+                self.store(method, low, high, primes)
+        return result
+
+    # Add an entry and drop the least recently used ones until the cache fits its budget again. The lock must be held.
+    def store(self, method, low, high, primes):
+        size = self.entry_size(primes)
+        if size > self.max_bytes or (method, low, high) in self.entries:
+            return
+        self.entries[(method, low, high)] = primes
+        self.size += size
+        while self.size > self.max_bytes:
+            _, dropped = self.entries.popitem(last=False)
+            self.size -= self.entry_size(dropped)
+            self.evictions += 1
+
+    # Return the cache counters
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# The class that remembers finished response bodies, already encoded and compressed, by their ETag.
+# Repeated GET /primes requests for the same range are answered from here without computing or compressing anything.
+class ResponseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes  # Memory budget for all the cached bodies
+        self.entries = OrderedDict()  # ETag -> body, least recently used first
+        self.size = 0  # Memory currently used by the cached bodies
+        self.lock = threading.Lock()
+        self.hits = 0  # Bodies found in the cache
+        self.misses = 0  # Bodies that were not in the cache
+        self.evictions = 0  # Bodies dropped to stay within the memory budget
+
+    # Return the body stored under an ETag, or None
+    def get(self, etag):
+        with self.lock:
+            body = self.entries.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    # Store a body under its ETag and drop the least recently used ones until the cache fits its budget again
+    def put(self, etag, body):
+        size = len(body) + ENTRY_OVERHEAD
+        with self.lock:
+            if size > self.max_bytes or etag in self.entries:
+                return
+            self.entries[etag] = body
+            self.size += size
+            while self.size > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= len(dropped) + ENTRY_OVERHEAD
+                self.evictions += 1
+
+    # Return the cache counters
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,77 @@
+# A Future holds the result of a computation that other threads can wait for.
+from concurrent.futures import Future, wait
+
+# While waiting for a computation started by someone else, the waiter's 'check' function is called this often.
+WAIT_CHECK_SECONDS = 0.05
+
+# The lock keeps the table of computations in flight consistent when several requests use it at the same time.
+import threading
+
+
+# The class that makes concurrent requests for the same work share one computation ("single flight").
+# The first caller for a key runs the computation, and callers that ask for the same key while it is running wait for its result
+# instead of computing it again. Once the computation is done the key is forgotten, so later callers start a new one.
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}  # key -> Future of the computation in flight
+        self.lock = threading.Lock()
+        self.leaders = 0  # Computations actually run
+        self.followers = 0  # Callers that waited for a computation started by someone else
+
+    # Return the result of 'function()' for 'key', sharing it with every concurrent caller of the same key.
+    # If the computation fails, every caller waiting for it gets the same error.
+    # Callers that wait call 'check()' every WAIT_CHECK_SECONDS, and stop waiting if it raises.
+    def do(self, key, function, check=None):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            if check is not None:
+                while not wait([future], timeout=WAIT_CHECK_SECONDS).done:
+                    check()
+            return future.result()
+
+        # The key is forgotten before the waiters are woken up, so a waiter that retries after an error starts a new computation
+        # instead of getting the same failed one back.
+        try:
+            result = function()
+        except BaseException as error:
+            self.forget(key)
+            future.set_exception(error)
+            raise
+        self.forget(key)
+        future.set_result(result)
+        return result
+
+    # Forget the computation in flight for 'key'
+    def forget(self, key):
+        with self.lock:
+            del self.calls[key]
+
+    # Return the counters and the number of computations in flight
+    def stats(self):
+        with self.lock:
+            return {"leaders": self.leaders, "followers": self.followers, "in_flight": len(self.calls)}
+
+
+# This function splits the range from 'start' to 'end' into pieces whose inner boundaries are multiples of 'block'.
+# Every piece but the first and the last is a whole aligned block, so requests for overlapping ranges get the same keys
+# for the blocks they share and can wait on each other's computation of them.
+def aligned_pieces(start, end, block):
+    first = -(-start // block) * block  # First multiple of 'block' at or after 'start'
+    last = (end + 1) // block * block  # First number after the last whole block that ends at or before 'end'
+    if first >= last:
+        return [(start, end)]
+    pieces = []
+    if start < first:
+        pieces.append((start, first - 1))
+    pieces.extend((low, low + block - 1) for low in range(first, last, block))
+    if last <= end:
+        pieces.append((last, end))
+    return pieces
@@ -0,0 +1,82 @@
+# This module gives access to the environment variables and the operating system.
+# Here it's used to read the server settings from the environment, with sensible defaults.
+import os
+
+# The number of worker processes used to split a /primes request across CPU cores.
+# By default every core is used. Set PRIME_JOBS=1 to run each request on a single core.
+PRIME_JOBS = int(os.environ.get("PRIME_JOBS", os.cpu_count() or 1))
+
+# The number of background workers that run jobs submitted through POST /jobs.
+# Jobs beyond this number wait in the queue until a worker is free.
+JOB_WORKERS = int(os.environ.get("PRIME_JOB_WORKERS", 2))
+
+# The folder where job status files and finished job results are saved, so they survive a restart.
+JOB_DIR = os.environ.get("PRIME_JOB_DIR", "./jobs")
+
+# The memory budget of the /primes result cache, in bytes. The least recently used ranges are dropped when it is full.
+CACHE_MAX_BYTES = int(os.environ.get("PRIME_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# The memory budget of the GET /primes response cache, which keeps encoded and compressed bodies by their ETag, in bytes.
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("PRIME_RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# How long HTTP caches and CDNs may keep GET /primes responses of deterministic methods, in seconds. The default is a year.
+PRIMES_MAX_AGE_SECONDS = int(os.environ.get("PRIME_PRIMES_MAX_AGE_SECONDS", 365 * 24 * 3600))
+
+# The path of a prime index file built with 'python prime_no_generator.py build_index limit path'.
+# When it is set, /primes requests up to the index limit are read from the memory-mapped file instead of being computed.
+PRIME_INDEX_PATH = os.environ.get("PRIME_INDEX_PATH", "")
+
+# The base-prime table file shared by all the worker processes, built with 'python prime_no_generator.py build_table limit path'.
+# Build it once before starting the workers; a worker that finds no valid file builds it up to PRIME_BASE_TABLE_LIMIT itself.
+# Every worker then maps the same file read-only instead of keeping its own copy of the base primes. Set it to '' to turn this off.
+BASE_TABLE_PATH = os.environ.get("PRIME_BASE_TABLE_PATH", "./base_primes.tbl")
+BASE_TABLE_LIMIT = int(os.environ.get("PRIME_BASE_TABLE_LIMIT", 1 << 22))
+
+# The largest number of values accepted in one call to the is_prime, next_prime, prev_prime and nth_prime endpoints.
+MAX_POINT_QUERIES = int(os.environ.get("PRIME_MAX_POINT_QUERIES", 10000))
+
+# The execution log is written in batches by a background writer.
+# A batch is written when it reaches TELEMETRY_BATCH_SIZE rows or when TELEMETRY_FLUSH_SECONDS have passed, whichever comes first.
+TELEMETRY_BATCH_SIZE = int(os.environ.get("PRIME_TELEMETRY_BATCH_SIZE", 500))
+TELEMETRY_FLUSH_SECONDS = float(os.environ.get("PRIME_TELEMETRY_FLUSH_SECONDS", 1.0))
+
+# The most log rows that can wait to be written. When the queue is full new rows are dropped instead of slowing down requests.
+TELEMETRY_QUEUE_SIZE = int(os.environ.get("PRIME_TELEMETRY_QUEUE_SIZE", 100000))
+
+# Every PRIME_ROLLUP_SECONDS the rows of the execution log are rolled up into per-minute, per-hour and per-day aggregates of each method,
+# which /executions/summary reads. Raw rows are deleted once they are older than PRIME_RAW_RETENTION_SECONDS and rolled up.
+# Per-minute and per-hour aggregates are kept for PRIME_MINUTE_ROLLUP_RETENTION_SECONDS and PRIME_HOUR_ROLLUP_RETENTION_SECONDS,
+# and per-day aggregates for good, so the database stays bounded. Set PRIME_ROLLUP_SECONDS=0 to keep every raw row instead.
+ROLLUP_SECONDS = float(os.environ.get("PRIME_ROLLUP_SECONDS", 60))
+RAW_RETENTION_SECONDS = float(os.environ.get("PRIME_RAW_RETENTION_SECONDS", 7 * 24 * 3600))
+MINUTE_ROLLUP_RETENTION_SECONDS = float(os.environ.get("PRIME_MINUTE_ROLLUP_RETENTION_SECONDS", 2 * 24 * 3600))
+HOUR_ROLLUP_RETENTION_SECONDS = float(os.environ.get("PRIME_HOUR_ROLLUP_RETENTION_SECONDS", 90 * 24 * 3600))
+
+# Opt-in sampling profiler for slow requests. When PRIME_PROFILE_SLOW_SECONDS is above 0, the stack of every /primes request
+# is sampled every PRIME_PROFILE_INTERVAL_SECONDS, and requests slower than the threshold have their hot stacks saved to PRIME_PROFILE_DIR.
+PROFILE_SLOW_SECONDS = float(os.environ.get("PRIME_PROFILE_SLOW_SECONDS", 0))
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("PRIME_PROFILE_INTERVAL_SECONDS", 0.005))
+PROFILE_DIR = os.environ.get("PRIME_PROFILE_DIR", "./profiles")
+
+# The 'auto' method picks the engine with the lowest estimated cost for each range. Every PRIME_ENGINE_REFIT_SECONDS the cost model
+# of each engine is rescaled from its latest PRIME_ENGINE_REFIT_SAMPLES executions. Set PRIME_ENGINE_REFIT_SECONDS=0 to keep the defaults.
+ENGINE_REFIT_SECONDS = float(os.environ.get("PRIME_ENGINE_REFIT_SECONDS", 60))
+ENGINE_REFIT_SAMPLES = int(os.environ.get("PRIME_ENGINE_REFIT_SAMPLES", 200))
+
+# Concurrent /primes requests for the same work are computed once and share the result. Ranges are split at multiples of
+# PRIME_COALESCE_BLOCK so that overlapping requests share the whole blocks they have in common. It should be a multiple of the sieve segment size.
+COALESCE_BLOCK = int(os.environ.get("PRIME_COALESCE_BLOCK", 1 << 20))
+
+# Admission control for /primes. Before a request runs, the cost model of its engine estimates how long it will take.
+# Requests estimated to take more than PRIME_REQUEST_BUDGET_SECONDS are handled according to PRIME_OVER_BUDGET:
+# 'reject' refuses them with 413, 'downgrade' switches to the fastest engine if that one fits the budget (and rejects them otherwise),
+# and 'queue' submits them as a background job and answers 202 with the job status.
+REQUEST_BUDGET_SECONDS = float(os.environ.get("PRIME_REQUEST_BUDGET_SECONDS", 30))
+OVER_BUDGET = os.environ.get("PRIME_OVER_BUDGET", "reject")
+
+# The longest a /primes request may run, in seconds. Clients can ask for a shorter deadline with the 'deadline' form field.
+# Requests that pass their deadline, or whose client disconnects, stop between two chunks of work.
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("PRIME_REQUEST_DEADLINE_SECONDS", 60))
+
+# The largest number of ranges accepted in one call to /primes/batch.
+MAX_BATCH_RANGES = int(os.environ.get("PRIME_MAX_BATCH_RANGES", 10000))
@@ -1,6 +1,5 @@
-# Importing the functions from SQLAlchemy for database connection and session management.
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+# Importing the functions from SQLAlchemy for database connection.
+from sqlalchemy import create_engine, text, event
 
 # Defining the database connection string for a SQLite database.
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -10,16 +9,45 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 
-# Creating a configured "SessionLocal" class which will serve as a factory for new Session objects.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Switching every new connection to write-ahead logging (WAL). With WAL, readers don't block the writer and the writer doesn't block readers,
+# and 'synchronous=NORMAL' makes each commit cheaper while staying safe from corruption.
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 
-# A dependency function that will be used to generate database sessions.
-def get_db():
-    # Creating a new session instance from the session factory defined above.
-    db = SessionLocal()
-    try:
-        # Yielding the session and engine to be used in the endpoint function.
-        yield db,engine
-    finally:
-        # Ensuring the session is closed properly after the request is finished.
-        db.close()
+
+# A function that creates the executions and rollup tables and their indexes if they don't exist yet.
+# It runs when the application starts, so a new database works without creating the tables by hand.
+def init_db():
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS executions (id INTEGER PRIMARY KEY, timestamp VARCHAR, range_start INTEGER, range_end INTEGER, time_elapsed REAL, "
+            "method TEXT, num_primes INTEGER, created_at REAL, source TEXT, compute_seconds REAL)"
+        ))
+        # Databases made before these columns existed get them added, and their old rows are left without values:
+        # created_at is the time of the execution in seconds since the epoch, source tells whether the primes were computed,
+        # cached or read from the index, and compute_seconds is the time the engine itself ran.
+        columns = [row[1] for row in connection.execute(text("PRAGMA table_info(executions)"))]
+        for column, column_type in (("created_at", "REAL"), ("source", "TEXT"), ("compute_seconds", "REAL")):
+            if column not in columns:
+                connection.execute(text(f"ALTER TABLE executions ADD COLUMN {column} {column_type}"))
+        # The indexes let the execution history be filtered by method and time without scanning the whole table.
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_executions_method_id ON executions (method, id)"))
+        # The time-of-day 'timestamp' column has no date and no query filters on it any more, so its old index only slowed down inserts
+        connection.execute(text("DROP INDEX IF EXISTS ix_executions_timestamp"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_executions_created_at ON executions (created_at)"))
+        # The engine refitter reads the latest computed executions of each method
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_executions_method_source_id ON executions (method, source, id)"))
+
+        # The per-minute, per-hour and per-day aggregates of the executions of each method (see rollups.py), keyed so that
+        # a time window is read, and an expired resolution deleted, as one range of the primary key.
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS execution_rollups (resolution INTEGER, bucket_start INTEGER, method TEXT, count INTEGER, time_sum REAL, "
+            "time_max REAL, num_primes INTEGER, numbers_checked INTEGER, sketch TEXT, PRIMARY KEY (resolution, bucket_start, method)) WITHOUT ROWID"
+        ))
+        # The id of the last execution that was rolled up
+        connection.execute(text("CREATE TABLE IF NOT EXISTS rollup_state (key TEXT PRIMARY KEY, value INTEGER)"))
+        connection.execute(text("INSERT OR IGNORE INTO rollup_state (key, value) VALUES ('last_id', 0)"))
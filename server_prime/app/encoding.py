@@ -0,0 +1,249 @@
+# The array module turns a list of ints into one compact C buffer without making a Python object per element.
+from array import array
+
+# This module is used for packing the header fields of the msgpack format.
+import struct
+
+# This module tells whether the machine stores numbers little-endian or big-endian.
+import sys
+
+# These modules are used to compress response bodies with gzip, and to derive ETags from requests.
+import gzip
+import hashlib
+import json
+
+# The engines return their primes as a PrimeSet, which the encoders read without making a list first
+from .routers.prime_no_generator import PrimeSet
+
+# NumPy is optional. When it is installed the encoders work on whole arrays at once.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Brotli is optional too. Without it, responses are only compressed with gzip.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# The media types /primes can answer with, besides JSON
+UINT32 = "application/x-primes-uint32"  # Raw little-endian unsigned 32-bit integers
+UINT64 = "application/x-primes-uint64"  # Raw little-endian unsigned 64-bit integers
+DELTA_VARINT = "application/x-primes-delta-varint"  # The first prime, then the gaps between primes, as LEB128 varints
+MSGPACK = "application/msgpack"  # A msgpack map {"primes": [...], "time_elapsed": ...}
+JSON = "application/json"
+
+# The media types in the order they are checked, with the alternative name some clients use for msgpack
+MEDIA_TYPES = {UINT32: UINT32, UINT64: UINT64, DELTA_VARINT: DELTA_VARINT, MSGPACK: MSGPACK, "application/x-msgpack": MSGPACK, JSON: JSON}
+
+
+# The content codings responses can be compressed with, best first. Brotli is only offered when it is installed.
+BROTLI = "br"
+GZIP = "gzip"
+IDENTITY = "identity"
+CONTENT_CODINGS = ([BROTLI] if brotli is not None else []) + [GZIP]
+
+# Bodies are compressed once and then served from the response cache many times, so a high compression level pays off.
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 512
+
+# Bumped whenever the bodies of GET /primes change shape, so that the ETags handed out before no longer match
+FORMAT_VERSION = 1
+
+
+# Split a header such as Accept or Accept-Encoding into its values and their qualities, in the order they are listed
+def header_qualities(header):
+    for part in (header or "").split(","):
+        fields = [field.strip() for field in part.split(";")]
+        quality = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    quality = float(field[2:])
+                except ValueError:
+                    quality = 0.0
+        yield fields[0].lower(), quality
+
+
+# Pick the response format from an Accept header. The media type with the highest quality wins, and ties go to the one listed first.
+# Anything we don't know, including */*, falls back to JSON.
+def negotiate(accept_header):
+    best, best_quality = JSON, 0.0
+    for name, quality in header_qualities(accept_header):
+        media_type = MEDIA_TYPES.get(name)
+        if media_type is not None and quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+# Pick the content coding from an Accept-Encoding header. The coding with the highest quality wins, and ties go to the better one.
+# Without a header, or if the client accepts none of ours, the body is sent as it is.
+def negotiate_encoding(accept_encoding):
+    qualities = dict(header_qualities(accept_encoding))
+    best, best_quality = IDENTITY, 0.0
+    for coding in CONTENT_CODINGS:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+# Compress a body with a content coding. gzip is written without a timestamp, so the same body always compresses to the same bytes.
+def compress(body, coding):
+    if coding == GZIP:
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if coding == BROTLI:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return body
+
+
+# The strong ETag of a GET /primes body. The same method and range always give the same primes, so the tag is derived from the request
+# rather than from the body, and can be checked before anything is computed. Each media type and content coding is a different body
+# and gets a different tag.
+def primes_etag(method, start, end, media_type, coding):
+    digest = hashlib.sha256(f"{FORMAT_VERSION}:{method}:{start}:{end}:{media_type}".encode()).hexdigest()[:32]
+    return f'"{digest}"' if coding == IDENTITY else f'"{digest}-{coding}"'
+
+
+# Check an If-None-Match header against an ETag. As the HTTP spec asks, the comparison is weak (a W/ prefix is ignored) and * matches anything.
+def etag_matches(if_none_match, etag):
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# Copy the primes into an array of the given type code. A PrimeSet rebuilds the values from its gaps in one go.
+def to_array(primes, typecode):
+    if isinstance(primes, PrimeSet):
+        return primes.to_array(typecode)
+    return array(typecode, primes)
+
+
+# Write the primes as raw little-endian unsigned integers of 4 or 8 bytes each
+def encode_uint(primes, itemsize):
+    if len(primes) and (primes[-1] >> (8 * itemsize)):
+        raise ValueError(f"Primes do not fit in {8 * itemsize} bits")
+    values = to_array(primes, "I" if itemsize == 4 else "Q")
+    # The 'I' type code is 4 bytes on every platform we support, and 'Q' is always 8
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+# Write the first prime and then each gap between primes as an unsigned LEB128 varint:
+# 7 bits per byte, lowest bits first, with the top bit set on every byte except the last one of a value.
+# Prime gaps are small, so almost every gap takes a single byte.
+def encode_delta_varint(primes):
+    if len(primes) == 0:
+        return b""
+    if isinstance(primes, PrimeSet):
+        # A PrimeSet already holds the gaps. When every gap fits in a single varint byte they are the body as they are;
+        # the first gap of 128 or more comes after 1,357,201, and such gaps stay rare far beyond that.
+        head = encode_delta_varint([primes.first])
+        if not primes.gaps or max(primes.gaps) < 0x80:
+            return head + array("B", primes.gaps).tobytes()
+    if numpy is not None and primes[-1] < 2**64:
+        if isinstance(primes, PrimeSet):
+            deltas = numpy.empty(len(primes), dtype=numpy.uint64)
+            deltas[0] = primes.first
+            deltas[1:] = numpy.frombuffer(primes.gaps, dtype=primes.gaps.typecode)
+        else:
+            values = numpy.asarray(primes, dtype=numpy.uint64)
+            deltas = numpy.empty_like(values)
+            deltas[0] = values[0]
+            deltas[1:] = numpy.diff(values)
+
+        # Work out how many bytes each value takes, and where each one starts in the output
+        sizes = numpy.ones(len(deltas), dtype=numpy.int64)
+        for k in range(1, 10):
+            sizes += deltas >= numpy.uint64(1 << (7 * k))
+        offsets = numpy.cumsum(sizes) - sizes
+        output = numpy.zeros(int(sizes.sum()), dtype=numpy.uint8)
+
+        # Fill in byte k of every value that has at least k + 1 bytes
+        for k in range(int(sizes.max())):
+            has_byte = sizes > k
+            low_bits = (deltas[has_byte] >> numpy.uint64(7 * k)) & numpy.uint64(0x7F)
+            more = (sizes[has_byte] > k + 1).astype(numpy.uint64) << numpy.uint64(7)
+            output[offsets[has_byte] + k] = (low_bits | more).astype(numpy.uint8)
+        return output.tobytes()
+
+    output = bytearray()
+    previous = 0
+    for prime in primes:
+        delta = prime - previous
+        previous = prime
+        while delta >= 0x80:
+            output.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        output.append(delta)
+    return bytes(output)
+
+
+# Read primes back from the delta-varint format. Clients can copy this to decode the responses.
+def decode_delta_varint(data):
+    primes = []
+    previous = 0
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            previous += value
+            primes.append(previous)
+            value = 0
+            shift = 0
+    return primes
+
+
+# Write the primes as a JSON object {"primes": [...], "time_elapsed": ...}, leaving out time_elapsed when it is None.
+# The primes are written out one by one, so a PrimeSet never has to become a list first.
+def encode_json(primes, time_elapsed):
+    body = '{"primes":[' + ",".join(map(str, primes)) + "]"
+    if time_elapsed is not None:
+        body += ',"time_elapsed":' + json.dumps(time_elapsed)
+    return (body + "}").encode()
+
+
+# Write the primes as a msgpack map {"primes": [...], "time_elapsed": ...}, leaving out time_elapsed when it is None.
+# Every prime is stored as a msgpack uint64 (the 0xcf marker and 8 big-endian bytes), so the array is built by
+# interleaving slices of one buffer instead of packing each number on its own, and the msgpack package is not needed.
+def encode_msgpack(primes, time_elapsed):
+    count = len(primes)
+    if count and primes[-1] >= 2**64:
+        raise ValueError("Primes do not fit in 64 bits")
+    values = to_array(primes, "Q")
+    if sys.byteorder == "little":
+        values.byteswap()
+    big_endian = values.tobytes()
+
+    body = bytearray(9 * count)
+    body[0::9] = b"\xcf" * count
+    for k in range(8):
+        body[k + 1::9] = big_endian[k::8]
+
+    if time_elapsed is None:
+        return b"\x81" + b"\xa6primes" + b"\xdd" + struct.pack(">I", count) + bytes(body)
+    header = b"\x82" + b"\xa6primes" + b"\xdd" + struct.pack(">I", count)
+    footer = b"\xactime_elapsed" + b"\xcb" + struct.pack(">d", time_elapsed)
+    return header + bytes(body) + footer
+
+
+# Encode the primes in the given media type. Returns None for JSON, which is left to the normal response model.
+def encode(primes, media_type, time_elapsed):
+    if media_type == UINT32:
+        return encode_uint(primes, 4)
+    if media_type == UINT64:
+        return encode_uint(primes, 8)
+    if media_type == DELTA_VARINT:
+        return encode_delta_varint(primes)
+    if media_type == MSGPACK:
+        return encode_msgpack(primes, time_elapsed)
+    return None
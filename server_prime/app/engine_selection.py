@@ -0,0 +1,68 @@
+# Failed refits are reported through the standard logging module.
+import logging
+
+# The refitter runs in a thread of its own, so requests never wait for the execution history to be read.
+import threading
+
+# SQLAlchemy imports
+from sqlalchemy import text
+
+# Importing the database engine, the server settings and the engine registry
+from .database import engine
+from . import config
+from .routers.prime_no_generator import ENGINES, refit_engine
+
+logger = logging.getLogger(__name__)
+
+# The statement used to read the latest executions of one method, newest first, with the time the engine ran.
+# Only executions the engine computed on its own are read: requests answered from the cache, the prime index or
+# another request's computation take next to no time, and would make the engine look far faster than it is.
+LATEST_EXECUTIONS = text(
+    "SELECT range_start, range_end, compute_seconds FROM executions WHERE method = :method AND source = 'computed' ORDER BY id DESC LIMIT :limit"
+)
+
+
+# The class that keeps the cost models of the engines in line with the machine the server runs on.
+# Every 'interval' seconds it reads the latest 'samples' executions of each engine from the execution log
+# and rescales the engine's cost model, so the 'auto' method picks engines by their measured speed rather than the defaults.
+class EngineRefitter:
+    def __init__(self, engine, interval, samples):
+        self.engine = engine
+        self.interval = interval  # Seconds between two refits
+        self.samples = samples  # Executions of each engine used for a refit
+        self.stopping = threading.Event()
+        self.thread = None
+
+    # Start the refitter thread
+    def start(self):
+        if self.thread is None and self.interval > 0:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="engine-refitter", daemon=True)
+            self.thread.start()
+
+    # Stop the refitter thread
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    # Rescale every engine from its latest executions. Engines that haven't run yet keep their current scale.
+    def refit(self):
+        with self.engine.connect() as connection:
+            for prime_engine in ENGINES.values():
+                rows = connection.execute(LATEST_EXECUTIONS, {"method": prime_engine.name, "limit": self.samples}).fetchall()
+                refit_engine(prime_engine, [(row.range_start, row.range_end, row.compute_seconds) for row in rows])
+
+    # The refitter thread: refit, then wait for the next round or for stop
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.refit()
+            except Exception as error:
+                # A missing table or a locked database only skips this round
+                logger.warning("Engine refit failed: %s", error)
+
+
+# The refitter shared by the whole application
+engine_refitter = EngineRefitter(engine, config.ENGINE_REFIT_SECONDS, config.ENGINE_REFIT_SAMPLES)
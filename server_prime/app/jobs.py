@@ -0,0 +1,256 @@
+# This module gives access to files and folders.
+# Here it's used to save job status files and results in the job folder.
+import os
+
+# This module is used to read and write JSON.
+# Here it's used for the job status files.
+import json
+
+# This module is used to create unique ids for the jobs.
+import uuid
+
+# This module is used for timing operations.
+import time
+
+# The lock keeps the job table consistent when several workers update it at the same time.
+import threading
+
+# The thread pool is the bounded set of background workers that run the jobs.
+# The threads only hand the windows of a job to the shared process pool and write out the results, so they don't hold the GIL for long.
+from concurrent.futures import ThreadPoolExecutor
+
+# The windows sent to the process pool and not collected yet, in order
+from collections import deque
+
+# Each job has a lock file, and the worker process holding the lock is the one that runs the job.
+# The operating system releases the lock when that process exits, so a job left unfinished by a crashed worker can be claimed again.
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl. msvcrt locks the first byte of the file instead.
+    fcntl = None
+    import msvcrt
+
+# Importing the shared process pool, which computes the windows of a job one by one
+from .routers.prime_no_generator import get_executor, SEGMENT_SIZE, Cancelled
+
+
+# Lock an open file without waiting. It returns False if another process holds the lock.
+def try_lock(lock_file):
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+# The class that runs long prime number computations in the background and keeps track of them.
+# The job folder is shared by every worker process of the server. Each job is run by the process that claimed it (see 'claim'),
+# and the other processes read its status from its file, so any of them can answer for any job.
+class JobManager:
+    def __init__(self, job_dir, workers, get_method_engine, log_execution, process_workers):
+        self.job_dir = job_dir  # Folder where status files and results are saved
+        self.workers = workers  # Number of background workers
+        self.get_method_engine = get_method_engine  # Function that turns a method name and a range into an engine
+        self.log_execution = log_execution  # Function that writes a finished job to the executions table
+        self.process_workers = process_workers  # Size of the shared process pool the windows are computed on
+        self.jobs = {}  # Status of the jobs this process has claimed, by id
+        self.claims = {}  # Open lock file of each job this process has claimed and not finished yet, by id
+        self.lock = threading.Lock()
+        self.executor = None
+        self.stopping = threading.Event()  # Set while the workers are being stopped, so running jobs stop between two windows
+
+    # Path of the status file of a job
+    def status_path(self, job_id):
+        return os.path.join(self.job_dir, job_id + ".json")
+
+    # Path of the result file of a job
+    def result_path(self, job_id):
+        return os.path.join(self.job_dir, job_id + ".result.json")
+
+    # Path of the lock file of a job
+    def lock_path(self, job_id):
+        return os.path.join(self.job_dir, job_id + ".lock")
+
+    # Claim a job for this process. It returns False if another process has already claimed it.
+    def claim(self, job_id):
+        lock_file = open(self.lock_path(job_id), "a")
+        if not try_lock(lock_file):
+            lock_file.close()
+            return False
+        self.claims[job_id] = lock_file
+        return True
+
+    # Give up the claim on a job. The lock file of a finished job is removed; whoever opens it in the meantime finds the job finished.
+    def release(self, job_id, finished):
+        self.claims.pop(job_id).close()
+        if finished:
+            try:
+                os.remove(self.lock_path(job_id))
+            except OSError:
+                pass
+
+    # Read the status of a job from its file, or None if there is no such job
+    def load(self, job_id):
+        # Job ids are hex strings, so anything else can't name a file in the job folder
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self.status_path(job_id)) as status_file:
+                return json.load(status_file)
+        except FileNotFoundError:
+            return None
+
+    # Start the background workers, and pick up the jobs that were saved before the last restart
+    def start(self):
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.stopping.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prime-job")
+        for file_name in sorted(os.listdir(self.job_dir)):
+            if not file_name.endswith(".json") or file_name.endswith(".result.json"):
+                continue
+            job_id = file_name[:-len(".json")]
+            # Jobs that had not finished when the server stopped are run again from the beginning, by the first process to claim them.
+            # The status is read again once the job is claimed, because another process may have finished it in the meantime.
+            if self.load(job_id)["status"] not in ("queued", "running") or not self.claim(job_id):
+                continue
+            job = self.load(job_id)
+            if job["status"] not in ("queued", "running"):
+                self.release(job_id, finished=True)
+                continue
+            job["status"] = "queued"
+            job["progress"] = 0.0
+            with self.lock:
+                self.jobs[job_id] = job
+                self.save(job)
+            self.executor.submit(self.run, job_id)
+
+    # Stop the background workers. Running jobs stop at the end of their current window and are queued again,
+    # so they run from the beginning at the next start instead of keeping the server from shutting down.
+    def stop(self):
+        if self.executor is not None:
+            self.stopping.set()
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            # Jobs that never started keep their claim until here. Releasing it lets another process pick them up.
+            for job_id in list(self.claims):
+                self.release(job_id, finished=False)
+
+    # Save the status of a job to its file. Writing to a temporary file first means a crash never leaves a half-written file.
+    def save(self, job):
+        temporary_path = self.status_path(job["id"]) + ".tmp"
+        with open(temporary_path, "w") as status_file:
+            json.dump(job, status_file)
+        os.replace(temporary_path, self.status_path(job["id"]))
+
+    # Update some fields of a job and save it
+    def update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            self.save(job)
+
+    # Add a new job to the queue and return its status
+    def submit(self, method, start, end):
+        # Check the method name before the job is queued, so bad requests fail straight away
+        self.get_method_engine(method, start, end)
+        job = {
+            "id": uuid.uuid4().hex,
+            "method": method,
+            "start": start,
+            "end": end,
+            "status": "queued",
+            "progress": 0.0,
+            "num_primes": None,
+            "time_elapsed": None,
+            "error": None,
+            "created": time.time(),
+        }
+        # The copy returned is taken before the job is handed to a worker, which may start changing it straight away
+        self.claim(job["id"])
+        with self.lock:
+            self.jobs[job["id"]] = job
+            self.save(job)
+            snapshot = dict(job)
+        self.executor.submit(self.run, job["id"])
+        return snapshot
+
+    # Return a copy of the status of a job, or None if there is no such job.
+    # Jobs claimed by another process are read from their status file, which that process keeps up to date.
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self.load(job_id)
+
+    # Count the jobs in each status, across every process sharing the job folder
+    def count_by_status(self):
+        counts = {}
+        for file_name in os.listdir(self.job_dir):
+            if file_name.endswith(".json") and not file_name.endswith(".result.json"):
+                job = self.get(file_name[:-len(".json")])
+                if job is not None:
+                    counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    # Run a job on a background worker. The windows are computed in the shared process pool, a few at a time so every core stays busy,
+    # and this thread writes them out in order.
+    def run(self, job_id):
+        job = self.get(job_id)
+        start, end = job["start"], job["end"]
+        start_time = time.time()
+        self.update(job_id, status="running")
+        pending = deque()
+        try:
+            engine = self.get_method_engine(job["method"], start, end)
+            total = max(end - start + 1, 1)
+            num_primes = 0
+            pool = get_executor(self.process_workers)
+            windows = iter(range(start, end + 1, SEGMENT_SIZE))
+
+            # Send the next window to the process pool, if there is one left
+            def send_window():
+                low = next(windows, None)
+                if low is not None:
+                    pending.append(pool.submit(engine.function, low, min(low + SEGMENT_SIZE - 1, end)))
+
+            # The result is written window by window, in the same shape as PrimeResponse, so memory stays flat however big the range is
+            temporary_path = self.result_path(job_id) + ".tmp"
+            with open(temporary_path, "w") as result_file:
+                result_file.write('{"primes":[')
+                for _ in range(self.process_workers):
+                    send_window()
+                index = 0
+                while pending:
+                    if self.stopping.is_set():
+                        raise Cancelled()
+                    segment = pending.popleft().result()
+                    send_window()
+                    if len(segment):
+                        result_file.write(("," if num_primes else "") + ",".join(map(str, segment)))
+                        num_primes += len(segment)
+                    index += 1
+                    done = min(index * SEGMENT_SIZE, total)
+                    self.update(job_id, progress=round(done / total, 4))
+                time_elapsed = time.time() - start_time
+                result_file.write('],"time_elapsed":' + str(time_elapsed) + '}')
+            os.replace(temporary_path, self.result_path(job_id))
+
+            self.update(job_id, status="done", progress=1.0, num_primes=num_primes, time_elapsed=time_elapsed)
+            self.log_execution(num_primes, engine.name, start, end, start_time)
+        except Cancelled:
+            os.remove(temporary_path)
+            self.update(job_id, status="queued", progress=0.0)
+        except Exception as error:
+            self.update(job_id, status="failed", error=str(error))
+        finally:
+            # Windows that haven't started yet are dropped
+            for future in pending:
+                future.cancel()
+            with self.lock:
+                finished = self.jobs[job_id]["status"] in ("done", "failed")
+            self.release(job_id, finished)
@@ -1,13 +1,104 @@
 # Importing the FastAPI class to create an instance of the web application.
 from fastapi import FastAPI
 
-# Importing the 'primes' and 'executions' modules from the 'routers' package.
-# These modules contain the APIRouter instances that define the routes for the prime number generation and execution details.
-from .routers import primes,executions
+# Importing the 'primes', 'executions', 'jobs', 'queries' and 'metrics' modules from the 'routers' package.
+# These modules contain the APIRouter instances that define the routes for the prime number generation, execution details, background jobs,
+# single-number questions such as is_prime, and the Prometheus metrics.
+from .routers import primes,executions,jobs,queries
+from .routers import metrics as metrics_router
+
+# Importing the metrics registry, used to count the requests in flight.
+from . import metrics
+
+# Importing the function that stops the shared process pool used to run the prime number methods in parallel.
+from .routers.prime_no_generator import shutdown_executor
+
+# Importing the function that creates the executions table and its indexes.
+from .database import init_db
+
+# Importing the background writer of the execution log.
+from .telemetry import execution_log
+
+# Importing the background refitter of the engine cost models.
+from .engine_selection import engine_refitter
+
+# Importing the background compactor of the execution log.
+from .rollups import rollup_compactor
 
 # Creating an instance of the FastAPI application.
 app = FastAPI()
 
-# Including the routers from the 'primes' and 'executions' modules into the main application.
+# Including the routers from the 'primes', 'executions', 'jobs', 'queries' and 'metrics' modules into the main application.
 app.include_router(primes.router)
 app.include_router(executions.router)
+app.include_router(jobs.router)
+app.include_router(queries.router)
+app.include_router(metrics_router.router)
+
+
+# Counting every request while it is handled, and by its route and status code once it is done.
+# The route template (such as /jobs/{job_id}) is used rather than the actual path, so each job doesn't get its own metric.
+@app.middleware("http")
+async def track_requests(request, call_next):
+    metrics.IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.IN_FLIGHT.dec()
+    route = request.scope.get("route")
+    metrics.REQUESTS.inc(route.path if route is not None else "unmatched", str(response.status_code))
+    return response
+
+
+# Creating the executions table and its indexes when the application starts, if they don't exist yet.
+@app.on_event("startup")
+def create_tables():
+    init_db()
+
+
+# Attaching the base-prime table shared by all the worker processes when the application starts, before anything is computed.
+@app.on_event("startup")
+def attach_base_prime_table():
+    primes.load_base_prime_table()
+
+
+
+# Starting the execution log writer when the application starts.
+@app.on_event("startup")
+def start_execution_log():
+    execution_log.start()
+
+
+# Starting the engine refitter when the application starts. It rescales the cost models used by the 'auto' method from the execution log.
+@app.on_event("startup")
+def start_engine_refitter():
+    engine_refitter.start()
+
+
+# Starting the execution log compactor when the application starts. It rolls old rows up into per-minute, per-hour and per-day aggregates.
+@app.on_event("startup")
+def start_rollup_compactor():
+    rollup_compactor.start()
+
+
+# Starting the background job workers when the application starts. Jobs saved before a restart are picked up again.
+@app.on_event("startup")
+def start_jobs():
+    jobs.job_manager.start()
+
+
+# Opening the prime index file, if one is configured, when the application starts.
+@app.on_event("startup")
+def open_prime_index():
+    primes.load_prime_index()
+
+
+# Stopping the worker processes when the application shuts down.
+@app.on_event("shutdown")
+def stop_workers():
+    jobs.job_manager.stop()
+    engine_refitter.stop()
+    rollup_compactor.stop()
+    shutdown_executor()
+    # Stopping the execution log writer last, so it writes the rows logged by the jobs that just finished.
+    execution_log.stop()
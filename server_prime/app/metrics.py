@@ -0,0 +1,147 @@
+# The lock keeps the counters consistent when several requests update them at the same time.
+import threading
+
+# This module is used for timing operations.
+import time
+
+# contextmanager turns a generator function into a 'with' block, used to time the phases of a request.
+from contextlib import contextmanager
+
+# The upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# Format the labels of one sample in the Prometheus text format, e.g. {method="sieve_of_eratosthenes"}
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# A value that only goes up, such as a number of requests. One value is kept per combination of label values.
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+# A value that can go up and down, such as the number of requests in flight.
+# A gauge can also read its value from a function when /metrics is scraped, through 'collect'.
+class Gauge:
+    def __init__(self, name, help_text, labels=(), collect=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.collect = collect  # Function returning {label values: value}, called on every scrape
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.collect is not None:
+            values = self.collect()
+        else:
+            with self.lock:
+                values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+# The distribution of a value, such as a latency, counted in cumulative buckets together with the sum and the count of all observations.
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((label_values, list(state)) for label_values, state in self.values.items())
+        for label_values, state in items:
+            for bound, count in zip(self.buckets, state):
+                labels = format_labels(self.labels + ("le",), label_values + (repr(float(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = format_labels(self.labels + ("le",), label_values + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {state[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {state[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {state[-1]}")
+        return lines
+
+
+# Every metric the application exposes, in the order they appear on /metrics
+registry = []
+
+# Add a metric to the registry and return it
+def register(metric):
+    registry.append(metric)
+    return metric
+
+# Render every registered metric in the Prometheus text format
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# The metrics of the prime number service
+REQUESTS = register(Counter("prime_http_requests_total", "HTTP requests handled, by path and status code.", ("path", "status")))
+IN_FLIGHT = register(Gauge("prime_http_requests_in_flight", "HTTP requests being handled right now."))
+PHASE_SECONDS = register(Histogram("prime_request_phase_seconds", "Time spent in each phase of a /primes request.", ("phase", "method")))
+METHOD_SECONDS = register(Histogram("prime_method_seconds", "Time taken to compute the primes of a request, by method.", ("method",)))
+NUMBERS_CHECKED = register(Counter("prime_numbers_checked_total", "Numbers covered by the ranges of finished requests, by method.", ("method",)))
+PRIMES_FOUND = register(Counter("prime_primes_found_total", "Primes returned by finished requests, by method.", ("method",)))
+ADMISSIONS = register(Counter("prime_admissions_total", "Admission decisions for /primes requests: admitted, downgraded, queued or rejected.", ("outcome",)))
+CANCELLATIONS = register(Counter("prime_cancellations_total", "Computations stopped before they finished, by reason.", ("reason",)))
+GET_RESPONSES = register(Counter("prime_get_responses_total", "GET /primes responses: not_modified, cached or computed.", ("outcome",)))
+
+
+# Time a phase of a request and record it in the phase histogram
+@contextmanager
+def phase(name, method):
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - begin, name, method)
@@ -2,7 +2,7 @@
 from pydantic import BaseModel
 
 # Importing the List class from the typing module to specify a list of items of a specific type.
-from typing import List
+from typing import List, Optional
 
 # Defining a data model for the prime number generation request.
 # This model will validate the incoming request data against the defined fields.
@@ -15,4 +15,53 @@ class PrimeRequest(BaseModel):
 # This model ensures that the response data conforms to the specified structure.
 class PrimeResponse(BaseModel):
     primes: List[int]  # A list of integers representing the prime numbers found within the specified range.
-    time_elapsed: float  # A float representing the time elapsed during the prime number generation process, in seconds.
\ No newline at end of file
+    time_elapsed: Optional[float] = None  # A float representing the time elapsed during the prime number generation process, in seconds. GET /primes sends it in the X-Time-Elapsed header instead.
+
+# Defining a data model for the response of the prime counting endpoint.
+class PrimeCountResponse(BaseModel):
+    start: int  # The start of the range.
+    end: int  # The end of the range.
+    count: int  # The number of primes between start and end, both included.
+    time_elapsed: float  # The time taken to count them, in seconds.
+
+# Defining a data model for one range of a batch sent to the /primes/batch endpoint.
+class PrimeRange(BaseModel):
+    start: int  # The start of the range.
+    end: int  # The end of the range.
+
+# Defining a data model for a batch of ranges sent to the /primes/batch endpoint.
+class PrimeBatchRequest(BaseModel):
+    ranges: List[PrimeRange]  # The ranges to find the primes of.
+
+# Defining a data model for the response of the /primes/batch endpoint.
+class PrimeBatchResponse(BaseModel):
+    primes: List[List[int]]  # For each range, in the order they were sent, the primes it holds.
+    time_elapsed: float  # The time taken to answer the whole batch, in seconds.
+
+# Defining a data model for a batch of numbers sent to the is_prime, next_prime, prev_prime and nth_prime endpoints.
+class PointQueryRequest(BaseModel):
+    numbers: List[int]  # The numbers to ask about.
+
+# Defining a data model for the answers of the is_prime endpoint.
+class IsPrimeResponse(BaseModel):
+    numbers: List[int]  # The numbers that were asked about.
+    is_prime: List[bool]  # For each number, whether it is prime.
+
+# Defining a data model for the answers of the next_prime, prev_prime and nth_prime endpoints.
+class PrimeQueryResponse(BaseModel):
+    numbers: List[int]  # The numbers that were asked about.
+    primes: List[Optional[int]]  # For each number, the prime that answers the question, or None if there is none.
+
+# Defining a data model for the status of a background job.
+# This model is returned when a job is submitted and whenever its status is checked.
+class JobStatus(BaseModel):
+    id: str  # The unique id of the job.
+    method: str  # The method used for prime number generation.
+    start: int  # The start of the range.
+    end: int  # The end of the range.
+    status: str  # One of 'queued', 'running', 'done' or 'failed'.
+    progress: float  # The fraction of the range that has been checked so far, from 0 to 1.
+    num_primes: Optional[int] = None  # The number of primes found, once the job is done.
+    time_elapsed: Optional[float] = None  # The time the job took, in seconds, once it is done.
+    error: Optional[str] = None  # The error message, if the job failed.
+    created: float  # The time the job was submitted, in seconds since the epoch.
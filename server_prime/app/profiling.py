@@ -0,0 +1,70 @@
+# These modules are used to read the stacks of the running threads.
+import sys
+import threading
+import traceback
+
+# This module is used for timing operations.
+import time
+
+# This module gives access to files and folders, used to save the profiles.
+import os
+
+# Counter adds up how often each stack was seen.
+from collections import Counter
+
+# contextmanager turns a generator function into a 'with' block.
+from contextlib import contextmanager
+
+# Importing the server settings
+from . import config
+
+
+# The class that samples the stack of one thread at a fixed interval, from a thread of its own
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id  # The thread whose stack is sampled
+        self.interval = interval  # Seconds between two samples
+        self.stacks = Counter()  # How often each stack was seen, in the 'folded' format used by flame graph tools
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+
+    # Take samples until stopped
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            self.stacks[";".join(f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})" for entry in stack)] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+# Profile the code inside the 'with' block when profiling is switched on with PRIME_PROFILE_SLOW_SECONDS.
+# The stack of the current thread is sampled while the block runs, and if the block took longer than the threshold,
+# the hot stacks are saved to PRIME_PROFILE_DIR as a '.folded' file that flame graph tools can read.
+@contextmanager
+def profile_if_slow(name):
+    if config.PROFILE_SLOW_SECONDS <= 0:
+        yield
+        return
+
+    sampler = StackSampler(threading.get_ident(), config.PROFILE_INTERVAL_SECONDS)
+    sampler.start()
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        duration = time.perf_counter() - begin
+        if duration >= config.PROFILE_SLOW_SECONDS and sampler.stacks:
+            os.makedirs(config.PROFILE_DIR, exist_ok=True)
+            path = os.path.join(config.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{duration:.3f}s.folded")
+            with open(path, "w") as profile_file:
+                for stack, count in sampler.stacks.most_common():
+                    profile_file.write(f"{stack} {count}\n")
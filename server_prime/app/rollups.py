@@ -0,0 +1,296 @@
+# Failed rounds are reported through the standard logging module.
+import logging
+
+# The compactor runs in a thread of its own, so requests never wait for the execution log to be rolled up.
+import threading
+
+# This module is used for timing operations.
+import time
+
+# This module is used to store the quantile sketches as text.
+import json
+
+# The logarithm places each latency in a sketch bin, and the ceiling rounds it to the bin index.
+from math import log, ceil
+
+# SQLAlchemy imports
+from sqlalchemy import text
+
+# Importing the database engine and the server settings
+from .database import engine
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# The widths of the rollup buckets, in seconds: a minute, an hour and a day
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# Raw rows rolled up in one transaction at most, so the execution log writer never waits long for the database
+ROLLUP_BATCH_SIZE = 10000
+
+# A summary never has more than this many buckets per method. Longer windows are summarized from coarser buckets.
+MAX_SUMMARY_BUCKETS = 1000
+
+# The relative accuracy of the quantile sketches: a quantile read from a sketch is within 1% of the real latency.
+# Latencies below SKETCH_MIN_SECONDS all go to the lowest bin.
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+SKETCH_MIN_SECONDS = 1e-6
+
+# The statements used by the compactor.
+# Taking the write lock with a no-op update first makes the whole round one serialized transaction,
+# so two worker processes compacting at the same time can't roll the same rows up twice.
+LOCK_STATE = text("UPDATE rollup_state SET value = value WHERE key = 'last_id'")
+READ_LAST_ID = text("SELECT value FROM rollup_state WHERE key = 'last_id'")
+WRITE_LAST_ID = text("UPDATE rollup_state SET value = :value WHERE key = 'last_id'")
+NEW_EXECUTIONS = text("SELECT id, created_at, method, time_elapsed, num_primes, range_start, range_end FROM executions WHERE id > :last_id ORDER BY id LIMIT :limit")
+READ_ROLLUP = text("SELECT count, time_sum, time_max, num_primes, numbers_checked, sketch FROM execution_rollups WHERE resolution = :resolution AND bucket_start = :bucket_start AND method = :method")
+WRITE_ROLLUP = text(
+    "INSERT OR REPLACE INTO execution_rollups (resolution, bucket_start, method, count, time_sum, time_max, num_primes, numbers_checked, sketch) "
+    "VALUES (:resolution, :bucket_start, :method, :count, :time_sum, :time_max, :num_primes, :numbers_checked, :sketch)"
+)
+# The newest raw row is never deleted: SQLite hands out ids from the largest one left, and ids must keep growing past 'last_id'.
+DELETE_RAW = text("DELETE FROM executions WHERE created_at < :cutoff AND id <= :last_id AND id < (SELECT MAX(id) FROM executions)")
+DELETE_ROLLUPS = text("DELETE FROM execution_rollups WHERE resolution = :resolution AND bucket_start < :cutoff")
+
+
+# The class that estimates the quantiles of a set of latencies in little space.
+# Each latency is counted in a bin whose bounds grow geometrically by SKETCH_GAMMA, so every bin is at most 2% wide,
+# and two sketches are merged by adding up their bins. This is what lets minutes be rolled up into hours and days.
+class QuantileSketch:
+    def __init__(self, bins=None):
+        self.bins = bins or {}  # Bin index -> number of latencies in it
+        self.count = sum(self.bins.values())
+
+    # Count one latency
+    def add(self, seconds, count=1):
+        index = ceil(log(max(seconds, SKETCH_MIN_SECONDS)) / log(SKETCH_GAMMA))
+        self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+
+    # Add the latencies of another sketch to this one
+    def merge(self, other):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+
+    # Return the latency below which the fraction 'q' of the latencies fall, or None for an empty sketch
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                break
+        # The middle of the bin, which is within SKETCH_ACCURACY of every latency in it
+        return 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+
+    # Write the sketch as JSON text, to be stored in the database
+    def dumps(self):
+        return json.dumps({str(index): count for index, count in self.bins.items()}, separators=(",", ":"))
+
+    # Read a sketch written by 'dumps'
+    @classmethod
+    def loads(cls, data):
+        return cls({int(index): count for index, count in json.loads(data).items()})
+
+
+# The class that holds the aggregates of one bucket: how many executions there were, how long they took and how many primes they found
+class Rollup:
+    def __init__(self, count=0, time_sum=0.0, time_max=0.0, num_primes=0, numbers_checked=0, sketch=None):
+        self.count = count
+        self.time_sum = time_sum
+        self.time_max = time_max
+        self.num_primes = num_primes
+        self.numbers_checked = numbers_checked
+        self.sketch = sketch or QuantileSketch()
+
+    # Count one execution
+    def add(self, time_elapsed, num_primes, numbers_checked):
+        self.count += 1
+        self.time_sum += time_elapsed
+        self.time_max = max(self.time_max, time_elapsed)
+        self.num_primes += num_primes
+        self.numbers_checked += numbers_checked
+        self.sketch.add(time_elapsed)
+
+    # Add the executions of another bucket to this one
+    def merge(self, other):
+        self.count += other.count
+        self.time_sum += other.time_sum
+        self.time_max = max(self.time_max, other.time_max)
+        self.num_primes += other.num_primes
+        self.numbers_checked += other.numbers_checked
+        self.sketch.merge(other.sketch)
+
+    # Read a rollup from a row of the execution_rollups table
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.count, row.time_sum, row.time_max, row.num_primes, row.numbers_checked, QuantileSketch.loads(row.sketch))
+
+    # Describe the rollup for the summary endpoint
+    def describe(self):
+        return {
+            "count": self.count,
+            "time_sum": self.time_sum,
+            "time_mean": self.time_sum / self.count if self.count else None,
+            "time_p50": self.sketch.quantile(0.5),
+            "time_p90": self.sketch.quantile(0.9),
+            "time_p99": self.sketch.quantile(0.99),
+            "time_max": self.time_max,
+            "num_primes": self.num_primes,
+            "numbers_checked": self.numbers_checked,
+        }
+
+
+# How long the buckets of each resolution are kept, in seconds, or None to keep them for good
+def rollup_retention():
+    return {MINUTE: config.MINUTE_ROLLUP_RETENTION_SECONDS, HOUR: config.HOUR_ROLLUP_RETENTION_SECONDS, DAY: None}
+
+
+# The class that compacts the execution log in the background.
+# Every 'interval' seconds it adds the raw rows written since the last round to the per-minute, per-hour and per-day rollups of their method,
+# then deletes the raw rows older than the raw retention and the buckets older than the retention of their resolution.
+# The id of the last rolled up row is kept in the rollup_state table, so every row is counted exactly once, even across restarts.
+class RollupCompactor:
+    def __init__(self, engine, interval, raw_retention):
+        self.engine = engine
+        self.interval = interval  # Seconds between two rounds
+        self.raw_retention = raw_retention  # Seconds raw rows are kept for
+        self.stopping = threading.Event()
+        self.thread = None
+        self.rolled_up = 0  # Raw rows rolled up so far
+        self.deleted = 0  # Raw rows deleted so far
+
+    # Start the compactor thread
+    def start(self):
+        if self.thread is None and self.interval > 0:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="rollup-compactor", daemon=True)
+            self.thread.start()
+
+    # Stop the compactor thread
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    # Roll up one batch of new raw rows. Returns the number of rows read.
+    def roll_up_batch(self):
+        with self.engine.begin() as connection:
+            connection.execute(LOCK_STATE)
+            last_id = connection.execute(READ_LAST_ID).scalar()
+            rows = connection.execute(NEW_EXECUTIONS, {"last_id": last_id, "limit": ROLLUP_BATCH_SIZE}).fetchall()
+            if not rows:
+                return 0
+
+            # Add up the rows of each bucket. Rows from before the created_at column have no date, and are only skipped over.
+            buckets = {}
+            for row in rows:
+                if row.created_at is None:
+                    continue
+                numbers_checked = max(row.range_end - row.range_start + 1, 0)
+                for resolution in RESOLUTIONS:
+                    key = (resolution, int(row.created_at // resolution) * resolution, row.method)
+                    buckets.setdefault(key, Rollup()).add(row.time_elapsed, row.num_primes, numbers_checked)
+
+            # Merge them into the buckets already stored
+            for (resolution, bucket_start, method), rollup in buckets.items():
+                params = {"resolution": resolution, "bucket_start": bucket_start, "method": method}
+                stored = connection.execute(READ_ROLLUP, params).fetchone()
+                if stored is not None:
+                    rollup.merge(Rollup.from_row(stored))
+                connection.execute(WRITE_ROLLUP, {
+                    **params,
+                    "count": rollup.count,
+                    "time_sum": rollup.time_sum,
+                    "time_max": rollup.time_max,
+                    "num_primes": rollup.num_primes,
+                    "numbers_checked": rollup.numbers_checked,
+                    "sketch": rollup.sketch.dumps(),
+                })
+            connection.execute(WRITE_LAST_ID, {"value": rows[-1].id})
+        self.rolled_up += len(rows)
+        return len(rows)
+
+    # Delete the raw rows and buckets that are past their retention. Raw rows are only deleted once they have been rolled up.
+    def apply_retention(self, now):
+        with self.engine.begin() as connection:
+            connection.execute(LOCK_STATE)
+            last_id = connection.execute(READ_LAST_ID).scalar()
+            self.deleted += connection.execute(DELETE_RAW, {"cutoff": now - self.raw_retention, "last_id": last_id}).rowcount
+            for resolution, retention in rollup_retention().items():
+                if retention is not None:
+                    connection.execute(DELETE_ROLLUPS, {"resolution": resolution, "cutoff": now - retention})
+
+    # One round: roll up every new row, one batch at a time, then apply the retention
+    def compact(self):
+        while self.roll_up_batch() == ROLLUP_BATCH_SIZE and not self.stopping.is_set():
+            pass
+        self.apply_retention(time.time())
+
+    # The compactor thread: compact, then wait for the next round or for stop
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.compact()
+            except Exception as error:
+                # A locked database, or another worker process compacting at the same time, only skips this round
+                logger.warning("Execution log compaction failed: %s", error)
+
+
+# Pick the finest resolution that still has buckets for the whole window and doesn't need more than MAX_SUMMARY_BUCKETS of them
+def pick_resolution(since, until, now):
+    for resolution, retention in rollup_retention().items():
+        if (until - since) / resolution <= MAX_SUMMARY_BUCKETS and (retention is None or since >= now - retention):
+            return resolution
+    return DAY
+
+
+# Summarize the executions between 'since' and 'until' (in seconds since the epoch) from the rollups, for every method or only one.
+# The answer has the totals of each method over the window and, if 'series' is true, the aggregates of each bucket as well.
+# Executions only show up here once the compactor has rolled them up, at most PRIME_ROLLUP_SECONDS after they were logged.
+def summarize(since, until, method=None, resolution=None, series=False):
+    now = time.time()
+    until = now if until is None else until
+    since = until - DAY if since is None else since
+    resolution = resolution or pick_resolution(since, until, now)
+
+    conditions = ["resolution = :resolution", "bucket_start >= :first_bucket", "bucket_start <= :until"]
+    params = {"resolution": resolution, "first_bucket": int(since // resolution) * resolution, "until": until}
+    if method is not None:
+        conditions.append("method = :method")
+        params["method"] = method
+    query = text(
+        "SELECT bucket_start, method, count, time_sum, time_max, num_primes, numbers_checked, sketch FROM execution_rollups "
+        f"WHERE {' AND '.join(conditions)} ORDER BY bucket_start, method"
+    )
+
+    totals = {}
+    buckets = []
+    with engine.connect() as connection:
+        for row in connection.execute(query, params):
+            rollup = Rollup.from_row(row)
+            if series:
+                buckets.append({"bucket_start": row.bucket_start, "method": row.method, **rollup.describe()})
+            totals.setdefault(row.method, Rollup()).merge(rollup)
+
+    summary = {
+        "since": since,
+        "until": until,
+        "resolution": resolution,
+        "methods": {name: rollup.describe() for name, rollup in sorted(totals.items())},
+    }
+    if series:
+        summary["buckets"] = buckets
+    return summary
+
+
+# The compactor shared by the whole application. It is started and stopped together with the application.
+rollup_compactor = RollupCompactor(engine, config.ROLLUP_SECONDS, config.RAW_RETENTION_SECONDS)
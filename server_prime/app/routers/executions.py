@@ -1,47 +1,125 @@
-from fastapi import APIRouter, Depends  # APIRouter is used to create modular routes, Depends is used for dependency injection
-from fastapi.responses import HTMLResponse  # HTMLResponse is used to create HTTP responses with HTML content
+from fastapi import APIRouter, Query, HTTPException  # APIRouter is used to create modular routes, Query describes the query parameters
+from fastapi.responses import StreamingResponse  # StreamingResponse sends the HTML page while the rows are still being read
 
 # SQLAlchemy is the Python SQL toolkit and Object-Relational Mapping (ORM) library that gives application developers the full power and flexibility of SQL.
-from sqlalchemy import inspect  # inspect is used to get detailed information about SQLAlchemy objects
 from sqlalchemy import text  # text is used to create textual SQL statements
-from ..database import get_db
+from ..database import engine
+from ..rollups import summarize, RESOLUTIONS
+
+from html import escape  # escape makes sure values can't break the HTML table
+from typing import Optional
+from urllib.parse import urlencode  # urlencode builds the link to the next page
+
 # Create a new router
 router = APIRouter()
 
-# Define a new route. This route responds to GET requests at the "/executions" URL. The response is of type HTML.
-@router.get("/executions", response_class=HTMLResponse)
-def get_table(db_engine: tuple = Depends(get_db)):  # The function depends on get_db to get a database session
-    db, engine = db_engine  # Unpack the database session and engine from the tuple
-    inspector = inspect(engine)  # Create an inspector for the engine
-    table_name = 'executions'  # Define the table name
-    columns = [column['name'] for column in inspector.get_columns(table_name)]  
-    rows = db.execute(text("SELECT * FROM executions")).fetchall()  
-
-     # Find the index of the num_primes column
-    num_primes_index = columns.index('num_primes')
-
-    # Start creating the HTML content for the table
-    html_content = '''<table style="border:1px solid black; border-collapse: collapse;"><thead><tr>'''
-    for column_name in columns:  
-        # Add a table header with the column name
-        html_content += f'''<th style="border:1px solid black; padding: 10px;">{column_name}</th>'''  
-    html_content += "</tr></thead><tbody>"
-
-    for row in rows:  
-        html_content += "<tr>"
-        num_primes_values = []  # List to collect num_primes values for this row
-        for i, item in enumerate(row):
-            # Collect 'num_primes' values
-            if i == num_primes_index:
-                num_primes_values.append(item)
-                html_content += f'''<td style="border:1px solid black; padding: 10px;">{num_primes_values}</td>'''
-            else:
-                # Add a table cell with the item
-                html_content += f'''<td style="border:1px solid black; padding: 10px;">{item}</td>'''
-        
-     
-        html_content += "</tr>"
-    
-    html_content += "</tbody></table>"
-
-    return html_content
\ No newline at end of file
+# The columns of the executions table, in the order they are shown
+COLUMNS = ["id", "timestamp", "range_start", "range_end", "time_elapsed", "method", "num_primes", "created_at", "source", "compute_seconds"]
+
+# The number of rows fetched from the database at a time while streaming
+FETCH_SIZE = 500
+
+# The largest page size a client can ask for
+MAX_LIMIT = 1000
+
+CELL_STYLE = 'style="border:1px solid black; padding: 10px;"'
+
+# Build the query for one page of the history, newest first.
+# Pages are found with keyset pagination: the next page starts below the smallest id of the previous one,
+# so the database jumps straight to it through the primary key instead of skipping over rows with OFFSET.
+def page_query(before_id, method, since, until, limit):
+    conditions = []
+    params = {"limit": limit}
+    if before_id is not None:
+        conditions.append("id < :before_id")
+        params["before_id"] = before_id
+    if method is not None:
+        conditions.append("method = :method")
+        params["method"] = method
+    if since is not None:
+        conditions.append("created_at >= :since")
+        params["since"] = since
+    if until is not None:
+        conditions.append("created_at <= :until")
+        params["until"] = until
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    sql = f"SELECT {', '.join(COLUMNS)} FROM executions{where} ORDER BY id DESC LIMIT :limit"
+    return text(sql), params
+
+# Read the rows of a query in batches, so only one batch is in memory at a time
+def fetch_rows(query, params):
+    with engine.connect() as connection:
+        result = connection.execute(query, params)
+        while True:
+            rows = result.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+# Produce the HTML page piece by piece: the header first, then one table row per execution as it is read
+def render_html(query, params, filters, limit):
+    yield '<table style="border:1px solid black; border-collapse: collapse;"><thead><tr>'
+    yield "".join(f"<th {CELL_STYLE}>{column_name}</th>" for column_name in COLUMNS)
+    yield "</tr></thead><tbody>"
+
+    count = 0
+    last_id = None
+    for row in fetch_rows(query, params):
+        yield "<tr>" + "".join(f"<td {CELL_STYLE}>{escape(str(item))}</td>" for item in row) + "</tr>"
+        count += 1
+        last_id = row[0]
+    yield "</tbody></table>"
+
+    # A full page means there may be more rows, so we link to the next page with the same filters
+    if count == limit:
+        next_page = urlencode({**filters, "before_id": last_id, "limit": limit})
+        yield f'<p><a href="/executions?{escape(next_page)}">Next page</a></p>'
+
+# Keep only the filters that were given, to repeat them in the next page link
+def active_filters(method, since, until):
+    filters = {"method": method, "since": since, "until": until}
+    return {key: value for key, value in filters.items() if value is not None}
+
+# Define a new route. This route responds to GET requests at the "/executions" URL with a page of the history as an HTML table, newest first.
+# It can be filtered by method and by a time range ('since' and 'until', in seconds since the epoch, as in /executions/summary), and 'before_id' gives the page after the one whose smallest id it is.
+@router.get("/executions")
+def get_table(
+    before_id: Optional[int] = Query(None),
+    method: Optional[str] = Query(None),
+    since: Optional[float] = Query(None),
+    until: Optional[float] = Query(None),
+    limit: int = Query(100, ge=1, le=MAX_LIMIT)
+):
+    query, params = page_query(before_id, method, since, until, limit)
+    filters = active_filters(method, since, until)
+    return StreamingResponse(render_html(query, params, filters, limit), media_type="text/html")
+
+# The same history as JSON, with the id to pass as 'before_id' to get the next page
+@router.get("/executions/json")
+def get_json(
+    before_id: Optional[int] = Query(None),
+    method: Optional[str] = Query(None),
+    since: Optional[float] = Query(None),
+    until: Optional[float] = Query(None),
+    limit: int = Query(100, ge=1, le=MAX_LIMIT)
+):
+    query, params = page_query(before_id, method, since, until, limit)
+    executions = [dict(zip(COLUMNS, row)) for row in fetch_rows(query, params)]
+    next_before_id = executions[-1]["id"] if len(executions) == limit else None
+    return {"executions": executions, "next_before_id": next_before_id}
+
+# A summary of the executions of each method between 'since' and 'until', in seconds since the epoch (the last day by default):
+# how many there were, their total, mean, median, 90th and 99th percentile and longest time, and the primes they found.
+# It is read from the rollups rather than the raw rows, so it stays fast over months of history. The resolution of the buckets
+# (60, 3600 or 86400 seconds) is picked from the length of the window unless it is given, and 'series' adds the aggregates of every bucket.
+@router.get("/executions/summary")
+def get_summary(
+    since: Optional[float] = Query(None),
+    until: Optional[float] = Query(None),
+    method: Optional[str] = Query(None),
+    resolution: Optional[int] = Query(None),
+    series: bool = Query(False)
+):
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"The resolution must be one of {', '.join(map(str, RESOLUTIONS))} seconds")
+    return summarize(since, until, method, resolution, series)
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException, Form
+from fastapi.responses import FileResponse
+
+# Importing models
+from ..models import JobStatus
+
+# Importing the background job manager
+from ..jobs import JobManager
+
+# Importing the method lookup and the execution logging used by /primes
+from .primes import get_method_engine, log_execution
+
+# Importing the server settings
+from .. import config
+
+# Create a FastAPI router
+router = APIRouter()
+
+# The job manager shared by all requests. It is started and stopped together with the application.
+job_manager = JobManager(config.JOB_DIR, config.JOB_WORKERS, get_method_engine, log_execution, config.PRIME_JOBS)
+
+# Endpoint to submit a prime number generation job. It returns straight away with the id of the new job.
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+def create_job(
+    start: int = Form(...),
+    end: int = Form(...),
+    method: str = Form(...)
+):
+    if start > end:
+        raise HTTPException(status_code=400, detail="Starting limit cannot be greater than ending limit")
+    return job_manager.submit(method, start, end)
+
+# Endpoint to check the status and progress of a job
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Endpoint to download the result of a finished job, in the same shape as the /primes response
+@router.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(job_manager.result_path(job_id), media_type="application/json")
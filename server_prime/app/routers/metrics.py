@@ -0,0 +1,44 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+# Importing the metrics registry, and the parts of the application whose state is reported on every scrape
+from .. import metrics
+from ..telemetry import execution_log
+from .primes import prime_cache, prime_flights, response_cache
+from .jobs import job_manager
+
+# Create a FastAPI router
+router = APIRouter()
+
+# Values read from the rest of the application each time /metrics is scraped
+metrics.register(metrics.Gauge(
+    "prime_execution_log_queue_depth", "Execution log rows waiting to be written.",
+    collect=lambda: {(): execution_log.queue.qsize()},
+))
+metrics.register(metrics.Gauge(
+    "prime_execution_log_rows", "Execution log rows written, dropped because the queue was full, or lost to a failed write since the start.", ("outcome",),
+    collect=lambda: {("written",): execution_log.written, ("dropped",): execution_log.dropped, ("failed",): execution_log.failed},
+))
+metrics.register(metrics.Gauge(
+    "prime_cache", "Counters and size of the /primes result cache.", ("stat",),
+    collect=lambda: {(name,): value for name, value in prime_cache.stats().items()},
+))
+metrics.register(metrics.Gauge(
+    "prime_single_flight", "Computations run, callers that shared a computation, and computations in flight.", ("stat",),
+    collect=lambda: {(name,): value for name, value in prime_flights.stats().items()},
+))
+metrics.register(metrics.Gauge(
+    "prime_response_cache", "Counters and size of the GET /primes response cache.", ("stat",),
+    collect=lambda: {(name,): value for name, value in response_cache.stats().items()},
+))
+
+# Count the background jobs in each status, as saved in the job folder shared by every worker process
+def count_jobs():
+    return {(status,): count for status, count in job_manager.count_by_status().items()}
+
+metrics.register(metrics.Gauge("prime_jobs", "Background jobs by status.", ("status",), collect=count_jobs))
+
+# Endpoint to scrape the metrics in the Prometheus text format
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
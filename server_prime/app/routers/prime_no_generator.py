@@ -1,4 +1,5 @@
 
+# This module is used for timing operations. 
 # Here it's used to calculate the time taken by each method to generate prime numbers.
 import time 
 
@@ -7,93 +8,621 @@ import time
 import sys
 
 # This module is used to generate random numbers. 
-# Here it's used in the Miller-Rabin method to generate a random number.
+# Here it's used in the probabilistic mode of the Miller-Rabin method to generate a random number.
 import random
 
+# The integer square root gives the exact floor of the square root, even for numbers too big to fit in a float.
+# Here it's used to find how far the sieve needs to look for base primes. The logarithm is used to weigh the cost of big numbers.
+from math import isqrt, log, ceil
+
+# 'compress' keeps the items of one sequence whose matching flag in another sequence is true.
+# Here it's used to turn a sieve window of flags into the list of numbers still marked as prime.
+from itertools import compress, islice, accumulate
+from operator import sub
+
+# This module gives information about the operating system.
+# Here it's used to find how many CPU cores the parallel methods can use.
+import os
+
+# These modules are used to write and read the prime index file. 'struct' packs its header, 'array' holds its 
+# checkpoints, and 'mmap' maps the file into memory so it can be read without copying it.
+import struct
+import mmap
+from array import array
+from bisect import bisect_left, bisect_right
+
+# A process pool runs functions in separate worker processes, so several cores can work at the same time.
+# Here it's used to split a big range into chunks that are checked in parallel.
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# The number of values held in one window of the segmented sieve.
+# A bytearray of this size fits in the CPU cache, so crossing off multiples inside a window stays fast.
+SEGMENT_SIZE = 1 << 18
+
+# When a batch of ranges is sieved, ranges separated by fewer than this many numbers are sieved together as one covering range. 
+# Sieving the numbers in between costs less than starting a separate sieve pass, which has to go through every base prime again.
+BATCH_MERGE_GAP = SEGMENT_SIZE
+
+# The number of odd numbers held in one window of the vectorized sieve.
+# Each window covers twice this many numbers, because the even numbers are never stored.
+VECTOR_SEGMENT_SIZE = 1 << 20
+
+# The primes below 1000. Every candidate is divided by these first, which throws out most composite numbers 
+# with a cheap remainder before any expensive modular exponentiation is done.
+SMALL_PRIMES = tuple(p for p in range(2, 1000) if all(p % d for d in range(2, isqrt(p) + 1)))
+
+# Fixed Miller-Rabin witness sets. Every composite number below each bound fails the test for at least one of its bases, 
+# so for numbers below 2^64 the test is exact and no random numbers are needed.
+MILLER_RABIN_WITNESSES = [
+    (2047, (2,)),
+    (1373653, (2, 3)),
+    (25326001, (2, 3, 5)),
+    (3215031751, (2, 3, 5, 7)),
+    (2152302898747, (2, 3, 5, 7, 11)),
+    (3474749660383, (2, 3, 5, 7, 11, 13)),
+    (341550071728321, (2, 3, 5, 7, 11, 13, 17)),
+    (3825123056546413051, (2, 3, 5, 7, 11, 13, 17, 19, 23)),
+    (1 << 64, (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)),
+]
+
+# The remainders modulo 30 of the numbers that are not multiples of 2, 3 or 5. Every prime above 5 has one of these remainders, 
+# so stepping through them skips almost three quarters of all numbers without testing them.
+WHEEL_30 = (1, 7, 11, 13, 17, 19, 23, 29)
+
+# The hybrid method crosses off the multiples of the primes up to this bound before it runs any primality test. 
+# For narrow ranges it uses a smaller bound, about the width of the range, because each prime costs a step whether or not it has a multiple in the range.
+PRESIEVE_BOUND = 10**6
+
+# The time 'prime_count' takes for each of its x^(3/4) steps, in seconds, with and without NumPy.
+PRIME_COUNT_UNIT_SECONDS = 7e-9
+PRIME_COUNT_UNIT_SECONDS_NO_NUMPY = 7.5e-8
+
+# One strong probable-prime test of a number of b bits takes about STRONG_TEST_UNIT_SECONDS * b^2.85 seconds, 
+# and never less than STRONG_TEST_MIN_SECONDS.
+STRONG_TEST_UNIT_SECONDS = 1.1e-11
+STRONG_TEST_MIN_SECONDS = 3e-5
+
+# The remainders modulo 210 of the numbers that are not multiples of 2, 3, 5 or 7. 
+# Only 48 numbers out of every 210 are on this wheel, so stepping through them skips over three quarters of all numbers.
+WHEEL_210 = tuple(r for r in range(1, 210) if r % 2 and r % 3 and r % 5 and r % 7)
+
+# The table of prime divisors used by trial division grows up to this limit (about 300,000 primes). 
+# Numbers with a bigger square root are divided by the numbers on the mod-30 wheel past the table, which are not all prime 
+# but still never miss a factor.
+DIVISOR_TABLE_LIMIT = 1 << 22
+
+# Ranges with fewer numbers than this are always run on one core, because starting chunks in other processes would cost more than it saves.
+MIN_PARALLEL_RANGE = 10000
+
+# Each worker gets this many chunks on average, so a worker that finishes early can pick up another chunk.
+CHUNKS_PER_JOB = 4
+
+
+# The prime index file starts with this header: a magic string, the format version, the number of bits per checkpoint block, 
+# the limit of the index, the number of bits in the bitmap and the number of checkpoint blocks, all little-endian.
+INDEX_MAGIC = b"PRIMEIDX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<8sIIQQQ")
+
+# Every block of this many bits in the prime index has a checkpoint with the number of primes that come before it.
+CHECKPOINT_BLOCK_BITS = 1 << 16
+
+# The base-prime table file starts with this header: a magic string, the format version, the number of bytes per prime, 
+# the limit of the table and the number of primes in it, all little-endian. The primes follow as little-endian 32-bit integers.
+TABLE_MAGIC = b"PRIMETBL"
+TABLE_VERSION = 1
+TABLE_HEADER = struct.Struct("<8sIIQQ")
+
+# The number of odd numbers sieved at a time while building the prime index. It must be a multiple of CHECKPOINT_BLOCK_BITS.
+INDEX_WINDOW_BITS = 1 << 20
+
+# For every possible byte, the positions of the bits that are set in it. Used to read primes out of the index without NumPy.
+BIT_POSITIONS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+# NumPy is an optional dependency. When it is installed, the vectorized sieve keeps its windows in NumPy arrays 
+# and returns a NumPy array. Without it, the same sieve runs on plain bytearrays and returns a list.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# The shared table of small primes that trial division divides by, as a (limit, primes) pair holding every prime up to 'limit'. 
+# It starts with SMALL_PRIMES and is grown by 'divisor_table' when a bigger number needs it. The pair is always replaced as a whole, 
+# so a thread that reads it while another one grows it still gets a limit that matches its primes.
+_divisor_table = (SMALL_PRIMES[-1], SMALL_PRIMES)
+
 
 """
-This function finds prime numbers in a range using the brute force method. 
-It checks each number one by one to see if it has any factors other than 1 and itself. 
-If a number has no other factors, it's prime. This method is simple but slow, especially for large ranges, 
-because it checks every single number.
+This function returns the shared table of small primes as a (limit, primes) pair, grown if needed so that it covers 'limit'. 
+The table at least doubles each time it grows, so a run over a range only grows it a few times, and it never grows past DIVISOR_TABLE_LIMIT.
 """
-# This function finds prime numbers in a range using the brute force method.
-def brute_force_method(start, end):
-    # We start by making a list to keep track of the prime numbers we find.
-    primes = []
+# This function returns the table of prime divisors, covering 'limit' where possible.
+def divisor_table(limit):
+    global _divisor_table
+    table_limit, _ = _divisor_table
+    if limit > table_limit and table_limit < DIVISOR_TABLE_LIMIT:
+        new_limit = min(max(limit, 2 * table_limit), DIVISOR_TABLE_LIMIT)
+        _divisor_table = (new_limit, tuple(base_primes(new_limit)))
+    return _divisor_table
+
+
+# The path of the base-prime table file this process has attached, if any. Worker processes of the pool attach it as well.
+_base_table_path = None
+
+
+"""
+This function writes a base-prime table file: a fixed header (see TABLE_HEADER) followed by every prime up to 'limit'. 
+The file is written under a temporary name and then renamed, so a process that opens it never sees half a table, 
+and several processes racing to write it at the same time leave one complete file behind.
+"""
+# This function writes the table of the primes up to 'limit' to 'path'.
+def write_base_prime_table(limit, path):
+    primes = array("I", base_primes(limit))
     
-    # We look at each number in the range one by one.
-    for num in range(start, end + 1):
-        # Numbers less than or equal to 1 are not prime, so we skip them.
-        if num <= 1:
-            continue
-        
-        # We check if 'num' has any factors other than 1 and itself.
-        # We only need to check up to the square root of 'num', because a larger factor would have a corresponding smaller factor.
-        for i in range(2, int(num**0.5) + 1):
-            # If 'num' is divisible by 'i', then it's not prime, so we break the loop and move on to the next number.
-            if num % i == 0:
+    # The primes are stored in little-endian order, whatever the machine uses.
+    if sys.byteorder == "big":
+        primes.byteswap()
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as table_file:
+        table_file.write(TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, primes.itemsize, limit, len(primes)))
+        table_file.write(primes.tobytes())
+    os.replace(temporary_path, path)
+
+
+"""
+This function makes a base-prime table file written by 'write_base_prime_table' the shared table of this process. 
+The file is memory-mapped read-only, and the primes are read straight from the mapping, so every process that attaches 
+the same file shares one copy of it in the operating system's page cache instead of building its own, and attaching takes 
+no time at all. Trial division, the hybrid method and the sieves then take their divisors and base primes from it.
+"""
+# This function attaches the base-prime table file at 'path'.
+def attach_base_prime_table(path):
+    global _divisor_table, _base_table_path
+    with open(path, "rb") as table_file:
+        mapping = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+    # A file cut off before the end of its header, e.g. by a crash while it was written, is refused like any other bad file.
+    if len(mapping) < TABLE_HEADER.size:
+        mapping.close()
+        raise ValueError(f"{path} is not a base-prime table file of version {TABLE_VERSION}")
+    magic, version, itemsize, limit, count = TABLE_HEADER.unpack_from(mapping)
+    if magic != TABLE_MAGIC or version != TABLE_VERSION or itemsize != 4 or len(mapping) < TABLE_HEADER.size + 4 * count:
+        mapping.close()
+        raise ValueError(f"{path} is not a base-prime table file of version {TABLE_VERSION}")
+    
+    # A table this process has already grown past the file is kept.
+    if limit >= _divisor_table[0]:
+        _divisor_table = (limit, memoryview(mapping)[TABLE_HEADER.size:TABLE_HEADER.size + 4 * count].cast("I"))
+    _base_table_path = path
+
+
+"""
+This function yields the numbers from 'start' to 'end' whose remainder modulo 'modulus' is one of the residues in 'wheel'. 
+With WHEEL_30 or WHEEL_210 these are the only numbers in the range that can be prime, apart from the small primes the wheel is made of.
+"""
+# This function walks a wheel over a range.
+def wheel_candidates(start, end, wheel, modulus):
+    base = max(start, 0) // modulus * modulus
+    while base <= end:
+        for residue in wheel:
+            candidate = base + residue
+            if start <= candidate <= end:
+                yield candidate
+        base += modulus
+
+
+"""
+This function finds the prime numbers among the numbers on a wheel between 'start' and 'end' by trial division. 
+'wheel_primes' are the primes the wheel is made of: they are added to the result when they are in the range, 
+and they are never tried as divisors, because no number on the wheel is a multiple of them. 
+Every other candidate is divided by the primes in the shared divisor table up to its square root. 
+If the table doesn't reach that far, the numbers on the mod-30 wheel past the table are tried as well.
+"""
+# This function finds the primes in a range by dividing the numbers on a wheel by primes.
+def wheel_trial_division(start, end, wheel, modulus, wheel_primes):
+    primes = [p for p in wheel_primes if start <= p <= end]
+    # We only keep the divisors up to the square root of 'end', plus the next one, which stops the loop for every candidate.
+    table_limit, table = divisor_table(isqrt(max(end, 0)))
+    divisors = table[len(wheel_primes):bisect_right(table, isqrt(max(end, 0))) + 1]
+    
+    for num in wheel_candidates(max(start, 2), end, wheel, modulus):
+        root = isqrt(num)
+        for p in divisors:
+            # Once the divisor passes the square root, there is no factor left to find, so 'num' is prime.
+            if p > root:
+                primes.append(num)
+                break
+            if num % p == 0:
                 break
         else:
-            # If we didn't find any factors, then 'num' is prime, so we add it to our list.
-            primes.append(num)
+            # The table ran out before the square root, so we carry on with the numbers on the mod-30 wheel past it.
+            if not any(num % d == 0 for d in wheel_candidates(table_limit + 1, root, WHEEL_30, 30)):
+                primes.append(num)
     
-    # We return our list of prime numbers.
-    return primes
+    # The wheel primes come first, and the wheel yields the other candidates in order, so the list is sorted.
+    return PrimeSet(primes)
+
+
+# A PrimeSet remembers the value of one prime in every this many, so it can find the n-th prime or a value 
+# by adding up at most this many gaps instead of starting from the first prime.
+PRIME_SET_CHECKPOINT_STRIDE = 64
+
+
+"""
+This class holds a sorted list of primes in compact form, and is what every method returns. 
+Instead of one Python int object per prime (about 36 bytes each, counting the list), it stores the first prime and then 
+the gap to each next prime in an array of 2-byte numbers (switching to 8 bytes in the rare case a gap doesn't fit). 
+The value of every PRIME_SET_CHECKPOINT_STRIDE-th prime is kept as a checkpoint, so indexing, slicing, 'in' and 'between' 
+only add up a few gaps. 
+
+It behaves like a read-only list: it has a length (kept as a counter, so it costs nothing), it can be iterated, indexed 
+and sliced, it supports 'in', and it compares equal to a list or tuple holding the same primes. Printing it looks like printing a list. 
+New primes, bigger than the last one, are added with 'extend', which takes a list, a NumPy array or another PrimeSet. 
+The supported way to read the gaps without copying is the 'gaps' array (e.g. memoryview(prime_set.gaps)), on every Python version. 
+'memoryview(prime_set)' itself only works on Python 3.12 and later, and raises TypeError before that. 
+'to_array' writes the primes themselves into a compact array.
+"""
+# This class holds a sorted list of primes as the first prime and the gaps between them.
+class PrimeSet:
+    # This function makes a PrimeSet holding 'primes', which must be sorted.
+    def __init__(self, primes=()):
+        self.first = None  # The first prime, or None if there are none
+        self.last = None  # The last prime, or None if there are none
+        self.count = 0  # The number of primes
+        self.gaps = array("H")  # gaps[i] is the difference between prime i + 1 and prime i
+        self.checkpoint_indexes = []  # The positions of the checkpoints, in order
+        self.checkpoint_values = []  # The primes at those positions
+        self.extend(primes)
+    
+    # This function adds gaps to the gap array, switching to 8-byte gaps if one of them doesn't fit in 2 bytes.
+    def add_gaps(self, gaps):
+        try:
+            self.gaps.extend(array(self.gaps.typecode, gaps))
+        except OverflowError:
+            self.gaps = array("Q", self.gaps)
+            self.gaps.extend(array("Q", gaps))
+    
+    # This function adds primes at the end. They must be sorted and bigger than the primes already in the set.
+    def extend(self, primes):
+        if len(primes) == 0:
+            return
+        
+        if isinstance(primes, PrimeSet):
+            # The gaps and checkpoints of another PrimeSet are copied as they are, with the checkpoints moved along by our count.
+            head, tail, new_gaps = primes.first, primes.last, primes.gaps
+            indexes = [self.count + index for index in primes.checkpoint_indexes]
+            values = primes.checkpoint_values
+        elif numpy is not None and isinstance(primes, numpy.ndarray):
+            head, tail = int(primes[0]), int(primes[-1])
+            differences = numpy.diff(primes)
+            new_gaps = differences.astype(numpy.uint16) if len(differences) == 0 or differences.max() < 1 << 16 else differences.tolist()
+            indexes = list(range(self.count, self.count + len(primes), PRIME_SET_CHECKPOINT_STRIDE))
+            values = primes[::PRIME_SET_CHECKPOINT_STRIDE].tolist()
+        else:
+            if not isinstance(primes, (list, tuple)):
+                primes = list(primes)
+            head, tail = primes[0], primes[-1]
+            # 'map' with two iterators computes all the differences in C, without a Python loop.
+            new_gaps = list(map(sub, islice(primes, 1, None), primes))
+            indexes = list(range(self.count, self.count + len(primes), PRIME_SET_CHECKPOINT_STRIDE))
+            values = primes[::PRIME_SET_CHECKPOINT_STRIDE]
+        
+        if self.count:
+            if head <= self.last:
+                raise ValueError("Primes must be added in increasing order")
+            self.add_gaps([head - self.last])
+        else:
+            self.first = head
+        if numpy is not None and isinstance(new_gaps, numpy.ndarray):
+            if self.gaps.typecode != "H":
+                new_gaps = new_gaps.astype(numpy.uint64)
+            self.gaps.frombytes(new_gaps.tobytes())
+        else:
+            self.add_gaps(new_gaps)
+        self.checkpoint_indexes.extend(indexes)
+        self.checkpoint_values.extend(values)
+        self.count += len(primes)
+        self.last = tail
+    
+    # This function gives the number of primes.
+    def __len__(self):
+        return self.count
+    
+    # This function goes through the primes in order, adding up the gaps in C with 'accumulate'.
+    def __iter__(self):
+        if self.count:
+            yield from accumulate(self.gaps, initial=self.first)
+    
+    # This function gives the prime at position 'index', starting from the nearest checkpoint before it.
+    def value_at(self, index):
+        checkpoint = bisect_right(self.checkpoint_indexes, index) - 1
+        position = self.checkpoint_indexes[checkpoint]
+        return self.checkpoint_values[checkpoint] + sum(self.gaps[position:index])
+    
+    # This function gives the position of the first prime that is at least 'value', or the count if there is none.
+    def index_at_least(self, value):
+        if self.count == 0 or value <= self.first:
+            return 0
+        if value > self.last:
+            return self.count
+        checkpoint = bisect_right(self.checkpoint_values, value) - 1
+        index = self.checkpoint_indexes[checkpoint]
+        prime = self.checkpoint_values[checkpoint]
+        while prime < value:
+            prime += self.gaps[index]
+            index += 1
+        return index
+    
+    # This function gives a prime by its position, or a PrimeSet of the primes in a slice.
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.count)
+            if step != 1:
+                return PrimeSet(list(self)[key])
+            return self.slice(start, stop)
+        if key < 0:
+            key += self.count
+        if not 0 <= key < self.count:
+            raise IndexError("PrimeSet index out of range")
+        return self.value_at(key)
+    
+    # This function gives a PrimeSet of the primes from position 'start' up to, but not including, position 'stop'.
+    def slice(self, start, stop):
+        part = PrimeSet()
+        if start >= stop:
+            return part
+        part.first = self.value_at(start)
+        part.last = self.value_at(stop - 1)
+        part.count = stop - start
+        part.gaps = self.gaps[start:stop - 1]
+        # The checkpoints inside the slice are kept, and the first prime of the slice becomes a checkpoint too.
+        low = bisect_right(self.checkpoint_indexes, start)
+        high = bisect_right(self.checkpoint_indexes, stop - 1)
+        part.checkpoint_indexes = [0] + [index - start for index in self.checkpoint_indexes[low:high]]
+        part.checkpoint_values = [part.first] + self.checkpoint_values[low:high]
+        return part
+    
+    # This function gives a PrimeSet of the primes between 'low' and 'high', both included.
+    def between(self, low, high):
+        return self.slice(self.index_at_least(low), self.index_at_least(high + 1))
+    
+    # This function checks whether 'value' is one of the primes.
+    def __contains__(self, value):
+        index = self.index_at_least(value)
+        return index < self.count and self.value_at(index) == value
+    
+    # This function compares with another PrimeSet, or with a list or tuple of primes.
+    def __eq__(self, other):
+        if isinstance(other, PrimeSet):
+            return self.count == other.count and self.first == other.first and self.gaps == other.gaps
+        if isinstance(other, (list, tuple)):
+            return self.count == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+    
+    # This function prints the primes the way a list is printed.
+    def __str__(self):
+        return "[" + ", ".join(map(str, self)) + "]"
+    
+    def __repr__(self):
+        return "PrimeSet(" + str(self) + ")"
+    
+    # This function shares the gap array through the buffer protocol. Python only calls it from 3.12 on: use the 'gaps' array on older versions.
+    def __buffer__(self, flags):
+        return memoryview(self.gaps)
+    
+    # This function gives the number of bytes used by the gaps and the checkpoints.
+    @property
+    def nbytes(self):
+        return self.gaps.itemsize * len(self.gaps) + 8 * len(self.checkpoint_indexes) + 36 * len(self.checkpoint_values)
+    
+    # This function gives the primes as a plain list. Only use it when a list is really needed.
+    def tolist(self):
+        return list(self)
+    
+    # This function writes the primes into a compact array of the given type code, 'Q' (8 bytes) by default.
+    def to_array(self, typecode="Q"):
+        if numpy is not None and self.count and self.last < 2**63:
+            values = numpy.empty(self.count, dtype=numpy.uint64)
+            values[0] = self.first
+            numpy.cumsum(numpy.frombuffer(self.gaps, dtype=self.gaps.typecode), dtype=numpy.uint64, out=values[1:])
+            values[1:] += numpy.uint64(self.first)
+            return array(typecode, values.astype(typecode).tobytes())
+        return array(typecode, self)
+
+
+"""
+This function finds prime numbers in a range using the brute force method. 
+It checks each number one by one to see if it has any factors other than 1 and itself, by dividing it by every prime up to its square root. 
+The primes come from a table shared by all calls, which is grown as bigger numbers need it, so no time is wasted dividing by composite numbers. 
+Multiples of 2, 3 and 5 are never checked at all: only the numbers on the mod-30 wheel are. 
+If a number has no other factors, it's prime. This method is simple but slow, especially for large ranges, 
+because it checks every remaining number.
+"""
+# This function finds prime numbers in a range using the brute force method.
+def brute_force_method(start, end):
+    return wheel_trial_division(start, end, WHEEL_30, 30, (2, 3, 5))
 
 
 """
 This function finds prime numbers in a range using the trial division method. 
-It improves on the brute force method by skipping even numbers and multiples of 3. 
-It checks each remaining number to see if it has any factors other than 1 and itself. 
+It improves on the brute force method by also skipping the multiples of 7, using the mod-210 wheel, 
+which leaves 48 candidates out of every 210 numbers instead of 56. 
+Each remaining number is divided by the primes in the shared table up to its square root. 
 If a number has no other factors, it's prime. This method is faster than the brute force method, 
 but still relatively slow for large ranges.
 """
 # This function finds prime numbers in a range using the trial division method.
 def trial_division_method(start, end):
-    # We start by making a list to keep track of the prime numbers we find.
-    primes = []
+    return wheel_trial_division(start, end, WHEEL_210, 210, (2, 3, 5, 7))
+
+"""
+This function runs one round of the Miller-Rabin test on 'num' with the base 'a'. 
+It expects 'num' - 1 to be already written as d * 2^s with 'd' odd. 
+It returns False when 'a' proves that 'num' is composite, and True when 'num' passes the round.
+"""
+# This function checks whether 'num' is a strong probable prime to the base 'a'.
+def is_strong_probable_prime(num, a, d, s):
+    # Compute a^d mod num. If it's 1 or num - 1, then 'a' is not a witness for compositeness.
+    x = pow(a, d, num)
+    if x == 1 or x == num - 1:
+        return True
     
-    # We look at each number in the range one by one.
-    for num in range(start, end + 1):
-        # Numbers less than or equal to 1 are not prime, so we skip them.
-        if num <= 1:
-            continue
-        
-        # The numbers 2 and 3 are prime, so if we see them, we add them to our list.
-        if num <= 3:
-            primes.append(num)
-            continue
-        
-        # Even numbers and multiples of 3 are not prime, so we skip them.
-        if num % 2 == 0 or num % 3 == 0:
-            continue
+    # Square 'x' up to s - 1 times, looking for num - 1.
+    for _ in range(s - 1):
+        x = x * x % num
+        if x == num - 1:
+            return True
+    
+    # If we never reached num - 1, then 'a' is a witness and 'num' is composite.
+    return False
+
+
+"""
+This function computes the Jacobi symbol (a/n) for an odd positive 'n'. 
+The strong Lucas test uses it to pick its parameters.
+"""
+# This function computes the Jacobi symbol.
+def jacobi_symbol(a, n):
+    a %= n
+    result = 1
+    while a:
+        # We pull out factors of 2 from 'a'. Each one flips the sign when n is 3 or 5 modulo 8.
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
         
-        # We check if 'num' has any factors other than 1 and itself.
-        # We start from 5 and increment by 6 each time, because all primes are of the form 6n±1, except for 2 and 3.
-        i = 5
-        while i * i <= num:
-            # If 'num' is divisible by 'i' or 'i+2', then it's not prime, so we break the loop and move on to the next number.
-            if num % i == 0 or num % (i + 2) == 0:
-                break
-            i += 6
-        else:
-            # If we didn't find any factors, then 'num' is prime, so we add it to our list.
-            primes.append(num)
+        # Quadratic reciprocity lets us swap 'a' and 'n', flipping the sign when both are 3 modulo 4.
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
     
-    # We return our list of prime numbers.
-    return primes
+    # If 'n' ended up as 1 the symbol is +1 or -1, otherwise 'a' and 'n' share a factor and the symbol is 0.
+    return result if n == 1 else 0
+
+
+"""
+This function runs the strong Lucas probable prime test on an odd 'num', using Selfridge's method to choose the parameters. 
+Together with a Miller-Rabin round to the base 2, it forms the Baillie-PSW test, for which no composite number is known to pass.
+"""
+# This function checks whether 'num' is a strong Lucas probable prime.
+def is_strong_lucas_probable_prime(num):
+    # Perfect squares never give a Jacobi symbol of -1, so we have to rule them out first.
+    if isqrt(num) ** 2 == num:
+        return False
+    
+    # We look for the first D in 5, -7, 9, -11, ... with Jacobi symbol (D/num) equal to -1.
+    D = 5
+    while True:
+        j = jacobi_symbol(D, num)
+        if j == -1:
+            break
+        # If D shares a factor with 'num', then 'num' is composite.
+        if j == 0 and abs(D) != num:
+            return False
+        D = -D - 2 if D > 0 else -D + 2
+    P = 1
+    Q = (1 - D) // 4
+    
+    # We write num + 1 as d * 2^s with 'd' odd.
+    d = num + 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    
+    # We compute the Lucas numbers U_d and V_d, and Q^d, by walking the bits of 'd' from the top.
+    U, V, Qk = 1, P, Q
+    for bit in bin(d)[3:]:
+        # Doubling step: from index k to index 2k.
+        U = U * V % num
+        V = (V * V - 2 * Qk) % num
+        Qk = Qk * Qk % num
+        if bit == "1":
+            # Adding one: from index 2k to index 2k+1. Dividing by 2 modulo an odd 'num' means adding 'num' to odd values first.
+            U, V = P * U + V, D * U + P * V
+            if U % 2:
+                U += num
+            if V % 2:
+                V += num
+            U = U // 2 % num
+            V = V // 2 % num
+            Qk = Qk * Q % num
+    
+    # 'num' is a strong Lucas probable prime if U_d is 0, or if V_(d*2^r) is 0 for some r < s.
+    if U == 0 or V == 0:
+        return True
+    for _ in range(s - 1):
+        V = (V * V - 2 * Qk) % num
+        if V == 0:
+            return True
+        Qk = Qk * Qk % num
+    return False
+
+
+"""
+This function decides whether a single number is prime, and always gives the same answer for the same number. 
+It first divides by the small primes in SMALL_PRIMES, which settles most numbers cheaply. 
+Numbers below 2^64 then go through Miller-Rabin with the fixed witnesses from MILLER_RABIN_WITNESSES, which is exact. 
+Bigger numbers go through the Baillie-PSW test: one Miller-Rabin round to the base 2 followed by a strong Lucas test.
+"""
+# This function checks whether 'num' is prime.
+def is_prime(num):
+    # Numbers less than 2 are not prime.
+    if num < 2:
+        return False
+    
+    # Trial division by the small primes. If one of them divides 'num', then 'num' is prime only if it is that small prime.
+    for p in SMALL_PRIMES:
+        if num % p == 0:
+            return num == p
+    
+    # A number with no prime factor below 1000 that is smaller than 1000^2 must be prime.
+    if num < 1000 * 1000:
+        return True
+    
+    return passes_strong_tests(num)
+
+
+"""
+This function is the expensive part of 'is_prime', for callers that have already thrown out the numbers with small factors. 
+It takes an odd number of at least 3. Numbers below 2^64 go through Miller-Rabin with the fixed witnesses from MILLER_RABIN_WITNESSES, 
+which is exact, and bigger numbers go through the Baillie-PSW test.
+"""
+# This function checks whether the odd number 'num' is prime with the strong probable-prime tests.
+def passes_strong_tests(num):
+    # We write (num-1) as a product of a power of 2 (s) and an odd number (d).
+    d = num - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    
+    # Below 2^64 we use the smallest fixed witness set that is known to be exact for 'num'.
+    for bound, witnesses in MILLER_RABIN_WITNESSES:
+        if num < bound:
+            return all(is_strong_probable_prime(num, a, d, s) for a in witnesses)
+    
+    # Above 2^64 we use the Baillie-PSW test.
+    return is_strong_probable_prime(num, 2, d, s) and is_strong_lucas_probable_prime(num)
+
 
 """
 This function finds prime numbers in a range using the Miller-Rabin method. 
-This is a probabilistic test that's much faster for large numbers. 
-It picks a random number 'a' and checks if it satisfies certain conditions. If 'a' does, 
-then the number is probably prime. If 'a' doesn't, then the number is composite. 
-The more random numbers 'a' we check, the more confident we can be in the result. 
-However, this method might occasionally guess wrong.
+This is a test that's much faster for large numbers than looking for factors. 
+By default it runs in deterministic mode: every number goes through 'is_prime', which uses fixed witnesses below 2^64 
+and the Baillie-PSW test above that, so the same range always gives the same answer. 
+With 'deterministic=False' it runs the original probabilistic test instead: it picks 'k' random numbers 'a' and checks if each satisfies 
+certain conditions. If they all do, then the number is probably prime. If one doesn't, then the number is composite. 
+The more random numbers 'a' we check, the more confident we can be in the result, but this mode might occasionally guess wrong.
 """
 # This function finds prime numbers in a range using the Miller-Rabin method.
-def miller_rabin_method(start, end, k=5):
+def miller_rabin_method(start, end, k=5, deterministic=True):
+    # In deterministic mode we simply keep the numbers that 'is_prime' accepts.
+    if deterministic:
+        return PrimeSet([num for num in range(start, end + 1) if is_prime(num)])
+    
     # We start by making a list to keep track of the prime numbers we find.
     primes = []
     
@@ -121,7 +650,7 @@ def miller_rabin_method(start, end, k=5):
             s += 1
         
         # We do a loop 'k' times. Each time, we pick a random number and do some calculations.
-        for i in range(k):
+        for _ in range(k):
             # Pick a random number 'a' between 2 and 'num' - 2.
             a = random.randint(2, num - 2)
             
@@ -133,7 +662,7 @@ def miller_rabin_method(start, end, k=5):
                 continue
             
             # Repeat 's' - 1 times.
-            for i in range(s - 1):
+            for _ in range(s - 1):
                 # Square 'x' and reduce modulo 'num'.
                 x = pow(x, 2, num)
                 
@@ -148,57 +677,982 @@ def miller_rabin_method(start, end, k=5):
             primes.append(num)
     
     # We return our list of prime numbers.
-    return primes
+    return PrimeSet(primes)
+
+"""
+This function finds all the prime numbers up to a small limit using the classic Sieve of Eratosthenes. 
+The segmented sieve uses it to collect the base primes, which only ever go up to the square root of 'end'. 
+It keeps one flag per number in a bytearray, which is eight times smaller than a list of booleans.
+When the shared table of divisors (see 'divisor_table' and 'attach_base_prime_table') already covers 'limit', nothing is sieved: 
+the primes are a slice of the table instead.
+"""
+# This function finds the base primes up to 'limit'.
+def base_primes(limit):
+    # There are no primes below 2.
+    if limit < 2:
+        return []
+    
+    # When the shared table already covers 'limit', its first primes are all we need.
+    table_limit, table = _divisor_table
+    if limit <= table_limit:
+        return table[:bisect_right(table, limit)]
+    
+    # We mark 0 and 1 as not prime, and every other number as prime to begin with.
+    prime = bytearray([1]) * (limit + 1)
+    prime[0] = prime[1] = 0
+    
+    # We cross off the multiples of each prime up to the square root of 'limit'.
+    for p in range(2, isqrt(limit) + 1):
+        if prime[p]:
+            # Slice assignment crosses off every multiple of 'p' in one step instead of a Python loop.
+            prime[p * p::p] = bytes(len(range(p * p, limit + 1, p)))
+    
+    # We return the numbers that are still marked as prime.
+    return list(compress(range(limit + 1), prime))
+
+
+"""
+This function walks over the range from 'start' to 'end' one window at a time and yields the primes found in each window. 
+Only the base primes up to the square root of 'end' and a single window of SEGMENT_SIZE flags are kept in memory, 
+so the memory used depends on the window size and the square root of 'end', not on 'end' itself. 
+This makes it possible to sieve a narrow range of very large numbers, such as 10^10 to 10^10 + 10^6. 
+Callers that sieve several ranges can find the base primes once and pass them as 'primes_below_root'; 
+they must include every prime up to the square root of 'end', and may go further.
+"""
+# This function yields the prime numbers of the range, one window at a time.
+def sieve_segments(start, end, segment_size=SEGMENT_SIZE, primes_below_root=None):
+    # Numbers less than 2 are not prime, so we start at 2 at the earliest.
+    start = max(start, 2)
+    if start > end:
+        return
+    
+    # We only need to cross off multiples of the primes up to the square root of 'end'.
+    if primes_below_root is None:
+        primes_below_root = base_primes(isqrt(end))
+    
+    # We move a window of 'segment_size' numbers across the range.
+    for low in range(start, end + 1, segment_size):
+        high = min(low + segment_size - 1, end)
+        size = high - low + 1
+        
+        # Every number in the window starts out marked as prime.
+        segment = bytearray([1]) * size
+        
+        for p in primes_below_root:
+            # Primes whose square is past the window have no multiples left to cross off in it.
+            if p * p > high:
+                break
+            
+            # We find the first multiple of 'p' inside the window. We never start below p*p, 
+            # because smaller multiples were already crossed off by smaller primes, and 'p' itself must stay marked.
+            first = max(p * p, (low + p - 1) // p * p)
+            segment[first - low::p] = bytes(len(range(first - low, size, p)))
+        
+        # We yield the numbers that are still marked as prime in this window.
+        yield list(compress(range(low, high + 1), segment))
+
+
+"""
+This function sorts a list of (start, end) ranges and merges the ones that overlap, touch, or are less than 'gap' numbers apart. 
+It returns the covering ranges in order as (low, high, members) triples, where 'members' are the positions in 'ranges' of 
+the ranges each one covers. Empty ranges, and ranges below 2, where there are no primes, are not covered by any of them.
+"""
+# This function merges a list of ranges into covering ranges.
+def merge_ranges(ranges, gap=BATCH_MERGE_GAP):
+    order = sorted((max(start, 2), end, index) for index, (start, end) in enumerate(ranges) if max(start, 2) <= end)
+    covering = []
+    for start, end, index in order:
+        if covering and start <= covering[-1][1] + gap + 1:
+            # The range starts close enough to the last covering range, so that range is stretched to cover it too.
+            covering[-1][1] = max(covering[-1][1], end)
+            covering[-1][2].append(index)
+        else:
+            covering.append([start, end, [index]])
+    return [tuple(entry) for entry in covering]
+
+
+"""
+This function finds the primes of many ranges at once with the segmented sieve, and returns one list of primes per range, 
+in the same order as 'ranges'. The ranges are merged into covering ranges with 'merge_ranges', the base primes up to the square root 
+of the biggest 'end' are found only once, and each covering range is sieved once, one window at a time. The primes of each range 
+are sliced out of the windows that overlap it, so the primes of a whole covering range are never held in one list. 
+Overlapping and neighbouring ranges are therefore never sieved twice. 
+Like 'parallel_method', it calls 'should_stop()', if given, between two windows, and raises Cancelled when it returns True.
+"""
+# This function finds the primes of a batch of ranges.
+def sieve_ranges(ranges, gap=BATCH_MERGE_GAP, should_stop=None):
+    results = [[] for _ in ranges]
+    covering = merge_ranges(ranges, gap)
+    if not covering:
+        return results
+    
+    primes_below_root = base_primes(isqrt(max(high for _, high, _ in covering)))
+    for low, high, members in covering:
+        # The ranges of this covering range, by start. 'active' holds the ones that overlap the current window.
+        members = sorted(members, key=lambda index: ranges[index][0])
+        next_member = 0
+        active = []
+        windows = zip(range(low, high + 1, SEGMENT_SIZE), sieve_segments(low, high, SEGMENT_SIZE, primes_below_root))
+        for window_low, segment in windows:
+            if should_stop is not None and should_stop():
+                raise Cancelled()
+            window_high = window_low + SEGMENT_SIZE - 1
+            while next_member < len(members) and ranges[members[next_member]][0] <= window_high:
+                active.append(members[next_member])
+                next_member += 1
+            for index in active:
+                start, end = ranges[index]
+                results[index].extend(segment[bisect_left(segment, start):bisect_right(segment, end)])
+            active = [index for index in active if ranges[index][1] > window_high]
+    return results
+
 
 """
 This function finds prime numbers in a range using the Sieve of Eratosthenes method. 
 It starts by assuming all numbers are prime, then progressively marks the multiples of each number as composite (not prime). 
-At the end, the numbers that are still marked as prime are the prime numbers. This method is very fast and always correct, 
-but it needs to make a list of all the numbers up front, which can use a lot of memory for large ranges.
+At the end, the numbers that are still marked as prime are the prime numbers. This method is very fast and always correct. 
+It is segmented: instead of making a list of all the numbers from 0 to 'end' up front, it sieves the range one cache-sized window at a time.
 """
 # This function finds prime numbers in a range using the Sieve of Eratosthenes method.
 def sieve_of_eratosthenes_method(start, end):
-    # We start by making a list of boolean values representing whether each number is prime.
-    # We mark 0 and 1 as not prime (False), and all other numbers as prime (True).
-    prime = [False, False] + [True] * (end - 1)
+    # We start by making an empty PrimeSet to keep the prime numbers we find.
+    primes = PrimeSet()
     
-    # We start checking from the number 2.
-    p = 2
+    # We add the primes of each window to the set as the sieve moves across the range, so only one window is ever a list.
+    for segment_primes in sieve_segments(start, end):
+        primes.extend(segment_primes)
     
-    # We only need to check numbers up to the square root of 'end'.
-    # This is because if 'end' has a factor greater than its square root, it must also have a smaller factor that has already been checked.
-    while p * p <= end:
-        # If 'p' is marked as prime...
-        if prime[p]:
-            # ...then we mark all multiples of 'p' as not prime.
-            # This is because any multiple of 'p' must have 'p' as a factor, so it can't be prime.
-            for i in range(p * p, end + 1, p):
-                prime[i] = False
+    # We return the prime numbers.
+    return primes
+
+"""
+This function finds prime numbers in a range using a vectorized, odd-only Sieve of Eratosthenes. 
+Even numbers are never stored, so each window only holds one flag per odd number, and the multiples of each base prime 
+are crossed off with a single slice assignment instead of a Python loop. The primes are then read back with 'nonzero' 
+and added to the resulting PrimeSet one window at a time, straight from the NumPy array when NumPy is installed.
+"""
+# This function finds prime numbers in a range using the vectorized sieve.
+def sieve_vectorized_method(start, end, segment_size=VECTOR_SEGMENT_SIZE):
+    # We add the primes of each window to this set as we go.
+    primes = PrimeSet()
+    
+    # 2 is the only even prime, and the odd-only windows below never see it, so we add it on its own.
+    if start <= 2 <= end:
+        primes.extend([2])
+    
+    # The odd base primes up to the square root of 'end' are all we need to cross off composites.
+    odd_base_primes = base_primes(isqrt(max(end, 0)))[1:]
+    
+    # We start at the first odd number that is at least 3 and at least 'start'.
+    first_odd = max(start, 3) | 1
+    
+    # Each window covers 'segment_size' odd numbers, that is twice as many numbers in the range.
+    for low in range(first_odd, end + 1, 2 * segment_size):
+        high = min(low + 2 * segment_size - 2, end)
         
-        # Move on to the next number.
-        p += 1
+        # Slot 'i' of the window stands for the odd number low + 2*i.
+        size = (high - low) // 2 + 1
+        if numpy is not None:
+            segment = numpy.ones(size, dtype=numpy.bool_)
+        else:
+            segment = bytearray([1]) * size
+        
+        for p in odd_base_primes:
+            # Primes whose square is past the window have no multiples left to cross off in it.
+            if p * p > high:
+                break
+            
+            # We find the first odd multiple of 'p' inside the window, starting no lower than p*p.
+            first = max(p * p, (low + p - 1) // p * p)
+            if first % 2 == 0:
+                first += p
+            
+            # Odd multiples of 'p' are 2*p apart, which is 'p' slots apart in the window.
+            index = (first - low) // 2
+            if numpy is not None:
+                segment[index::p] = False
+            else:
+                segment[index::p] = bytes(len(range(index, size, p)))
+        
+        # We turn the slots that are still marked back into the odd numbers they stand for.
+        if numpy is not None:
+            primes.extend(numpy.flatnonzero(segment) * 2 + low)
+        else:
+            primes.extend(list(compress(range(low, high + 1, 2), segment)))
     
-    # At the end, we make a list of all numbers marked as prime in the range from 'start' to 'end'.
-    primes = [num for num in range(start, end + 1) if prime[num]]
+    # We return the prime numbers.
+    return primes
+
+
+"""
+This function finds prime numbers in a range by sieving first and testing afterwards. It's meant for narrow windows of very big numbers, 
+such as a million numbers near 10^20, where a full sieve would need the base primes up to 10^10 and testing every number is slow. 
+Each window of odd numbers is sieved by the primes up to 'bound' only (the pre-sieve), which throws out every number with a small factor 
+using cheap slice assignments. The few numbers that survive go through 'passes_strong_tests', unless they are below bound^2, 
+in which case having no factor up to 'bound' already proves they are prime.
+"""
+# This function finds prime numbers in a range with a pre-sieve followed by strong probable-prime tests.
+def hybrid_method(start, end, bound=PRESIEVE_BOUND, segment_size=SEGMENT_SIZE):
+    # 2 is the only even prime, and the odd-only windows below never see it, so we add it on its own.
+    primes = [2] if start <= 2 <= end else []
     
-    # We return our list of prime numbers.
+    # The pre-sieve goes no further than the width of the range (but at least to the primes below 1000), nor past the square root of 'end'.
+    bound = min(bound, max(SMALL_PRIMES[-1], end - start + 1), isqrt(max(end, 0)))
+    _, table = divisor_table(bound)
+    odd_sieve_primes = table[1:bisect_right(table, bound)]
+    proven = bound * bound
+    
+    # Each window covers 'segment_size' odd numbers, that is twice as many numbers in the range.
+    for low in range(max(start, 3) | 1, end + 1, 2 * segment_size):
+        high = min(low + 2 * segment_size - 2, end)
+        survivors = odd_sieve_window(low, (high - low) // 2 + 1, odd_sieve_primes)
+        for num in compress(range(low, high + 1, 2), survivors):
+            if num <= proven or passes_strong_tests(num):
+                primes.append(num)
+    return PrimeSet(primes)
+
+
+"""
+This function counts the prime numbers up to 'x' without finding them, using Lucy Hedgehog's version of the 
+Legendre/Meissel prime-counting method. It only keeps one count for each distinct value of x // n, which is about 
+2 * sqrt(x) counts, and for each prime p up to sqrt(x) it removes the numbers whose smallest prime factor is p. 
+This takes about x^(3/4) steps, so it's much faster than sieving the whole range, and it never makes a list of primes. 
+With NumPy the inner steps run on whole arrays at once.
+"""
+# This function counts the primes that are less than or equal to 'x'.
+def prime_count(x):
+    # There are no primes below 2.
+    if x < 2:
+        return 0
+    r = isqrt(x)
+    
+    # small[v] counts the numbers from 2 to v that are still "possibly prime", for v up to sqrt(x).
+    # large[i] does the same for the number x // i. To begin with every number from 2 up counts.
+    if numpy is not None and x < 2**62:
+        small = numpy.arange(-1, r, dtype=numpy.int64)
+        large = numpy.zeros(r + 1, dtype=numpy.int64)
+        large[1:] = x // numpy.arange(1, r + 1, dtype=numpy.int64) - 1
+    else:
+        small = list(range(-1, r))
+        large = [0] + [x // i - 1 for i in range(1, r + 1)]
+    
+    for p in range(2, r + 1):
+        # If the count didn't go up at 'p', then 'p' was crossed off and is not prime.
+        primes_before = int(small[p - 1])
+        if small[p] == primes_before:
+            continue
+        p_squared = p * p
+        
+        # We update the counts of the values x // i that are at least p*p. 
+        # For i up to 'split', x // (i*p) is still one of the large values, after that it's one of the small values.
+        last = min(r, x // p_squared)
+        split = min(last, r // p)
+        x_over_p = x // p
+        if numpy is not None and isinstance(large, numpy.ndarray):
+            i = numpy.arange(1, split + 1, dtype=numpy.int64)
+            large[1:split + 1] -= large[i * p] - primes_before
+            i = numpy.arange(split + 1, last + 1, dtype=numpy.int64)
+            large[split + 1:last + 1] -= small[x_over_p // i] - primes_before
+            if p_squared <= r:
+                v = numpy.arange(p_squared, r + 1, dtype=numpy.int64)
+                small[p_squared:] -= small[v // p] - primes_before
+        else:
+            # Each new list is built from the old counts only, which is what the method needs.
+            large[1:split + 1] = [large[i] - large[i * p] + primes_before for i in range(1, split + 1)]
+            large[split + 1:last + 1] = [large[i] - small[x_over_p // i] + primes_before for i in range(split + 1, last + 1)]
+            if p_squared <= r:
+                small[p_squared:] = [small[v] - small[v // p] + primes_before for v in range(p_squared, r + 1)]
+    
+    # large[1] is the count for x // 1, which is 'x' itself.
+    return int(large[1])
+
+
+"""
+This function estimates the time 'prime_count(x)' takes, in seconds. It takes about x^(3/4) steps, 
+and keeps about 2 * sqrt(x) counts in memory, so counting much past 10^14 is out of reach in practice.
+"""
+# This function estimates the cost of counting the primes up to 'x'.
+def prime_count_cost(x):
+    # x^(3/4) is worked out with integer roots, so huge numbers don't overflow a float.
+    fourth_root = isqrt(isqrt(max(x, 0)))
+    if fourth_root > 10**100:
+        return float("inf")
+    unit_seconds = PRIME_COUNT_UNIT_SECONDS if numpy is not None and x < 2**62 else PRIME_COUNT_UNIT_SECONDS_NO_NUMPY
+    return unit_seconds * float(fourth_root) ** 3
+
+
+# This function tells whether a range is narrow enough to be counted by looking at every number in it, 
+# which costs about its width, rather than with 'prime_count', which costs about end^(3/4).
+def is_narrow_count(start, end):
+    return end - start + 1 < isqrt(isqrt(max(end, 0))) ** 3
+
+
+"""
+This function counts the prime numbers between 'start' and 'end' without making a list of them. 
+Narrow ranges are counted with the hybrid method on just that window: a pre-sieve by small primes and a strong 
+probable-prime test of the numbers that survive it, so no base primes up to sqrt(end) are needed, however big 'end' is. 
+Wider ranges are counted as prime_count(end) - prime_count(start - 1).
+"""
+# This function counts the primes in a range.
+def count_primes_in_range(start, end):
+    if end < 2 or start > end:
+        return 0
+    if is_narrow_count(start, end):
+        return len(hybrid_method(start, end))
+    return prime_count(end) - prime_count(start - 1)
+
+
+# This function estimates the time 'count_primes_in_range' takes on a range, in seconds.
+def count_primes_cost(start, end):
+    if end < 2 or start > end:
+        return 0.0
+    if is_narrow_count(start, end):
+        return ENGINES["hybrid"].estimate(start, end)
+    return prime_count_cost(end) + prime_count_cost(start - 1)
+
+
+"""
+This function finds the smallest prime number that is bigger than 'num'. 
+It only looks at the numbers that are not multiples of 2, 3 or 5, by stepping through the residues in WHEEL_30, 
+and checks each of them with 'is_prime'.
+"""
+# This function finds the next prime after 'num'.
+def next_prime(num):
+    # The primes below 7 are not covered by the wheel, so we handle them first.
+    for p in (2, 3, 5, 7):
+        if num < p:
+            return p
+    
+    # We jump to the first number after 'num' that's on the wheel, then follow the wheel.
+    base = (num + 1) // 30 * 30
+    while True:
+        for residue in WHEEL_30:
+            candidate = base + residue
+            if candidate > num and is_prime(candidate):
+                return candidate
+        base += 30
+
+
+"""
+This function finds the biggest prime number that is smaller than 'num', or None if there isn't one. 
+Like 'next_prime', it walks the wheel of numbers that are not multiples of 2, 3 or 5, this time downwards.
+"""
+# This function finds the previous prime before 'num'.
+def prev_prime(num):
+    # The primes below 7 are not covered by the wheel, so we handle them last.
+    if num <= 7:
+        smaller = [p for p in (2, 3, 5) if p < num]
+        return smaller[-1] if smaller else None
+    
+    # We start at the wheel row that holds num - 1 and walk the wheel downwards.
+    base = (num - 1) // 30 * 30
+    while base >= 0:
+        for residue in reversed(WHEEL_30):
+            candidate = base + residue
+            if 7 <= candidate < num and is_prime(candidate):
+                return candidate
+        base -= 30
+    return 5
+
+
+# This function estimates the time 'is_prime(num)' takes, in seconds. Numbers below 1000^2 only need trial division by the small primes, 
+# and bigger ones at most one strong probable-prime test.
+def is_prime_cost(num):
+    if num < 1000 * 1000:
+        return 0.0
+    return max(STRONG_TEST_MIN_SECONDS, STRONG_TEST_UNIT_SECONDS * float(num.bit_length()) ** 2.85)
+
+
+# This function estimates the time 'next_prime(num)' or 'prev_prime(num)' takes, in seconds. 
+# They walk past about ln(num) numbers, and about one in twelve of those has no factor below 1000 and needs a strong test, 
+# which comes to about one strong test for every 16 bits of 'num'.
+def prime_search_cost(num):
+    return is_prime_cost(num) * max(1.0, num.bit_length() / 16)
+
+
+# This function estimates where the n-th prime is, for n above 6, with n * (ln n + ln ln n - 1 + (ln ln n - 2) / ln n).
+def nth_prime_estimate(n):
+    log_n = log(n)
+    log_log_n = log(log_n)
+    return int(n * (log_n + log_log_n - 1 + (log_log_n - 2) / log_n))
+
+
+# This function estimates the time 'nth_prime(n)' takes, in seconds. Nearly all of it is counting the primes up to the estimate.
+def nth_prime_cost(n):
+    if n <= 6:
+        return 0.0
+    if n > 10**100:
+        return float("inf")
+    return prime_count_cost(nth_prime_estimate(n))
+
+
+"""
+This function finds the n-th prime number (the first one being 2) without listing all the primes before it. 
+It estimates where the n-th prime is with the formula n * (ln n + ln ln n - 1 + (ln ln n - 2) / ln n), 
+counts the primes up to that estimate with 'prime_count', and then sieves the few windows between the estimate 
+and the answer to find it exactly.
+"""
+# This function finds the n-th prime number.
+def nth_prime(n):
+    if n < 1:
+        raise ValueError("n must be at least 1")
+    
+    # The estimate is not accurate for very small n, so we look those up directly.
+    if n <= 6:
+        return (2, 3, 5, 7, 11, 13)[n - 1]
+    
+    # We estimate the position of the n-th prime and count the primes up to the estimate.
+    estimate = nth_prime_estimate(n)
+    count = prime_count(estimate)
+    
+    if count < n:
+        # The estimate is too low: we sieve forward, window by window, until we reach the n-th prime.
+        low = estimate + 1
+        while True:
+            primes = sieve_of_eratosthenes_method(low, low + SEGMENT_SIZE - 1)
+            if count + len(primes) >= n:
+                return primes[n - count - 1]
+            count += len(primes)
+            low += SEGMENT_SIZE
+    
+    # The estimate is too high, or exactly right: we sieve backwards, window by window, until we pass the n-th prime.
+    high = estimate
+    while True:
+        low = max(high - SEGMENT_SIZE + 1, 2)
+        primes = sieve_of_eratosthenes_method(low, high)
+        if count - len(primes) < n:
+            return primes[n - (count - len(primes)) - 1]
+        count -= len(primes)
+        high = low - 1
+
+
+"""
+This function adds up the cost of checking every number from 0 to 'x', for the weight of an engine: 'flat', 'sqrt' or 'log'. 
+It uses the closed form of the sum, so it's cheap to call even for huge 'x'.
+"""
+# This function gives the total cost of checking the numbers below 'x'.
+def cumulative_cost(x, weight):
+    x = max(x, 2)
+    if weight == "sqrt":
+        # The sum of sqrt(n) grows like (2/3) * x^(3/2).
+        return 2 * x ** 1.5 / 3
+    if weight == "log":
+        # The sum of log(n) grows like x * log(x) - x.
+        return x * log(x) - x
+    return float(x)
+
+
+# A range narrower than its end divided by this factor is "narrow": the difference of two cumulative costs that close together 
+# would lose most of its digits to floating point rounding, so the cost of every number in it is taken to be the same instead.
+NARROW_RANGE_FACTOR = 1 << 20
+
+
+"""
+This function gives the cost of checking every number from 'start' to 'end', for the weight of an engine. 
+For narrow ranges, such as a window of a million numbers near 10^30, the cost per number hardly changes across the range, 
+so it's the width of the range times the cost of its middle number. Other ranges use the difference of the cumulative costs.
+"""
+# This function gives the cost of checking the numbers of a range.
+def range_cost(start, end, weight):
+    start = max(start, 0)
+    width = end - start + 1
+    if width <= 0:
+        return 0.0
+    if width * NARROW_RANGE_FACTOR < end:
+        middle = max((start + end) // 2, 2)
+        if weight == "sqrt":
+            return width * float(isqrt(middle))
+        if weight == "log":
+            return width * log(middle)
+        return float(width)
+    return cumulative_cost(end + 1, weight) - cumulative_cost(start, weight)
+
+
+"""
+This function splits the range from 'start' to 'end' into 'chunks' pieces that take about the same time to check. 
+Because bigger numbers cost more to check with some methods, the pieces near the end of the range are narrower than those near the start. 
+The pieces are returned in order as (low, high) pairs that together cover the whole range.
+"""
+# This function splits a range into chunks of equal cost.
+def partition_range(start, end, chunks, weight="flat"):
+    # We can't make more chunks than there are numbers in the range.
+    chunks = max(1, min(chunks, end - start + 1))
+    
+    # In a narrow range every number costs about the same, and the cumulative costs are too close together to search, 
+    # so the range is cut into pieces of equal width with exact integer arithmetic.
+    width = end - start + 1
+    if width * NARROW_RANGE_FACTOR < end:
+        bounds = [start + width * k // chunks for k in range(chunks + 1)]
+        return [(bounds[i], bounds[i + 1] - 1) for i in range(chunks)]
+    total_low = cumulative_cost(start, weight)
+    total_high = cumulative_cost(end + 1, weight)
+    
+    bounds = [start]
+    for k in range(1, chunks):
+        # We look for the first number where the running cost reaches k parts of the total, using a binary search.
+        target = total_low + (total_high - total_low) * k / chunks
+        low, high = bounds[-1], end + 1
+        while low < high:
+            middle = (low + high) // 2
+            if cumulative_cost(middle, weight) < target:
+                low = middle + 1
+            else:
+                high = middle
+        # We skip boundaries that would make an empty chunk.
+        if bounds[-1] < low <= end:
+            bounds.append(low)
+    bounds.append(end + 1)
+    
+    # Each chunk runs from one boundary up to just before the next one.
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(len(bounds) - 1)]
+
+
+# A computation that can be cancelled is cut into chunks that are each expected to take about this many seconds, 
+# and checks whether it should stop between two chunks. It stops within about this long after being asked to.
+CANCEL_CHECK_SECONDS = 0.05
+
+# The most chunks a computation that can be cancelled is cut into, so that handling the chunks never costs more than the work itself.
+MAX_CANCEL_CHUNKS = 4096
+
+
+# The error raised when a computation is stopped before it finishes, because its 'should_stop' function returned True.
+class Cancelled(Exception):
+    pass
+
+
+# The process pool is kept between calls so worker processes don't have to be started again for every range.
+_executor = None
+_executor_workers = 0
+
+
+"""
+This function returns the shared process pool, creating it the first time it's needed. 
+If a different number of workers is asked for, the old pool is shut down and a new one is made.
+"""
+# This function returns the shared process pool with 'workers' worker processes.
+def get_executor(workers):
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        shutdown_executor()
+        # Workers attach the shared base-prime table rather than building their own.
+        if _base_table_path is not None:
+            _executor = ProcessPoolExecutor(max_workers=workers, initializer=attach_base_prime_table, initargs=(_base_table_path,))
+        else:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        _executor_workers = workers
+    return _executor
+
+
+# This function shuts down the shared process pool, if there is one.
+def shutdown_executor():
+    global _executor, _executor_workers
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+        _executor_workers = 0
+
+
+"""
+This function runs any of the methods above on several CPU cores at once. 
+It splits the range into chunks of about equal cost with 'partition_range', sends them to the shared process pool, 
+and joins the results back together in order. With one job, or for small ranges, it simply calls the method directly. 
+
+When a 'should_stop' function is given, the computation can be cancelled: the range is cut into chunks of about 
+CANCEL_CHECK_SECONDS each, 'should_stop()' is called between chunks, and as soon as it returns True the chunks that 
+haven't started yet are dropped and Cancelled is raised.
+"""
+# This function runs a method over a range using 'jobs' worker processes.
+def parallel_method(method_function, start, end, jobs=None, should_stop=None):
+    # By default we use every CPU core.
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    parallel = jobs > 1 and end - start + 1 >= MIN_PARALLEL_RANGE
+    engine = next((engine for engine in ENGINES.values() if engine.function is method_function), None)
+    weight = engine.weight if engine is not None else "flat"
+    
+    # Small ranges and single jobs are not worth sending to other processes.
+    if not parallel and should_stop is None:
+        return method_function(start, end)
+    
+    # We split the range into chunks of equal cost for this method, using the weight of its engine in ENGINES.
+    # Computations that can be cancelled use more and smaller chunks, so they check often enough whether to stop.
+    pieces = jobs * CHUNKS_PER_JOB if parallel else 1
+    if should_stop is not None and engine is not None:
+        work = range_cost(start, end, weight)
+        pieces = max(pieces, min(ceil(engine.scale * engine.unit_seconds * work / CANCEL_CHECK_SECONDS), MAX_CANCEL_CHUNKS))
+    
+    if not parallel:
+        # The segmented sieve finds its base primes only once and checks between its own windows.
+        if method_function is sieve_of_eratosthenes_method:
+            windows = sieve_segments(start, end)
+        else:
+            windows = (method_function(low, high) for low, high in partition_range(start, end, pieces, weight))
+        results = []
+        for window in windows:
+            if should_stop():
+                raise Cancelled()
+            results.append(window)
+    elif should_stop is None:
+        # 'map' runs the chunks in parallel but gives back the results in the same order as the chunks.
+        chunks = partition_range(start, end, pieces, weight)
+        executor = get_executor(jobs)
+        results = list(executor.map(method_function, [low for low, _ in chunks], [high for _, high in chunks]))
+    else:
+        # The chunks are sent to the pool one by one, and we check whether to stop each time one finishes or the check interval passes.
+        chunks = partition_range(start, end, pieces, weight)
+        executor = get_executor(jobs)
+        futures = [executor.submit(method_function, low, high) for low, high in chunks]
+        pending = set(futures)
+        try:
+            while pending:
+                if should_stop():
+                    raise Cancelled()
+                _, pending = wait(pending, timeout=CANCEL_CHECK_SECONDS, return_when=FIRST_COMPLETED)
+        finally:
+            # Chunks that haven't started yet are dropped. Chunks already running in a worker can't be interrupted, but they are short.
+            for future in pending:
+                future.cancel()
+        results = [future.result() for future in futures]
+    
+    # The results of the chunks are joined into one PrimeSet by copying their gaps, without turning any of them into a list.
+    primes = PrimeSet()
+    for result in results:
+        primes.extend(result)
+    return primes
+
+
+"""
+This function is the generator version of the methods above. Instead of returning all the primes at once, 
+it yields them one window at a time, so the caller can start using the first primes straight away and never has to 
+hold the whole result in memory. The sieve uses its own segmented producer, and the other methods are run on one window after another.
+"""
+# This function yields the primes found by 'method_function', one window at a time.
+def method_segments(method_function, start, end, segment_size=SEGMENT_SIZE):
+    # The segmented sieve already works window by window, and only needs its base primes once.
+    if method_function is sieve_of_eratosthenes_method:
+        yield from sieve_segments(start, end, segment_size)
+        return
+    
+    # Every other method is simply run on each window in turn.
+    for low in range(start, end + 1, segment_size):
+        yield method_function(low, min(low + segment_size - 1, end))
+
+
+"""
+This function turns the result of any of the methods into a plain Python list. 
+The methods return a PrimeSet, which is iterated, counted and encoded as it is; this is only for the few places that need a real list.
+"""
+# This function turns a result into a list of prime numbers.
+def to_list(primes):
+    # PrimeSets and NumPy arrays know how to turn themselves into lists of Python ints.
+    if hasattr(primes, "tolist"):
+        return primes.tolist()
     return primes
 
+"""
+This function crosses off the composite numbers in one window of odd numbers. 
+Slot 'i' of the returned bytearray stands for the odd number low + 2*i, and is 1 if that number is prime. 
+'low' must be odd, and 'odd_base_primes' must hold the odd primes up to the square root of the last number in the window.
+"""
+# This function sieves a window of 'size' odd numbers starting at 'low'.
+def odd_sieve_window(low, size, odd_base_primes):
+    high = low + 2 * (size - 1)
+    segment = bytearray([1]) * size
+    
+    # 1 is not prime, and it's the only odd number below 3.
+    if low == 1:
+        segment[0] = 0
+    
+    for p in odd_base_primes:
+        # Primes whose square is past the window have no multiples left to cross off in it.
+        if p * p > high:
+            break
+        
+        # We find the first odd multiple of 'p' inside the window, starting no lower than p*p.
+        first = max(p * p, (low + p - 1) // p * p)
+        if first % 2 == 0:
+            first += p
+        index = (first - low) // 2
+        segment[index::p] = bytes(len(range(index, size, p)))
+    return segment
+
+
+"""
+This function packs a bytearray of 0/1 flags into bits, eight flags per byte, with the first flag in the lowest bit. 
+Without NumPy it takes every eighth flag at once and shifts it into place, which works because each flag is 0 or 1 
+and so can never carry into the next byte.
+"""
+# This function packs a bytearray of flags into a bitmap.
+def pack_flags(flags):
+    # We pad the flags to a whole number of bytes.
+    flags = bytes(flags) + bytes(-len(flags) % 8)
+    if numpy is not None:
+        return numpy.packbits(numpy.frombuffer(flags, dtype=numpy.uint8), bitorder="little").tobytes()
+    packed = 0
+    for bit in range(8):
+        packed |= int.from_bytes(flags[bit::8], "little") << bit
+    return packed.to_bytes(len(flags) // 8, "little")
+
+
+"""
+This function builds a prime index file: a bitmap with one bit for every odd number up to 'limit', set when the number is prime. 
+Every CHECKPOINT_BLOCK_BITS bits the file also records how many primes came before, so primes can be counted without scanning the whole bitmap. 
+The file starts with a fixed header (see INDEX_HEADER), followed by the checkpoints and then the bitmap. 
+The bitmap is written window by window, so building an index up to 10^10 needs no more memory than one window.
+"""
+# This function writes the prime index for the numbers up to 'limit' to 'path'.
+def build_prime_index(limit, path):
+    # Bit 'i' stands for the odd number 2*i + 1.
+    num_bits = (limit + 1) // 2
+    num_blocks = (num_bits + CHECKPOINT_BLOCK_BITS - 1) // CHECKPOINT_BLOCK_BITS
+    odd_base_primes = base_primes(isqrt(limit))[1:]
+    
+    checkpoints = array("Q")
+    with open(path, "wb") as index_file:
+        # We write the header, then leave room for the checkpoints and come back to fill them in at the end.
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, CHECKPOINT_BLOCK_BITS, limit, num_bits, num_blocks))
+        index_file.write(bytes(8 * (num_blocks + 1)))
+        
+        # Each window is a whole number of checkpoint blocks, so the checkpoints can be counted from the packed window.
+        count = 0
+        for first_bit in range(0, num_bits, INDEX_WINDOW_BITS):
+            size = min(INDEX_WINDOW_BITS, num_bits - first_bit)
+            packed = pack_flags(odd_sieve_window(2 * first_bit + 1, size, odd_base_primes))
+            block_bytes = CHECKPOINT_BLOCK_BITS // 8
+            for offset in range(0, len(packed), block_bytes):
+                checkpoints.append(count)
+                count += int.from_bytes(packed[offset:offset + block_bytes], "little").bit_count()
+            index_file.write(packed)
+        checkpoints.append(count)
+        
+        # The checkpoints are stored in little-endian order, whatever the machine uses.
+        if sys.byteorder == "big":
+            checkpoints.byteswap()
+        index_file.seek(INDEX_HEADER.size)
+        index_file.write(checkpoints.tobytes())
+
+
+"""
+This class reads a prime index file written by 'build_prime_index'. 
+The file is memory-mapped, so nothing is read into memory up front, and several processes that open the same file 
+share its pages through the operating system's page cache. Ranges below the index limit are answered by reading only 
+the bits of that range, and primes are counted with the checkpoints plus a popcount of at most one block.
+"""
+# This class gives fast access to the primes stored in a prime index file.
+class PrimeIndex:
+    # This function opens the index file and checks its header.
+    def __init__(self, path):
+        with open(path, "rb") as index_file:
+            self.mapping = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mapping) < INDEX_HEADER.size:
+            self.mapping.close()
+            raise ValueError(f"{path} is not a prime index file of version {INDEX_VERSION}")
+        magic, version, self.block_bits, self.limit, self.num_bits, self.num_blocks = INDEX_HEADER.unpack_from(self.mapping)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.mapping.close()
+            raise ValueError(f"{path} is not a prime index file of version {INDEX_VERSION}")
+        
+        # The checkpoints are read straight from the mapping, as an array of little-endian 64-bit counts.
+        self.checkpoints = memoryview(self.mapping)[INDEX_HEADER.size:INDEX_HEADER.size + 8 * (self.num_blocks + 1)].cast("Q")
+        self.bitmap_offset = INDEX_HEADER.size + 8 * (self.num_blocks + 1)
+    
+    # This function closes the mapping.
+    def close(self):
+        self.checkpoints.release()
+        self.mapping.close()
+    
+    # This function finds the bits that stand for the odd numbers between 'start' and 'end'.
+    # It returns the first and last bit, or None if there are no odd numbers above 1 in the range.
+    def bit_range(self, start, end):
+        first_bit = max(start, 3) // 2
+        last_bit = (end - 1) // 2
+        if end < 3 or first_bit > last_bit:
+            return None
+        return first_bit, last_bit
+    
+    # This function returns the primes between 'start' and 'end', which must not be above the index limit.
+    def primes(self, start, end):
+        primes = [2] if start <= 2 <= end else []
+        bits = self.bit_range(start, end)
+        if bits is None:
+            return PrimeSet(primes)
+        first_bit, last_bit = bits
+        
+        # We only touch the bytes that hold the bits of the range.
+        first_byte = first_bit // 8
+        last_byte = last_bit // 8
+        if numpy is not None:
+            window = numpy.frombuffer(self.mapping, dtype=numpy.uint8, count=last_byte - first_byte + 1, offset=self.bitmap_offset + first_byte)
+            positions = numpy.flatnonzero(numpy.unpackbits(window, bitorder="little")) + 8 * first_byte
+            positions = positions[(positions >= first_bit) & (positions <= last_bit)]
+            result = PrimeSet(primes)
+            result.extend(positions * 2 + 1)
+            return result
+        window = self.mapping[self.bitmap_offset + first_byte:self.bitmap_offset + last_byte + 1]
+        for byte_number, byte in enumerate(window, first_byte):
+            for bit in BIT_POSITIONS[byte]:
+                position = 8 * byte_number + bit
+                if first_bit <= position <= last_bit:
+                    primes.append(2 * position + 1)
+        return PrimeSet(primes)
+    
+    # This function counts the primes whose bit comes before 'bit', using the checkpoint of its block and a popcount of the rest.
+    def count_below_bit(self, bit):
+        block = bit // self.block_bits
+        count = self.checkpoints[block]
+        first_byte = self.bitmap_offset + block * self.block_bits // 8
+        last_byte = self.bitmap_offset + bit // 8
+        count += int.from_bytes(self.mapping[first_byte:last_byte], "little").bit_count()
+        if bit % 8:
+            count += (self.mapping[last_byte] & ((1 << (bit % 8)) - 1)).bit_count()
+        return count
+    
+    # This function counts the primes between 'start' and 'end', which must not be above the index limit.
+    def count(self, start, end):
+        count = 1 if start <= 2 <= end else 0
+        bits = self.bit_range(start, end)
+        if bits is None:
+            return count
+        first_bit, last_bit = bits
+        return count + self.count_below_bit(last_bit + 1) - self.count_below_bit(first_bit)
+
+
+"""
+This class describes one prime-finding engine: the function that runs it, what it can do, and how long it is expected to take. 
+The expected time is a simple cost model: a fixed overhead, plus 'unit_seconds' for every unit of work given by its 'weight' 
+(see 'cumulative_cost'), plus 'root_seconds' for every number up to the square root of 'end' (the base primes of a sieve). 
+'scale' multiplies the whole estimate; it starts at 1 and is refitted from measured run times. 
+Engines that always give the same answer for the same range are 'deterministic', and only those are picked by the 'auto' method.
+"""
+# This class describes a prime-finding engine and its cost model.
+class Engine:
+    # This function stores the description of the engine.
+    def __init__(self, name, label, function, weight="flat", unit_seconds=0.0, root_seconds=0.0, overhead_seconds=0.00005, deterministic=True):
+        self.name = name
+        self.label = label
+        self.function = function
+        self.weight = weight
+        self.unit_seconds = unit_seconds
+        self.root_seconds = root_seconds
+        self.overhead_seconds = overhead_seconds
+        self.deterministic = deterministic
+        self.scale = 1.0
+    
+    # This function estimates the time, in seconds, that the engine takes on the range before 'scale' is applied.
+    def base_estimate(self, start, end):
+        if start > end:
+            return self.overhead_seconds
+        work = range_cost(start, end, self.weight)
+        return self.overhead_seconds + self.unit_seconds * work + self.root_seconds * isqrt(max(end, 0))
+    
+    # This function estimates the time, in seconds, that the engine takes on the range.
+    def estimate(self, start, end):
+        return self.scale * self.base_estimate(start, end)
+
+
+# The registry of engines, by the method name used on the command line and in the server.
+# New engines are added here, and the CLI, the server and the 'auto' method pick them up from the registry.
+ENGINES = {
+    "brute_force": Engine("brute_force", "Brute Force", brute_force_method, "sqrt", unit_seconds=3e-10),
+    "trial_division": Engine("trial_division", "Trial Division", trial_division_method, "sqrt", unit_seconds=2.8e-10),
+    "miller_rabin": Engine("miller_rabin", "Miller-Rabin", miller_rabin_method, "log", unit_seconds=8e-8),
+    "sieve_of_eratosthenes": Engine("sieve_of_eratosthenes", "Sieve of Eratosthenes", sieve_of_eratosthenes_method, unit_seconds=3e-8, root_seconds=1.1e-7),
+    "sieve_vectorized": Engine("sieve_vectorized", "Sieve of Eratosthenes (vectorized)", sieve_vectorized_method, unit_seconds=3e-9 if numpy is not None else 1.5e-8, root_seconds=1.1e-7),
+    "hybrid": Engine("hybrid", "Pre-sieve and test (hybrid)", hybrid_method, "log", unit_seconds=7e-8),
+}
+
+
+"""
+This function picks the engine that is expected to finish the range soonest, among the deterministic engines in ENGINES. 
+Narrow windows of very big numbers usually go to Miller-Rabin, because a sieve has to find all the base primes up to 
+the square root of 'end' first, while wide ranges of smaller numbers go to a sieve.
+"""
+# This function picks the fastest engine for a range.
+def choose_engine(start, end):
+    candidates = [engine for engine in ENGINES.values() if engine.deterministic]
+    return min(candidates, key=lambda engine: engine.estimate(start, end))
+
+
+"""
+This function looks up an engine by its method name. The name 'auto' picks the engine expected to be fastest for the range. 
+It returns None for an unknown name.
+"""
+# This function finds the engine for a method name and a range.
+def get_engine(method, start, end):
+    if method == "auto":
+        return choose_engine(start, end)
+    return ENGINES.get(method)
+
+
+# Measured run times of ranges estimated to take less than this many seconds are mostly the fixed cost of the request, 
+# not of the engine, so they are left out when the cost model is refitted.
+MIN_REFIT_SECONDS = 0.01
+
+
+"""
+This function refits the 'scale' of an engine from measured run times. 'samples' is a list of (start, end, seconds). 
+The new scale is the median of measured time divided by the model's estimate, which is not thrown off by a few unusual runs. 
+Samples of ranges that are too small to time reliably are skipped, and the scale is kept when no sample is left.
+"""
+# This function refits the cost model of an engine.
+def refit_engine(engine, samples):
+    estimates = [(seconds, engine.base_estimate(start, end)) for start, end, seconds in samples if seconds > 0]
+    ratios = sorted(seconds / estimate for seconds, estimate in estimates if estimate >= MIN_REFIT_SECONDS)
+    if ratios:
+        engine.scale = ratios[len(ratios) // 2]
+    return engine.scale
+
+
 # This is the main function that runs when the script is executed.
 def main():
+    # Read the optional '--jobs N' flag, which sets how many CPU cores to use, and remove it from the other arguments.
+    args = sys.argv[1:]
+    jobs = 1
+    if "--jobs" in args:
+        index = args.index("--jobs")
+        if index + 1 >= len(args):
+            print("Error: Please provide the number of jobs after --jobs!")
+            sys.exit(1)
+        jobs = int(args[index + 1])
+        del args[index:index + 2]
+    
+    # The 'build_index' command writes a prime index file instead of printing primes.
+    if args and args[0] == "build_index":
+        if len(args) < 3:
+            print("Error: Please provide complete arguments.\nFormat should be : python prime_no_generator.py build_index limit path!")
+            sys.exit(1)
+        limit = int(args[1])
+        start_time = time.time()
+        build_prime_index(limit, args[2])
+        print(f"Prime index up to {limit} written to {args[2]}")
+        print(f"Time taken: {time.time() - start_time:.6f} seconds")
+        return
+    
+    # The 'build_table' command writes a base-prime table file, which the server's worker processes attach instead of building their own.
+    if args and args[0] == "build_table":
+        if len(args) < 3:
+            print("Error: Please provide complete arguments.\nFormat should be : python prime_no_generator.py build_table limit path!")
+            sys.exit(1)
+        limit = int(args[1])
+        start_time = time.time()
+        write_base_prime_table(limit, args[2])
+        print(f"Base-prime table up to {limit} written to {args[2]}")
+        print(f"Time taken: {time.time() - start_time:.6f} seconds")
+        return
+    
     # Check if the correct number of arguments are provided. If not, print an error message and exit.
-    if len(sys.argv) < 4:
-        print("Error: Please provide complete arguments.\nFormat should be : python prime_no_generator.py method_name start end!")
+    if len(args) < 3:
+        print("Error: Please provide complete arguments.\nFormat should be : python prime_no_generator.py method_name start end [--jobs N]!")
         sys.exit(1)
     
     # Extract the method name, start, and end from the command line arguments.
-    method = sys.argv[1] 
-    start = int(sys.argv[2])
-    end = int(sys.argv[3])
+    method = args[0] 
+    start = int(args[1])
+    end = int(args[2])
 
     # Check if the method name is valid. If not, print an error message and exit.
-    if method not in ["brute_force", "trial_division", "miller_rabin", "sieve_of_eratosthenes"]:
-        print("Error: Invalid method. Choose from 'brute_force', 'trial_division', 'miller_rabin', 'sieve_of_eratosthenes'")
+    if method != "auto" and method not in ENGINES:
+        print("Error: Invalid method. Choose from 'auto', " + ", ".join(f"'{name}'" for name in ENGINES))
         sys.exit(1)
     
     # Check if the start is less than or equal to the end. If not, print an error message and exit.
@@ -209,15 +1663,14 @@ def main():
     # Record the start time before running the prime number generation.
     start_time = time.time()
     
-    # Call the appropriate function based on the method name.
-    if method == "brute_force":
-        prime_no = brute_force_method(start, end)
-    elif method == "trial_division":
-        prime_no = trial_division_method(start, end)
-    elif method == "miller_rabin":
-        prime_no = miller_rabin_method(start, end)
-    elif method == "sieve_of_eratosthenes":
-        prime_no = sieve_of_eratosthenes_method(start, end)
+    # Pick the engine for the method name from the registry. With 'auto', the engine expected to be fastest for the range is picked.
+    engine = get_engine(method, start, end)
+    if method == "auto":
+        print(f"The auto method picked the {engine.name} method.")
+        method = engine.name
+    
+    # Run the method, split across 'jobs' CPU cores.
+    prime_no = parallel_method(engine.function, start, end, jobs)
     
     # Record the end time after running the prime number generation.
     end_time = time.time()
@@ -239,12 +1692,31 @@ brute force, trial division, Miller-Rabin, and Sieve of Eratosthenes. Each metho
 The script takes command-line arguments to determine the method and the range (start and end) for prime number generation. 
 It also measures the time taken by each method to complete the task.
 
-The 'brute_force_method' checks each number for factors up to its square root. The 'trial_division_method' improves efficiency 
-by checking divisibility only by 2, 3, and numbers of the form 6n±1. The 'miller_rabin_method' is a probabilistic test that 
-uses random numbers to determine primality, particularly useful for large numbers. Lastly, the 'sieve_of_eratosthenes_method' 
-efficiently finds all primes in the range by iteratively marking the multiples of each prime number starting from 2.
+The 'brute_force_method' checks each number on the mod-30 wheel for prime factors up to its square root, taken from a shared table 
+of small primes that grows as needed. The 'trial_division_method' does the same on the mod-210 wheel, which also skips the multiples of 7. The 'miller_rabin_method' is particularly useful for large numbers. 
+By default it uses 'is_prime', a deterministic test built from small-prime trial division, fixed Miller-Rabin witnesses below 2^64 
+and Baillie-PSW above that; it can also run the original probabilistic test that uses random numbers to determine primality. Lastly, the 'sieve_of_eratosthenes_method' 
+efficiently finds all primes in the range by iteratively marking the multiples of each prime number starting from 2. 
+It sieves the range in cache-sized windows with 'sieve_segments', so its memory does not grow with the size of 'end'. 
+The 'sieve_vectorized_method' is the same sieve storing odd numbers only and crossing off multiples with slice assignment, 
+using NumPy when it is available. The 'hybrid_method' is meant for narrow windows of very big numbers: it sieves the window 
+by the primes up to a bound and only runs the strong probable-prime tests on the numbers that survive.
+
+Every method is described by an 'Engine' in the ENGINES registry, with a cost model that estimates its run time for a range. 
+The 'auto' method uses 'choose_engine' to pick the engine expected to be fastest, and 'refit_engine' adjusts a cost model from measured times.
+
+Any of the methods can be run on several CPU cores with 'parallel_method', which splits the range into chunks of equal cost 
+and runs them on a shared process pool.
+
+The 'prime_count' function counts the primes up to a number with Lucy Hedgehog's method, without listing them, 
+and 'count_primes_in_range' uses it (or a sieve, for narrow windows) to count the primes in a range.
+
+The 'next_prime', 'prev_prime' and 'nth_prime' functions answer single questions about primes: the first two walk a mod-30 wheel 
+with 'is_prime', and 'nth_prime' estimates the position of the prime, counts up to the estimate and sieves the rest.
 
 The 'main' function orchestrates the script's execution: it validates the input arguments, selects the appropriate 
-prime-finding method, and prints the results along with the execution time. If the script is run directly, the 'main' 
+prime-finding method, runs it on the number of cores given by '--jobs', and prints the results along with the execution time. 
+With the 'build_index' command it instead writes a prime index file with 'build_prime_index': an odd-only bitmap of the primes 
+up to a limit with popcount checkpoints, which the 'PrimeIndex' class memory-maps to answer range queries without sieving. If the script is run directly, the 'main' 
 function is called, ensuring that the script can also be imported as a module without immediately executing.
 """
\ No newline at end of file
@@ -1,68 +1,468 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Form
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, HTTPException, Form, Request, Query
+from fastapi.responses import HTMLResponse, StreamingResponse, Response, JSONResponse
 
 # Importing models and database functions
-from ..models import PrimeRequest, PrimeResponse
-from ..database import get_db
-
-# SQLAlchemy imports
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from ..models import PrimeRequest, PrimeResponse, PrimeCountResponse, PrimeBatchRequest, PrimeBatchResponse
+from ..telemetry import execution_log
+from .. import metrics
+from ..profiling import profile_if_slow
 
 import time
-from datetime import datetime
+import json
+from typing import Optional
 
 # Importing prime number generation methods
-from .prime_no_generator import brute_force_method, trial_division_method, miller_rabin_method, sieve_of_eratosthenes_method
+from .prime_no_generator import ENGINES, get_engine, to_list, parallel_method, method_segments, PrimeIndex, PrimeSet
+from .prime_no_generator import count_primes_in_range, count_primes_cost, Cancelled, merge_ranges, sieve_ranges
+from .prime_no_generator import write_base_prime_table, attach_base_prime_table
+
+# Importing the server settings and the result cache
+from .. import config
+from ..cache import IntervalCache, ResponseCache
+from ..coalescing import SingleFlight, aligned_pieces
+from ..admission import RequestGuard, admit, check_budget
+from .. import encoding
 
 # Create a FastAPI router
 router = APIRouter()
 
-# Function to write execution details to the database
-def write_to_db(prime_no, request, start_time, db: Session):
-    # Calculate end time and time elapsed
-    end_time = time.time()
-    time_elapsed = round(end_time - start_time, 6)
-    timestamp_str = datetime.fromtimestamp(start_time).strftime('%H:%M:%S')
+# The cache of computed ranges shared by all requests
+prime_cache = IntervalCache(config.CACHE_MAX_BYTES)
+
+# The computations in flight, shared by all requests, so concurrent requests for the same blocks compute them once
+prime_flights = SingleFlight()
+
+# The finished GET /primes bodies, encoded and compressed, by their ETag
+response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_BYTES)
+
+# The memory-mapped prime index, if one is configured. It is opened when the application starts.
+prime_index = None
+
+# Function to open the prime index file given in the settings
+def load_prime_index():
+    global prime_index
+    if config.PRIME_INDEX_PATH:
+        prime_index = PrimeIndex(config.PRIME_INDEX_PATH)
+
+# Function to attach the shared base-prime table given in the settings. If no valid file is there yet, it is built first.
+def load_base_prime_table():
+    if not config.BASE_TABLE_PATH:
+        return
+    try:
+        attach_base_prime_table(config.BASE_TABLE_PATH)
+    except (FileNotFoundError, ValueError):
+        write_base_prime_table(config.BASE_TABLE_LIMIT, config.BASE_TABLE_PATH)
+        attach_base_prime_table(config.BASE_TABLE_PATH)
+
+# Function to log the details of an execution. The row is handed to the background writer, so this returns straight away.
+# 'source' tells how the primes were found: 'computed' by the engine for this request alone, or 'cached', 'index', 'shared'
+# (waited for another request's computation) or 'partial' (a mix). 'compute_seconds' is the time the engine itself ran for this request.
+# Only computed rows are used to refit the cost models of the engines.
+def log_execution(num_primes, method, start, end, start_time, source="computed", compute_seconds=None):
+    execution_log.submit(num_primes, method, start, end, start_time, source, compute_seconds)
+
+# Function to pick the prime number generation engine from the registry based on the method name.
+# The 'auto' method picks the engine expected to be fastest for the range.
+def get_method_engine(method: str, start: int, end: int):
+    engine = get_engine(method, start, end)
+    if engine is None:
+        raise HTTPException(status_code=400, detail="Invalid method")
+    return engine
+
+# Function to check a request against the cost budget before it runs (see 'admit'), and count the decision.
+# It returns the engine to run, or None if the request should be queued as a background job.
+def admit_request(engine, start: int, end: int):
+    try:
+        admitted = admit(engine, start, end, config.REQUEST_BUDGET_SECONDS, config.OVER_BUDGET)
+    except HTTPException:
+        metrics.ADMISSIONS.inc("rejected")
+        raise
+    if admitted is None:
+        metrics.ADMISSIONS.inc("queued")
+    elif admitted is not engine:
+        metrics.ADMISSIONS.inc("downgraded")
+    else:
+        metrics.ADMISSIONS.inc("admitted")
+    return admitted
+
+# Function to answer an over-budget request by submitting it as a background job, as POST /jobs would
+def queue_request(request):
+    # Imported here because the jobs router itself imports from this module
+    from .jobs import job_manager
+    job = job_manager.submit(request.method, request.start, request.end)
+    return JSONResponse(status_code=202, content=job, headers={"Location": f"/jobs/{job['id']}"})
+
+# Function to compute the primes of a range with an engine, reusing cached sub-ranges for deterministic engines.
+# With a guard, the computation stops between two chunks of work once the deadline passes or the client disconnects, and raises Cancelled.
+# If a 'usage' dict is given, it is filled in with the 'source' of the primes and the 'compute_seconds' the engine ran (see log_execution).
+def compute_primes(engine, start: int, end: int, guard=None, usage=None):
+    should_stop = guard.should_stop if guard is not None else None
+    check = guard.check if guard is not None else None
+    usage = usage if usage is not None else {}
+    usage.update(source="computed", compute_seconds=0.0)
+
+    # Ranges below the limit of the prime index are read from it. Every method gives the same primes, so the method doesn't matter here.
+    if prime_index is not None and end <= prime_index.limit:
+        usage["source"] = "index"
+        return prime_index.primes(start, end)
+
+    # The numbers this request computed itself, and the number of blocks it took from another request's computation
+    computed_numbers = 0
+    shared_blocks = 0
 
-    # Insert execution details into the database
-    db.execute(
-        text("INSERT INTO executions (timestamp, range_start, range_end, time_elapsed, method, num_primes) VALUES (:timestamp, :range_start, :range_end, :time_elapsed, :method, :num_primes)"),
-        {"timestamp": timestamp_str, "range_start": request.start, "range_end": request.end, "time_elapsed": time_elapsed, "method": request.method, "num_primes": len(prime_no)}
-    )
-    db.commit()
+    # Run the engine on one block, timing it. This only runs for the request that leads the computation of the block.
+    def run(low, high):
+        nonlocal computed_numbers
+        begin = time.perf_counter()
+        primes = parallel_method(engine.function, low, high, config.PRIME_JOBS, should_stop)
+        usage["compute_seconds"] += time.perf_counter() - begin
+        computed_numbers += high - low + 1
+        return primes
+
+    # Run the method, split across the configured number of worker processes.
+    # The range is cut into aligned blocks, and each block is computed once however many requests need it at the same time.
+    def compute(low, high):
+        nonlocal shared_blocks
+        primes = PrimeSet()
+        for piece_low, piece_high in aligned_pieces(low, high, config.COALESCE_BLOCK):
+            while True:
+                try:
+                    before = computed_numbers
+                    primes.extend(prime_flights.do(
+                        (engine.name, piece_low, piece_high),
+                        lambda: run(piece_low, piece_high),
+                        check,
+                    ))
+                    if computed_numbers == before:
+                        shared_blocks += 1
+                    break
+                except Cancelled:
+                    # If another request was computing this block and got cancelled, we compute it ourselves
+                    if guard is None or guard.reason is not None:
+                        raise
+        return primes
+
+    # Only engines that always give the same answer for the same range can be cached
+    if engine.deterministic:
+        primes = prime_cache.get_primes(engine.name, start, end, compute)
+    else:
+        primes = compute(start, end)
+
+    # Work out where the primes came from
+    if computed_numbers < end - start + 1:
+        if computed_numbers == 0:
+            usage["source"] = "shared" if shared_blocks else "cached"
+        else:
+            usage["source"] = "partial"
+    return primes
+
+# Function to build the /primes response in the format asked for in the Accept header.
+# JSON goes through the PrimeResponse model as before; the binary formats are written straight from a buffer,
+# with the time elapsed and the number of primes in the response headers.
+def primes_response(prime_no, start_time, accept_header):
+    time_elapsed = time.time() - start_time
+    media_type = encoding.negotiate(accept_header)
+    try:
+        body = encoding.encode(prime_no, media_type, time_elapsed)
+    except ValueError as error:
+        raise HTTPException(status_code=406, detail=str(error))
+    if body is None:
+        # JSON is encoded here rather than by the response model, so the serialization phase can be timed
+        return Response(content=encoding.encode_json(prime_no, time_elapsed), media_type=encoding.JSON)
+    headers = {"X-Time-Elapsed": str(time_elapsed), "X-Num-Primes": str(len(prime_no))}
+    return Response(content=body, media_type=media_type, headers=headers)
+
+# Function to run a /primes request: pick the engine, admit it, compute the primes and log the execution.
+# It returns the primes, the time the request started and the engine that ran, or the 202 response if the request was queued as a background job.
+def run_primes_request(http_request: Request, method: str, start: int, end: int, deadline: Optional[float]):
+    # Dispatch: check the request and pick the engine. The execution is logged and measured under the name of the engine,
+    # so requests for 'auto' count towards the engine that actually ran. The name is only used as a metric label once it's known to be valid.
+    dispatch_begin = time.perf_counter()
+    request = PrimeRequest(start=start, end=end, method=method)
+    start_time = time.time()
+    engine = get_method_engine(request.method, request.start, request.end)
+    request.method = engine.name
+
+    # Admission: requests estimated to cost more than the budget are rejected, downgraded to a faster engine or queued as a job.
+    # Ranges the prime index covers are read from it whatever the engine (see compute_primes), so the engine's cost doesn't apply to them.
+    if prime_index is not None and request.end <= prime_index.limit:
+        metrics.ADMISSIONS.inc("admitted")
+    else:
+        admitted = admit_request(engine, request.start, request.end)
+        if admitted is None:
+            return queue_request(request)
+        engine = admitted
+        request.method = engine.name
+    guard = RequestGuard(http_request, min(deadline or config.REQUEST_DEADLINE_SECONDS, config.REQUEST_DEADLINE_SECONDS))
+    metrics.PHASE_SECONDS.observe(time.perf_counter() - dispatch_begin, "dispatch", request.method)
+
+    # Compute the primes with the method chosen in the request, reusing cached results where possible.
+    # The computation stops early if the deadline passes or the client goes away.
+    compute_begin = time.perf_counter()
+    with metrics.phase("compute", request.method):
+        try:
+            usage = {}
+            prime_no = compute_primes(engine, request.start, request.end, guard, usage)
+        except Cancelled:
+            metrics.CANCELLATIONS.inc(guard.reason)
+            raise guard.error()
+    metrics.METHOD_SECONDS.observe(time.perf_counter() - compute_begin, request.method)
+    metrics.NUMBERS_CHECKED.inc(request.method, amount=max(request.end - request.start + 1, 0))
+    metrics.PRIMES_FOUND.inc(request.method, amount=len(prime_no))
+
+    # Log the execution details. They are written to the database in the background, in batches.
+    with metrics.phase("logging", request.method):
+        log_execution(len(prime_no), request.method, request.start, request.end, start_time, usage["source"], usage["compute_seconds"])
+    return prime_no, start_time, request.method
 
 # Endpoint to generate prime numbers
+# The response is JSON by default. Clients can ask for application/x-primes-uint32, application/x-primes-uint64,
+# application/x-primes-delta-varint or application/msgpack in the Accept header instead.
 @router.post("/primes", response_model=PrimeResponse)
 def generate_primes(
-    background_tasks: BackgroundTasks,
+    http_request: Request,
     start: int = Form(...),
     end: int = Form(...),
     method: str = Form(...),
-    db_and_engine: tuple = Depends(get_db)
+    deadline: Optional[float] = Form(None)
+):
+    with profile_if_slow("primes"):
+        result = run_primes_request(http_request, method, start, end, deadline)
+        if isinstance(result, Response):
+            return result
+        prime_no, start_time, method = result
+
+        # Return the generated prime numbers and time elapsed, in the format the client asked for
+        with metrics.phase("serialization", method):
+            return primes_response(prime_no, start_time, http_request.headers.get("accept"))
+
+# Endpoint to generate prime numbers that HTTP caches and CDNs can store, e.g. GET /primes?start=1&end=100&method=sieve_of_eratosthenes
+# The same method and range always give the same primes, so the answer of a deterministic method carries a strong ETag derived from
+# (method, start, end) and may be cached for PRIME_PRIMES_MAX_AGE_SECONDS. A request whose If-None-Match holds the ETag gets 304 without
+# anything being computed. The body is the same as for POST /primes, except that time_elapsed is sent in the X-Time-Elapsed header,
+# so the body never changes. It is compressed with brotli or gzip if the client accepts it, and finished bodies are kept in the response
+# cache already compressed, so repeated requests are answered without computing or compressing anything.
+@router.get("/primes", response_model=PrimeResponse)
+def get_primes(
+    http_request: Request,
+    start: int = Query(...),
+    end: int = Query(...),
+    method: str = Query("auto"),
+    deadline: Optional[float] = Query(None)
 ):
-    # Unpack the database session from the tuple
-    db, engine = db_and_engine
-    request = PrimeRequest(start=start, end=end, method=method)
     start_time = time.time()
+    engine = ENGINES.get(method)
+    if method != "auto" and engine is None:
+        raise HTTPException(status_code=400, detail="Invalid method")
+    deterministic = engine is None or engine.deterministic
 
-    # Choose prime number generation method based on the request
-    if request.method == "brute_force":
-        prime_no = brute_force_method(request.start, request.end)
-    elif request.method == "trial_division":
-        prime_no = trial_division_method(request.start, request.end)
-    elif request.method == "miller_rabin":
-        prime_no = miller_rabin_method(request.start, request.end)
-    elif request.method == "sieve_of_eratosthenes":
-        prime_no = sieve_of_eratosthenes_method(request.start, request.end)
+    # Work out which body the client wants, and the ETags it could already hold for it
+    media_type = encoding.negotiate(http_request.headers.get("accept"))
+    coding = encoding.negotiate_encoding(http_request.headers.get("accept-encoding"))
+    etag = encoding.primes_etag(method, start, end, media_type, coding)
+    identity_etag = encoding.primes_etag(method, start, end, media_type, encoding.IDENTITY)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if not deterministic:
+        headers["Cache-Control"] = "no-store"
     else:
-        raise HTTPException(status_code=400, detail="Invalid method")
+        headers["Cache-Control"] = f"public, max-age={config.PRIMES_MAX_AGE_SECONDS}, immutable"
+
+        # The client already has the body. Small bodies are sent uncompressed, so the tag it holds may be the uncompressed one.
+        if_none_match = http_request.headers.get("if-none-match")
+        for tag in (etag, identity_etag):
+            if encoding.etag_matches(if_none_match, tag):
+                metrics.GET_RESPONSES.inc("not_modified")
+                return Response(status_code=304, headers={**headers, "ETag": tag})
+
+        # The body is in the response cache, compressed the way the client wants it or still uncompressed
+        body = response_cache.get(etag)
+        if body is None and coding != encoding.IDENTITY:
+            body = response_cache.get(identity_etag)
+            if body is not None:
+                body, coding, etag = compress_body(body, coding, identity_etag, etag)
+                response_cache.put(etag, body)
+        if body is not None:
+            metrics.GET_RESPONSES.inc("cached")
+            return cached_primes_response(body, media_type, coding, etag, headers, start_time)
+
+    with profile_if_slow("primes"):
+        result = run_primes_request(http_request, method, start, end, deadline)
+        if isinstance(result, Response):
+            return result
+        prime_no, start_time, method = result
+
+        with metrics.phase("serialization", method):
+            try:
+                body = encoding.encode_json(prime_no, None) if media_type == encoding.JSON else encoding.encode(prime_no, media_type, None)
+            except ValueError as error:
+                raise HTTPException(status_code=406, detail=str(error))
+            if deterministic:
+                response_cache.put(identity_etag, body)
+            body, coding, etag = compress_body(body, coding, identity_etag, etag)
+            if deterministic:
+                response_cache.put(etag, body)
+        metrics.GET_RESPONSES.inc("computed")
+        headers["X-Num-Primes"] = str(len(prime_no))
+        return cached_primes_response(body, media_type, coding, etag if deterministic else None, headers, start_time)
+
+# Function to compress an uncompressed body for GET /primes, if it is big enough to be worth it.
+# It returns the body, its content coding and its ETag.
+def compress_body(body, coding, identity_etag, etag):
+    if coding == encoding.IDENTITY or len(body) < encoding.COMPRESS_MIN_BYTES:
+        return body, encoding.IDENTITY, identity_etag
+    return encoding.compress(body, coding), coding, etag
+
+# Function to build a GET /primes response from a finished body. Non-deterministic methods get no ETag.
+def cached_primes_response(body, media_type, coding, etag, headers, start_time):
+    headers = {**headers, "X-Time-Elapsed": str(time.time() - start_time)}
+    if etag is not None:
+        headers["ETag"] = etag
+    if coding != encoding.IDENTITY:
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+# Endpoint to find the primes of many ranges in one call, e.g. {"ranges": [{"start": 1, "end": 100}, {"start": 500, "end": 600}]}
+# The ranges are merged into covering ranges and each covering range is sieved once, with the base primes found once for the whole batch.
+# The answer has one list of primes per range, in the order they were sent, and the batch is logged as a single execution.
+@router.post("/primes/batch", response_model=PrimeBatchResponse)
+def generate_primes_batch(request: PrimeBatchRequest, deadline: Optional[float] = Query(None)):
+    start_time = time.time()
+    ranges = [(item.start, item.end) for item in request.ranges]
+    if len(ranges) > config.MAX_BATCH_RANGES:
+        raise HTTPException(status_code=413, detail=f"At most {config.MAX_BATCH_RANGES} ranges can be asked for at once")
+    if any(start > end for start, end in ranges):
+        raise HTTPException(status_code=400, detail="Starting limit cannot be greater than ending limit")
+    if not ranges:
+        return PrimeBatchResponse(primes=[], time_elapsed=time.time() - start_time)
+
+    # Ranges below the limit of the prime index are read from it. Anything else is sieved, if the whole batch fits the budget.
+    if prime_index is not None and max(end for _, end in ranges) <= prime_index.limit:
+        results = [to_list(prime_index.primes(start, end)) for start, end in ranges]
+        source = "index"
+    else:
+        sieve = ENGINES["sieve_of_eratosthenes"]
+        estimate = sum(sieve.estimate(low, high) for low, high, _ in merge_ranges(ranges))
+        if estimate > config.REQUEST_BUDGET_SECONDS:
+            metrics.ADMISSIONS.inc("rejected")
+            raise HTTPException(
+                status_code=413,
+                detail=f"The batch is estimated to take {estimate:.3g} seconds, more than the budget of {config.REQUEST_BUDGET_SECONDS:g} seconds. Split it into smaller batches.",
+            )
+        metrics.ADMISSIONS.inc("admitted")
+        guard = RequestGuard(None, min(deadline or config.REQUEST_DEADLINE_SECONDS, config.REQUEST_DEADLINE_SECONDS))
+        with metrics.phase("compute", "batch"):
+            try:
+                results = sieve_ranges(ranges, should_stop=guard.should_stop)
+                source = "computed"
+            except Cancelled:
+                metrics.CANCELLATIONS.inc(guard.reason)
+                raise guard.error()
+
+    num_primes = sum(len(primes) for primes in results)
+    log_execution(num_primes, "batch", min(start for start, _ in ranges), max(end for _, end in ranges), start_time, source)
+    return PrimeBatchResponse(primes=results, time_elapsed=time.time() - start_time)
+
+# Endpoint to count the prime numbers in a range without listing them
+@router.get("/primes/count", response_model=PrimeCountResponse)
+def count_primes(
+    start: int = Query(...),
+    end: int = Query(...)
+):
+    if start > end:
+        raise HTTPException(status_code=400, detail="Starting limit cannot be greater than ending limit")
+    start_time = time.time()
 
-    # Add a background task to write execution details to the database
-    background_tasks.add_task(write_to_db, prime_no, request, start_time, db)
+    # Counts below the limit of the prime index come from its checkpoints, anything else is counted without listing the primes
+    if prime_index is not None and end <= prime_index.limit:
+        count = prime_index.count(start, end)
+        source = "index"
+    else:
+        # Counting is refused up front when it would take more than the request budget, because there's no faster way to do it
+        try:
+            check_budget(count_primes_cost(start, end), config.REQUEST_BUDGET_SECONDS, "Counting the primes of this range")
+        except HTTPException:
+            metrics.ADMISSIONS.inc("rejected")
+            raise
+        metrics.ADMISSIONS.inc("admitted")
+        count = count_primes_in_range(start, end)
+        source = "computed"
+
+    # The count is logged like any other execution, under the method name 'prime_count'
+    log_execution(count, "prime_count", start, end, start_time, source)
+
+    return PrimeCountResponse(start=start, end=end, count=count, time_elapsed=time.time() - start_time)
+
+# Endpoint to list the engines and their cost models, including the scale refitted from the execution history
+@router.get("/engines")
+def list_engines():
+    return [
+        {"name": engine.name, "label": engine.label, "deterministic": engine.deterministic, "weight": engine.weight, "scale": engine.scale}
+        for engine in ENGINES.values()
+    ]
+
+# Endpoint to show the hit and miss counters of the result cache and of the GET /primes response cache, and how many computations were shared between requests
+@router.get("/cache/stats")
+def cache_stats():
+    return {**prime_cache.stats(), "single_flight": prime_flights.stats(), "responses": response_cache.stats()}
+
+# Generator that produces the streamed response body, one window of primes at a time.
+# If the deadline passes, the stream ends early with an 'error' field instead of the remaining primes, and nothing is logged.
+def stream_primes(method_function, request, start_time, ndjson: bool, guard):
+    num_primes = 0
+
+    # Open the JSON object in the same shape as PrimeResponse, so clients can parse the result the same way
+    if not ndjson:
+        yield '{"primes":['
+
+    for segment in method_segments(method_function, request.start, request.end):
+        if guard.should_stop():
+            metrics.CANCELLATIONS.inc(guard.reason)
+            error = json.dumps(guard.error().detail)
+            yield '{"error":' + error + '}\n' if ndjson else '],"error":' + error + '}'
+            return
+        if len(segment) == 0:
+            continue
+        body = ",".join(map(str, segment))
+        if ndjson:
+            # One JSON line per window
+            yield '{"primes":[' + body + ']}\n'
+        else:
+            # Windows after the first need a comma in front to continue the array
+            yield ("," if num_primes else "") + body
+        num_primes += len(segment)
 
-    # Return the generated prime numbers and time elapsed
-    return PrimeResponse(primes=prime_no, time_elapsed=time.time() - start_time)
+    time_elapsed = time.time() - start_time
+    if ndjson:
+        yield '{"num_primes":' + str(num_primes) + ',"time_elapsed":' + str(time_elapsed) + '}\n'
+    else:
+        yield '],"time_elapsed":' + str(time_elapsed) + '}'
+
+    # Log the execution once the whole stream has been sent
+    log_execution(num_primes, request.method, request.start, request.end, start_time)
+
+# Endpoint to stream prime numbers as they are generated
+# The body is a chunked JSON object shaped like PrimeResponse, or NDJSON (one line per window) if the client accepts application/x-ndjson
+@router.post("/primes/stream")
+def stream_generate_primes(
+    http_request: Request,
+    start: int = Form(...),
+    end: int = Form(...),
+    method: str = Form(...),
+    deadline: Optional[float] = Form(None)
+):
+    request = PrimeRequest(start=start, end=end, method=method)
+    engine = get_method_engine(request.method, request.start, request.end)
+    request.method = engine.name
+    admitted = admit_request(engine, request.start, request.end)
+    if admitted is None:
+        return queue_request(request)
+    engine = admitted
+    request.method = engine.name
+    # The connection doesn't need checking here: the server stops pulling windows from the generator once the client is gone
+    guard = RequestGuard(None, min(deadline or config.REQUEST_DEADLINE_SECONDS, config.REQUEST_DEADLINE_SECONDS))
+    ndjson = "application/x-ndjson" in http_request.headers.get("accept", "")
+    media_type = "application/x-ndjson" if ndjson else "application/json"
+    return StreamingResponse(stream_primes(engine.function, request, time.time(), ndjson, guard), media_type=media_type)
 
 # Homepage endpoint to provide a form for prime number generation
 @router.get("/", response_class=HTMLResponse)
@@ -81,10 +481,8 @@ def home():
                 <input type="number" id="end" name="end" required><br><br>
                 <label for="method">Method:</label>
                 <select id="method" name="method">
-                    <option value="brute_force">Brute Force</option>
-                    <option value="trial_division">Trial Division</option>
-                    <option value="miller_rabin">Miller-Rabin</option>
-                    <option value="sieve_of_eratosthenes">Sieve of Eratosthenes</option>
+                    <option value="auto">Automatic (fastest for the range)</option>
+                    """ + "".join(f'<option value="{engine.name}">{engine.label}</option>' for engine in ENGINES.values()) + """
                 </select><br><br>
                 <input type="submit" value="Generate Primes">
             </form>
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List
+
+# Importing models
+from ..models import PointQueryRequest, IsPrimeResponse, PrimeQueryResponse
+
+# Importing the single-number prime functions
+from .prime_no_generator import is_prime, next_prime, prev_prime, nth_prime, is_prime_cost, prime_search_cost, nth_prime_cost
+
+# Importing the server settings and the budget check
+from .. import config
+from ..admission import check_budget
+
+# Create a FastAPI router
+router = APIRouter()
+
+# Function to check the size of a batch before answering it
+def check_batch(numbers: List[int]):
+    if len(numbers) > config.MAX_POINT_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {config.MAX_POINT_QUERIES} numbers can be asked about at once")
+
+# Function to check the size of a batch and its estimated cost before answering it.
+# Big numbers take a strong probable-prime test or more each, so batches estimated to take more than the request budget are refused with 413.
+def check_cost(numbers: List[int], cost, what):
+    check_batch(numbers)
+    check_budget(sum(cost(number) for number in numbers), config.REQUEST_BUDGET_SECONDS, what)
+
+# Function to answer a batch of next_prime or prev_prime questions
+def answer(function, numbers: List[int]):
+    check_cost(numbers, prime_search_cost, "Finding these primes")
+    return PrimeQueryResponse(numbers=numbers, primes=[function(number) for number in numbers])
+
+# Function to answer a batch of nth_prime questions. Numbers below 1 have no n-th prime.
+# Each n-th prime costs a prime count up to about n * ln(n).
+def answer_nth_prime(numbers: List[int]):
+    if any(number < 1 for number in numbers):
+        raise HTTPException(status_code=400, detail="n must be at least 1")
+    check_cost(numbers, nth_prime_cost, "Finding these n-th primes")
+    return PrimeQueryResponse(numbers=numbers, primes=[nth_prime(number) for number in numbers])
+
+# Function to answer a batch of is_prime questions
+def answer_is_prime(numbers: List[int]):
+    check_cost(numbers, is_prime_cost, "Checking these numbers")
+    return IsPrimeResponse(numbers=numbers, is_prime=[is_prime(number) for number in numbers])
+
+# Endpoints to check whether numbers are prime, e.g. /is_prime?n=7&n=9
+# The POST version takes the numbers as JSON, for batches too big for a URL
+@router.get("/is_prime", response_model=IsPrimeResponse)
+def get_is_prime(n: List[int] = Query(...)):
+    return answer_is_prime(n)
+
+@router.post("/is_prime", response_model=IsPrimeResponse)
+def post_is_prime(request: PointQueryRequest):
+    return answer_is_prime(request.numbers)
+
+# Endpoints to find the smallest prime bigger than each number
+@router.get("/next_prime", response_model=PrimeQueryResponse)
+def get_next_prime(n: List[int] = Query(...)):
+    return answer(next_prime, n)
+
+@router.post("/next_prime", response_model=PrimeQueryResponse)
+def post_next_prime(request: PointQueryRequest):
+    return answer(next_prime, request.numbers)
+
+# Endpoints to find the biggest prime smaller than each number (None when there is no such prime)
+@router.get("/prev_prime", response_model=PrimeQueryResponse)
+def get_prev_prime(n: List[int] = Query(...)):
+    return answer(prev_prime, n)
+
+@router.post("/prev_prime", response_model=PrimeQueryResponse)
+def post_prev_prime(request: PointQueryRequest):
+    return answer(prev_prime, request.numbers)
+
+# Endpoints to find the n-th prime number, counting 2 as the first
+@router.get("/nth_prime", response_model=PrimeQueryResponse)
+def get_nth_prime(n: List[int] = Query(...)):
+    return answer_nth_prime(n)
+
+@router.post("/nth_prime", response_model=PrimeQueryResponse)
+def post_nth_prime(request: PointQueryRequest):
+    return answer_nth_prime(request.numbers)
@@ -0,0 +1,114 @@
+# Write failures are reported through the standard logging module.
+import logging
+
+# The queue hands log rows from the request threads to the writer thread.
+import queue
+
+# The writer runs in a thread of its own, so requests never wait for the database.
+import threading
+
+# This module is used for timing operations.
+import time
+from datetime import datetime
+
+# SQLAlchemy imports
+from sqlalchemy import text
+
+# Importing the database engine and the server settings
+from .database import engine
+from . import config
+
+# The statement used to add a row to the executions table. It is run once per batch with a list of rows.
+INSERT_EXECUTION = text(
+    "INSERT INTO executions (timestamp, range_start, range_end, time_elapsed, method, num_primes, created_at, source, compute_seconds) "
+    "VALUES (:timestamp, :range_start, :range_end, :time_elapsed, :method, :num_primes, :created_at, :source, :compute_seconds)"
+)
+
+logger = logging.getLogger(__name__)
+
+
+# The class that writes the execution log in the background.
+# Requests put their row in a queue, and a single writer thread takes the rows out and inserts them in batches, one transaction per batch.
+class ExecutionLogWriter:
+    def __init__(self, engine, batch_size, flush_seconds, queue_size):
+        self.engine = engine
+        self.batch_size = batch_size  # Rows written in one transaction at most
+        self.flush_seconds = flush_seconds  # Longest time a row waits before it is written
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.written = 0  # Rows written so far
+        self.dropped = 0  # Rows dropped because the queue was full
+        self.failed = 0  # Rows lost because the batch they were in failed to write
+
+    # Start the writer thread
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="execution-log-writer", daemon=True)
+            self.thread.start()
+
+    # Stop the writer thread after it has written every row still in the queue
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    # Add an execution to the log. This never blocks: if the queue is full the row is dropped and counted.
+    # 'source' and 'compute_seconds' tell how the primes were found and how long the engine ran (see log_execution in routers/primes.py).
+    # Without 'compute_seconds' the whole time since 'start_time' is counted as compute time.
+    def submit(self, num_primes, method, start, end, start_time, source="computed", compute_seconds=None):
+        time_elapsed = round(time.time() - start_time, 6)
+        row = {
+            "timestamp": datetime.fromtimestamp(start_time).strftime('%H:%M:%S'),
+            "range_start": start,
+            "range_end": end,
+            "time_elapsed": time_elapsed,
+            "method": method,
+            "num_primes": num_primes,
+            "created_at": start_time,
+            "source": source,
+            "compute_seconds": time_elapsed if compute_seconds is None else round(compute_seconds, 6),
+        }
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    # Write a batch of rows in one transaction
+    def write(self, rows):
+        if rows:
+            with self.engine.begin() as connection:
+                connection.execute(INSERT_EXECUTION, rows)
+            self.written += len(rows)
+
+    # Write a batch, counting and logging it if it fails. A failed batch is dropped, so one bad write can't stop the log for good.
+    def flush(self, rows):
+        try:
+            self.write(rows)
+        except Exception:
+            self.failed += len(rows)
+            logger.exception("Execution log write of %d rows failed", len(rows))
+
+    # The writer thread: collect rows until the batch is full or the flush time has passed, then write them
+    def run(self):
+        rows = []
+        deadline = time.monotonic() + self.flush_seconds
+        while True:
+            try:
+                row = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                row = False
+            if row is None:
+                # Stop was asked for: write what is left and finish
+                self.flush(rows)
+                return
+            if row:
+                rows.append(row)
+            if len(rows) >= self.batch_size or time.monotonic() >= deadline:
+                self.flush(rows)
+                rows = []
+                deadline = time.monotonic() + self.flush_seconds
+
+
+# The execution log writer shared by the whole application. It is started and stopped together with the application.
+execution_log = ExecutionLogWriter(engine, config.TELEMETRY_BATCH_SIZE, config.TELEMETRY_FLUSH_SECONDS, config.TELEMETRY_QUEUE_SIZE)
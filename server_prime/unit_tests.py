@@ -0,0 +1,270 @@
+# Import the unittest module. This is a built-in Python module for writing and running tests.
+import unittest
+
+# patch swaps a module attribute for the length of a test, here to run the encoders as if NumPy were not installed.
+from unittest.mock import patch
+
+# This module is used to read back the binary response bodies.
+import struct
+
+# These modules are used to time a response and to run concurrent callers.
+import time
+import threading
+
+# Import the response encoders, and the function that turns an encoding error into an HTTP error.
+from app import encoding
+from app.routers.primes import primes_response
+from fastapi import HTTPException
+
+# Import the cache of computed ranges, and the sharing of concurrent computations.
+from app.cache import IntervalCache, ENTRY_OVERHEAD
+from app.coalescing import SingleFlight, aligned_pieces
+
+# Import the quantile sketches and bucket sizes of the execution log rollups.
+from app.rollups import QuantileSketch, Rollup, pick_resolution, MINUTE, HOUR, DAY, SKETCH_ACCURACY
+
+# Import the prime number functions the test data is made with.
+from app.routers.prime_no_generator import sieve_of_eratosthenes_method, next_prime, prev_prime, PrimeSet
+
+
+# Read a msgpack map written by 'encode_msgpack' back into a dict. Only the layout the encoder writes is understood.
+def read_msgpack(body):
+    size = body[0] - 0x80
+    position = 1
+    result = {}
+    for _ in range(size):
+        key_length = body[position] - 0xa0
+        key = body[position + 1:position + 1 + key_length].decode()
+        position += 1 + key_length
+        if body[position] == 0xdd:
+            count, = struct.unpack_from(">I", body, position + 1)
+            position += 5
+            values = []
+            for _ in range(count):
+                assert body[position] == 0xcf
+                values.append(struct.unpack_from(">Q", body, position + 1)[0])
+                position += 9
+            result[key] = values
+        else:
+            assert body[position] == 0xcb
+            result[key] = struct.unpack_from(">d", body, position + 1)[0]
+            position += 9
+    assert position == len(body)
+    return result
+
+
+# Define a test case class that inherits from unittest.TestCase. Each method in this class is a separate test.
+class TestEncoding(unittest.TestCase):
+
+    # The primes the encoders are tested with: small gaps only, a gap of 132 after 1,357,201, primes next to 2^63, and primes past 2^64.
+    def setUp(self):
+        self.cases = [
+            sieve_of_eratosthenes_method(1, 10000).tolist(),
+            sieve_of_eratosthenes_method(1357000, 1358000).tolist(),
+            [prev_prime(2**63), next_prime(2**63), next_prime(next_prime(2**63))],
+            [next_prime(2**64), next_prime(next_prime(2**64))],
+        ]
+
+    # Test that the delta-varint body decodes back to the same primes on every path of the encoder:
+    # gaps copied straight from a PrimeSet, the NumPy path for PrimeSets and lists, and the pure-Python loop.
+    def test_delta_varint(self):
+        self.assertEqual(encoding.encode_delta_varint([]), b"")
+        self.assertEqual(encoding.encode_delta_varint(PrimeSet([2, 3, 5, 7])), bytes([2, 1, 2, 2]))
+        # 300 is written as 0xac 0x02: the low 7 bits with the top bit set, then the rest.
+        self.assertEqual(encoding.encode_delta_varint([300]), bytes([0xac, 0x02]))
+        for primes in self.cases:
+            for numpy in (encoding.numpy, None):
+                with patch.object(encoding, "numpy", numpy):
+                    self.assertEqual(encoding.decode_delta_varint(encoding.encode_delta_varint(PrimeSet(primes))), primes)
+                    self.assertEqual(encoding.decode_delta_varint(encoding.encode_delta_varint(primes)), primes)
+        # A gap of 128 or more takes two bytes, so the body is longer than one byte per prime.
+        wide = self.cases[1]
+        self.assertGreater(len(encoding.encode_delta_varint(PrimeSet(wide))), len(wide) + 2)
+
+    # Test that the raw integer bodies are little-endian and that primes too big for the integer size are refused.
+    def test_uint(self):
+        self.assertEqual(encoding.encode_uint(PrimeSet([2, 3, 5]), 4), struct.pack("<3I", 2, 3, 5))
+        for primes in self.cases[:3]:
+            body = encoding.encode_uint(PrimeSet(primes), 8)
+            self.assertEqual(list(struct.unpack(f"<{len(primes)}Q", body)), primes)
+        self.assertEqual(encoding.encode_uint([], 4), b"")
+        with self.assertRaises(ValueError):
+            encoding.encode_uint([2, next_prime(2**32)], 4)
+        with self.assertRaises(ValueError):
+            encoding.encode_uint(self.cases[3], 8)
+        # /primes answers 406 when the primes don't fit the format asked for
+        with self.assertRaises(HTTPException) as raised:
+            primes_response(PrimeSet([2, next_prime(2**32)]), time.time(), encoding.UINT32)
+        self.assertEqual(raised.exception.status_code, 406)
+
+    # Test that the msgpack body is a map of the primes and, when given, the time elapsed.
+    def test_msgpack(self):
+        for primes in self.cases[:3]:
+            self.assertEqual(read_msgpack(encoding.encode_msgpack(PrimeSet(primes), 0.25)), {"primes": primes, "time_elapsed": 0.25})
+            self.assertEqual(read_msgpack(encoding.encode_msgpack(primes, None)), {"primes": primes})
+        self.assertEqual(read_msgpack(encoding.encode_msgpack([], None)), {"primes": []})
+        with self.assertRaises(ValueError):
+            encoding.encode_msgpack(self.cases[3], None)
+
+    # Test that the Accept header picks the format with the highest quality, and falls back to JSON.
+    def test_negotiate(self):
+        self.assertEqual(encoding.negotiate(None), encoding.JSON)
+        self.assertEqual(encoding.negotiate("*/*"), encoding.JSON)
+        self.assertEqual(encoding.negotiate("application/x-msgpack"), encoding.MSGPACK)
+        self.assertEqual(encoding.negotiate(f"{encoding.UINT32};q=0.5, {encoding.DELTA_VARINT};q=0.9"), encoding.DELTA_VARINT)
+
+
+# Define a test case class for the cache of computed ranges.
+class TestIntervalCache(unittest.TestCase):
+
+    # A 'compute' function for the cache that remembers which ranges it was asked for
+    def setUp(self):
+        self.computed = []
+
+    def compute(self, low, high):
+        self.computed.append((low, high))
+        return sieve_of_eratosthenes_method(low, high)
+
+    # Test that only the parts of a request missing from the cache are computed, and that the answer is the same as computing it all.
+    def test_gaps(self):
+        cache = IntervalCache(10**6)
+        self.assertEqual(cache.get_primes("sieve", 100, 200, self.compute), sieve_of_eratosthenes_method(100, 200))
+        self.assertEqual(cache.get_primes("sieve", 150, 300, self.compute), sieve_of_eratosthenes_method(150, 300))
+        self.assertEqual(cache.get_primes("sieve", 120, 250, self.compute), sieve_of_eratosthenes_method(120, 250))
+        self.assertEqual(cache.get_primes("sieve", 1, 500, self.compute), sieve_of_eratosthenes_method(1, 500))
+        self.assertEqual(self.computed, [(100, 200), (201, 300), (1, 99), (301, 500)])
+        # Another method never uses the entries of the first one
+        cache.get_primes("trial_division", 120, 130, self.compute)
+        self.assertEqual(self.computed[-1], (120, 130))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["partial_hits"], stats["misses"]), (1, 2, 2))
+
+    # Test that overlapping entries are each used for the part of the request they cover, and only the rest is computed.
+    def test_overlapping_entries(self):
+        cache = IntervalCache(10**6)
+        with cache.lock:
+            cache.store("sieve", 10, 100, sieve_of_eratosthenes_method(10, 100))
+            cache.store("sieve", 50, 150, sieve_of_eratosthenes_method(50, 150))
+            cache.store("sieve", 60, 70, sieve_of_eratosthenes_method(60, 70))
+        self.assertEqual(cache.get_primes("sieve", 1, 200, self.compute), sieve_of_eratosthenes_method(1, 200))
+        self.assertEqual(self.computed, [(1, 9), (151, 200)])
+
+    # Test that the cache stays within its memory budget by dropping the least recently used entries, and keeps its size right.
+    def test_eviction(self):
+        size = IntervalCache.entry_size(sieve_of_eratosthenes_method(1, 1000))
+        cache = IntervalCache(2 * size)
+        cache.get_primes("sieve", 1, 1000, self.compute)
+        cache.get_primes("sieve", 2001, 3000, self.compute)
+        # Using the first range again makes the second one the least recently used
+        cache.get_primes("sieve", 1, 1000, self.compute)
+        cache.get_primes("sieve", 4001, 5000, self.compute)
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(sorted(cache.entries), [("sieve", 1, 1000), ("sieve", 4001, 5000)])
+        self.assertEqual(stats["bytes"], sum(IntervalCache.entry_size(primes) for primes in cache.entries.values()))
+        self.assertLessEqual(stats["bytes"], 2 * size)
+        # An entry bigger than the whole budget is never stored
+        small = IntervalCache(ENTRY_OVERHEAD)
+        small.get_primes("sieve", 1, 1000, self.compute)
+        self.assertEqual(small.stats()["entries"], 0)
+
+
+# Define a test case class for the sharing of concurrent computations.
+class TestCoalescing(unittest.TestCase):
+
+    # Test that ranges are cut at multiples of the block size, so overlapping ranges share the keys of their inner blocks.
+    def test_aligned_pieces(self):
+        self.assertEqual(aligned_pieces(5, 250, 100), [(5, 99), (100, 199), (200, 250)])
+        self.assertEqual(aligned_pieces(100, 299, 100), [(100, 199), (200, 299)])
+        self.assertEqual(aligned_pieces(0, 99, 100), [(0, 99)])
+        self.assertEqual(aligned_pieces(120, 180, 100), [(120, 180)])
+        self.assertEqual(aligned_pieces(7, 7, 100), [(7, 7)])
+        # The pieces always cover the range exactly, without gaps or overlaps
+        for start, end in [(1, 1000), (99, 1001), (37, 4321)]:
+            pieces = aligned_pieces(start, end, 64)
+            self.assertEqual((pieces[0][0], pieces[-1][1]), (start, end))
+            self.assertTrue(all(high + 1 == low for (_, high), (low, _) in zip(pieces, pieces[1:])))
+        # Two overlapping requests share the whole blocks they both cover
+        self.assertEqual(set(aligned_pieces(5, 350, 100)) & set(aligned_pieces(150, 420, 100)), {(200, 299)})
+
+    # Test that concurrent callers of the same key share one computation, and that after a failure the next caller computes it again.
+    def test_single_flight(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        def slow():
+            started.set()
+            release.wait()
+            return 42
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do("key", slow)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flights.do("key", lambda: 0))) for _ in range(5)]
+        for follower in followers:
+            follower.start()
+        while flights.stats()["followers"] < 5:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertEqual(results, [42] * 6)
+        self.assertEqual(flights.stats(), {"leaders": 1, "followers": 5, "in_flight": 0})
+
+        def fail():
+            raise ValueError("failed")
+        with self.assertRaises(ValueError):
+            flights.do("key", fail)
+        self.assertEqual(flights.do("key", lambda: 7), 7)
+        self.assertEqual(flights.stats()["leaders"], 3)
+
+
+# Define a test case class for the rollups of the execution log.
+class TestRollups(unittest.TestCase):
+
+    # Test that the quantiles read from a sketch are within its accuracy of the real ones, and that merging sketches loses nothing.
+    def test_quantile_sketch(self):
+        latencies = [0.001 * k for k in range(1, 1001)]
+        whole = QuantileSketch()
+        first, second = QuantileSketch(), QuantileSketch()
+        for index, seconds in enumerate(latencies):
+            whole.add(seconds)
+            (first if index % 2 else second).add(seconds)
+        for q in (0.0, 0.5, 0.9, 0.99, 1.0):
+            exact = latencies[int(q * (len(latencies) - 1))]
+            self.assertLessEqual(abs(whole.quantile(q) - exact), SKETCH_ACCURACY * exact)
+        first.merge(second)
+        self.assertEqual((first.bins, first.count), (whole.bins, whole.count))
+        self.assertEqual(QuantileSketch.loads(whole.dumps()).bins, whole.bins)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        # Latencies of zero all land in the lowest bin instead of failing
+        tiny = QuantileSketch()
+        tiny.add(0.0, count=3)
+        self.assertEqual(tiny.count, 3)
+        self.assertLess(tiny.quantile(0.5), 1e-5)
+
+    # Test that merging rollups adds up their counts and keeps the longest time.
+    def test_rollup_merge(self):
+        total, part = Rollup(), Rollup()
+        total.add(0.5, 10, 100)
+        part.add(2.0, 5, 50)
+        part.add(1.0, 1, 10)
+        total.merge(part)
+        description = total.describe()
+        self.assertEqual((description["count"], description["time_max"], description["num_primes"], description["numbers_checked"]), (3, 2.0, 16, 160))
+        self.assertAlmostEqual(description["time_mean"], 3.5 / 3)
+
+    # Test that summaries use the finest buckets that are still kept for the whole window and don't need too many of them.
+    def test_pick_resolution(self):
+        now = 100 * DAY
+        self.assertEqual(pick_resolution(now - HOUR, now, now), MINUTE)
+        self.assertEqual(pick_resolution(now - DAY, now, now), HOUR)
+        self.assertEqual(pick_resolution(now - 5 * DAY, now - 5 * DAY + HOUR, now), HOUR)
+        self.assertEqual(pick_resolution(now - 30 * DAY, now, now), HOUR)
+        self.assertEqual(pick_resolution(now - 60 * DAY, now, now), DAY)
+        self.assertEqual(pick_resolution(now - 95 * DAY, now - 94 * DAY, now), DAY)
+
+
+# This line checks if the script is being run directly (not being imported as a module). If so, it runs the tests.
+if __name__ == '__main__':
+    unittest.main()